@@ -0,0 +1,101 @@
+"""
+Dynamic MTPM target benchmark.
+
+Times joining targets to the points of an MTPM time series three ways: the scan that
+Mtpms.get_mtpm_time_series_preferred_uom used to do (parse and walk the targets for every
+point), AsOfTargets.at (bisect per point) and AsOfTargets.at_each (one NumPy searchsorted).
+Only the join is timed, building the response records is the same for all of them.
+
+    python benchmarks/asof_targets.py
+    python benchmarks/asof_targets.py --points 10000 --targets 300 --runs 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cp_snowflake_api.settings')
+os.environ.setdefault('USE_REAL_SNOWFLAKE', 'false')
+
+import django  # noqa: E402
+
+django.setup()
+
+from snowflake_drf import helpers  # noqa: E402
+from snowflake_drf.queries.asof import AsOfTargets  # noqa: E402
+
+
+def make_data(points, targets):
+    start = datetime(2023, 1, 1)
+    times = [start + timedelta(minutes=5 * index) for index in range(points)]
+    span = times[-1] - start
+    # targets arrive as FACT_MTPM_TARGET rows: timestamp strings, ordered by time
+    rows = [(f'{start + span * index / targets:%Y-%m-%d %H:%M:%S}.000', Decimal(index)) for index in range(targets)]
+    return times, rows
+
+
+def scan(times, rows):
+    results = []
+    for time_value in times:
+        found = None
+        series_time = helpers.get_datetime_obj(time_value)
+        for row in rows:
+            target_time = helpers.get_datetime_obj(row[0])
+            if target_time <= series_time:
+                found = row[1]
+            if target_time > series_time:
+                break
+        results.append(found)
+    return results
+
+
+def bisect_join(times, rows):
+    targets = AsOfTargets(rows)
+    return [targets.at(time_value) for time_value in times]
+
+
+def searchsorted_join(times, rows):
+    return AsOfTargets(rows).at_each(times)
+
+
+def best_of(join, times, rows, runs):
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = join(times, rows)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=10000)
+    parser.add_argument('--targets', type=int, default=300)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--scan-runs', type=int, default=1, help='the scan alone takes over a minute at the default size')
+    args = parser.parse_args()
+
+    times, rows = make_data(args.points, args.targets)
+    joins = {'scan': (scan, args.scan_runs), 'bisect': (bisect_join, args.runs),
+             'searchsorted': (searchsorted_join, args.runs)}
+
+    print(f'{args.points} points x {args.targets} targets')
+    print(f'{"join":<14} {"median (s)":>12} {"speedup":>10}')
+    baseline = expected = None
+    for name, (join, runs) in joins.items():
+        duration, result = best_of(join, times, rows, runs)
+        if expected is None:
+            baseline, expected = duration, result
+        elif result != expected:
+            raise SystemExit(f'{name} assigns different targets than the scan')
+        print(f'{name:<14} {duration:>12.4f} {baseline / duration:>9.0f}x')
+
+
+if __name__ == '__main__':
+    main()
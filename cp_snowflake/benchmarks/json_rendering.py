@@ -0,0 +1,96 @@
+"""
+JSON rendering benchmark.
+
+Times writing a beta leading indicator response (one record with a time series of
+Decimal values and tz-aware datetimes, as build_series_points returns it) with the json
+module and MdpJSONEncoder, as JsonResponse did, against encoders.dumps with orjson. The
+columnar form of the same series (format=columnar) is timed with both as well. Both
+encoders must write the same JSON (the times have no sub-second part, which orjson writes
+with microseconds instead of milliseconds).
+
+    python benchmarks/json_rendering.py
+    python benchmarks/json_rendering.py --points 50000 --timezone America/Chicago --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cp_snowflake_api.settings')
+os.environ.setdefault('USE_REAL_SNOWFLAKE', 'false')
+
+import django  # noqa: E402
+
+django.setup()
+
+from snowflake_drf.encoders import MdpJSONEncoder, dumps, orjson  # noqa: E402
+from snowflake_drf.queries.methods import SnowflakeMethods  # noqa: E402
+
+
+def make_responses(points, timezone):
+    start = datetime(2023, 1, 1)
+    times = np.array([start + timedelta(minutes=index) for index in range(points)], dtype=object)
+    values = np.random.default_rng(0).normal(100, 25, points)
+    values[::97] = np.nan
+    methods = SnowflakeMethods()
+    record = {'leading_indicator_id': 'abc', 'leading_indicator_name': 'Steam flow', 'uom': 't/h',
+              'display_high': Decimal('150.00'), 'display_low': Decimal('50.00'),
+              'ts_min': Decimal('12.3400'), 'ts_max': Decimal('198.7600')}
+    return {
+        'points': {'results': [{**record, 'time_series': methods.build_series_points(times, values, timezone)}]},
+        'columnar': {'results': [{**record, 'time_series': methods.build_series_columns(times, values, timezone)}]},
+    }
+
+
+def json_module(data):
+    return json.dumps(data, cls=MdpJSONEncoder).encode()
+
+
+def fast(data):
+    return dumps(data)
+
+
+def median_of(encode, data, runs):
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = encode(data)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=50000)
+    parser.add_argument('--timezone', default='America/Chicago')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    if orjson is None:
+        raise SystemExit('orjson is not installed, encoders.dumps uses the json module')
+    encoders = {'json module': json_module, 'orjson': fast}
+
+    print(f'{args.points} points in {args.timezone}')
+    print(f'{"response":<10} {"encoder":<12} {"median (s)":>12} {"size (MB)":>10} {"speedup":>10}')
+    for kind, data in make_responses(args.points, args.timezone).items():
+        baseline = expected = None
+        for name, encode in encoders.items():
+            duration, result = median_of(encode, data, args.runs)
+            if expected is None:
+                baseline, expected = duration, json.loads(result)
+            elif json.loads(result) != expected:
+                raise SystemExit(f'{name} writes the {kind} response differently than the json module')
+            print(f'{kind:<10} {name:<12} {duration:>12.4f} {len(result) / 1e6:>10.2f} {baseline / duration:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
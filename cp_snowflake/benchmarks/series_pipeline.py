@@ -0,0 +1,99 @@
+"""
+Time series point building benchmark.
+
+Times turning a (time, value) series into its response points two ways: point by point
+(SnowflakeMethods.build_series_point: Decimal rounding, time zone conversion, strftime label
+and epoch per point) and with the column pipeline of queries/pipeline.py that the beta
+leading indicator and equipment tag series use, from the times or from the epoch
+milliseconds SNOWFLAKE_SERIES_SQL_TIMES has Snowflake add. All must encode to the same JSON.
+
+    python benchmarks/series_pipeline.py
+    python benchmarks/series_pipeline.py --points 50000 --timezone America/Chicago --runs 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import json
+
+import numpy as np
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cp_snowflake_api.settings')
+os.environ.setdefault('USE_REAL_SNOWFLAKE', 'false')
+
+import django  # noqa: E402
+
+django.setup()
+
+from snowflake_drf.encoders import MdpJSONEncoder  # noqa: E402
+from snowflake_drf.queries.methods import SnowflakeMethods  # noqa: E402
+from snowflake_drf.timestamps import utc_to_local_many  # noqa: E402
+
+
+def make_data(points):
+    start = datetime(2023, 1, 1)
+    # Arrow gives the times as datetime objects and the values as float64 with NaN for NULL
+    times = np.array([start + timedelta(minutes=index) for index in range(points)], dtype=object)
+    values = np.random.default_rng(0).normal(100, 25, points)
+    values[::97] = np.nan
+    return times, values
+
+
+def point_by_point(methods, times, values, timezone):
+    return [methods.build_series_point(time_value, None if np.isnan(value) else value, timezone)
+            for time_value, value in zip(times, values)]
+
+
+def pipeline(methods, times, values, timezone):
+    return methods.build_series_points(times, values, timezone)
+
+
+def sql_times(times, timezone):
+    # the DATE_PART(epoch_millisecond, ...) columns, computed before timing as Snowflake would
+    wall = np.array(times, dtype='datetime64[ms]')
+    local = utc_to_local_many(wall, timezone).tz_localize(None).to_numpy().astype('datetime64[ms]')
+    epoch_ms = (wall.astype(np.int64).astype(float), local.astype(np.int64).astype(float))
+    return lambda methods, times, values, timezone: methods.build_series_points(times, values, timezone, epoch_ms)
+
+
+def median_of(build, methods, times, values, timezone, runs):
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = build(methods, times, values, timezone)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=10000)
+    parser.add_argument('--timezone', default='America/Chicago')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    methods = SnowflakeMethods()
+    times, values = make_data(args.points)
+    builds = {'point by point': point_by_point, 'pipeline': pipeline, 'sql times': sql_times(times, args.timezone)}
+
+    print(f'{args.points} points in {args.timezone}')
+    print(f'{"build":<16} {"median (s)":>12} {"speedup":>10}')
+    baseline = expected = None
+    for name, build in builds.items():
+        duration, points = median_of(build, methods, times, values, args.timezone, args.runs)
+        result = json.dumps(points, cls=MdpJSONEncoder)
+        if expected is None:
+            baseline, expected = duration, result
+        elif result != expected:
+            raise SystemExit(f'{name} builds different points than point by point')
+        print(f'{name:<16} {duration:>12.4f} {baseline / duration:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
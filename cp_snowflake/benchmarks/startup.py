@@ -0,0 +1,71 @@
+"""
+Worker boot benchmark.
+
+Measures how long a fresh interpreter takes to set up Django and import the
+Snowflake views (what a gunicorn worker does on boot), and how long the first
+connection checkout takes afterwards. Each scenario runs in its own process so
+nothing is shared between runs.
+
+    python benchmarks/startup.py              # uses the Snowflake settings from the environment
+    python benchmarks/startup.py --runs 5
+
+The "unreachable" scenario points SNOWFLAKE_ACCOUNT at a host that does not
+resolve, which is what a worker sees when Snowflake or the network is down.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import json, os, sys, time
+sys.path.insert(0, os.getcwd())
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cp_snowflake_api.settings')
+t0 = time.perf_counter()
+import django
+django.setup()
+from snowflake_drf import views
+t1 = time.perf_counter()
+available = views.wrapper.is_connection_available()
+t2 = time.perf_counter()
+print(json.dumps({'boot': t1 - t0, 'first_connection': t2 - t1, 'available': available}))
+"""
+
+
+def run_scenario(env, runs):
+    boots, firsts, available = [], [], None
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', CHILD], cwd=PROJECT_DIR, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        boots.append(result['boot'])
+        firsts.append(result['first_connection'])
+        available = result['available']
+    return statistics.median(boots), statistics.median(firsts), available
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    env = dict(os.environ, LOG_LEVEL='CRITICAL')
+    env.pop('USE_REAL_SNOWFLAKE', None)
+    scenarios = {
+        'reachable': env,
+        'unreachable': dict(env, SNOWFLAKE_ACCOUNT='unreachable.invalid'),
+    }
+
+    print(f'{"scenario":<12} {"boot (s)":>10} {"first connection (s)":>22} {"available":>10}')
+    for name, scenario_env in scenarios.items():
+        boot, first, available = run_scenario(scenario_env, args.runs)
+        print(f'{name:<12} {boot:>10.3f} {first:>22.3f} {str(available):>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Timestamp helper benchmark.
+
+Times parsing, UTC to local conversion and epochs for a series of timestamps with the
+helpers as they were (dateutil parse of str(value), tz.gettz on every call, strftime('%s'))
+against snowflake_drf.timestamps, point by point and for the whole column. All of them
+must give the same results.
+
+    python benchmarks/timestamps.py
+    python benchmarks/timestamps.py --points 50000 --timezone America/Chicago --runs 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from dateutil import tz
+from dateutil.parser import parse
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cp_snowflake_api.settings')
+os.environ.setdefault('USE_REAL_SNOWFLAKE', 'false')
+# strftime('%s') reads the time in the host's zone, the servers run in UTC
+os.environ['TZ'] = 'UTC'
+time.tzset()
+
+import django  # noqa: E402
+
+django.setup()
+
+from snowflake_drf import timestamps  # noqa: E402
+
+
+def make_data(points):
+    start = datetime(2023, 1, 1)
+    moments = [start + timedelta(minutes=index, microseconds=index) for index in range(points)]
+    # timestamps reach the helpers as datetimes from Arrow and as strings from cursor rows
+    return {'datetimes': moments, 'strings': [f'{moment:%Y-%m-%d %H:%M:%S.%f}'[:-3] for moment in moments]}
+
+
+def before(values, timezone):
+    results = []
+    for value in values:
+        utc = parse(str(value)).replace(tzinfo=tz.gettz('UTC'))
+        local = utc.astimezone(tz.gettz(timezone))
+        epoch = int((local - datetime(1970, 1, 1, tzinfo=tz.gettz(timezone))).total_seconds())
+        results.append((local, epoch, int(datetime.strftime(utc.replace(tzinfo=None), '%s'))))
+    return results
+
+
+def point_by_point(values, timezone):
+    results = []
+    for value in values:
+        wall = timestamps.parse(value)
+        local = timestamps.utc_to_local(wall, timezone)
+        results.append((local, timestamps.epoch(local, timezone), timestamps.epoch(wall)))
+    return results
+
+
+def column(values, timezone):
+    wall = timestamps.wall_times(values)
+    local = timestamps.utc_to_local_many(wall, timezone)
+    return list(zip(timestamps.datetimes(local, timezone), timestamps.epochs(local), timestamps.epochs(wall)))
+
+
+def median_of(convert, values, timezone, runs):
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = convert(values, timezone)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=10000)
+    parser.add_argument('--timezone', default='America/Chicago')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    conversions = {'before': before, 'point by point': point_by_point, 'column': column}
+    print(f'{args.points} timestamps in {args.timezone}')
+    print(f'{"input":<10} {"conversion":<16} {"median (s)":>12} {"speedup":>10}')
+    for kind, values in make_data(args.points).items():
+        baseline = expected = None
+        for name, convert in conversions.items():
+            duration, result = median_of(convert, values, args.timezone, args.runs)
+            if expected is None:
+                baseline, expected = duration, result
+            elif result != expected:
+                raise SystemExit(f'{name} converts {kind} differently than before')
+            print(f'{kind:<10} {name:<16} {duration:>12.4f} {baseline / duration:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -34,6 +34,10 @@ app.conf.beat_schedule = {
    'monthly_financial_data': {
        'task': 'snowflake_drf.tasks.refresh_financial_data',
        'schedule': crontab(minute=0, hour=0, day_of_month='1'),
+   },
+   'leading_indicator_summaries': {
+       'task': 'snowflake_drf.tasks.refresh_leading_indicator_summaries',
+       'schedule': settings.LI_SUMMARY_SNAPSHOT_INTERVAL,
    }
 }
 
@@ -96,6 +96,20 @@ SNOWFLAKE_OAUTH_CLIENT_SECRET = os.getenv('SNOWFLAKE_OAUTH_CLIENT_SECRET')
 SNOWFLAKE_OAUTH_RESOURCE_ID = os.getenv('SNOWFLAKE_OAUTH_RESOURCE_ID')
 SNOWFLAKE_OAUTH_USER = os.getenv('SNOWFLAKE_OAUTH_USER')
 
+# Snowflake connection pool (per worker process)
+SNOWFLAKE_POOL_SIZE = int(os.getenv('SNOWFLAKE_POOL_SIZE', 4))
+SNOWFLAKE_POOL_MAX_AGE = int(os.getenv('SNOWFLAKE_POOL_MAX_AGE', 60 * 60))  # seconds before a connection is recycled
+SNOWFLAKE_POOL_VALIDATE_AFTER = int(os.getenv('SNOWFLAKE_POOL_VALIDATE_AFTER', 60))  # idle seconds before a ping
+SNOWFLAKE_POOL_TIMEOUT = int(os.getenv('SNOWFLAKE_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+SNOWFLAKE_RETRY_ATTEMPTS = int(os.getenv('SNOWFLAKE_RETRY_ATTEMPTS', 3))  # tries per query, including the first
+SNOWFLAKE_RETRY_BASE_DELAY = float(os.getenv('SNOWFLAKE_RETRY_BASE_DELAY', 0.5))  # seconds, doubled per retry (jittered)
+SNOWFLAKE_RETRY_MAX_DELAY = float(os.getenv('SNOWFLAKE_RETRY_MAX_DELAY', 8))  # longest wait between two tries
+SNOWFLAKE_RETRY_BUDGET = float(os.getenv('SNOWFLAKE_RETRY_BUDGET', 30))  # seconds one query may spend retrying
+SNOWFLAKE_REQUEST_TIMEOUT = int(os.getenv('SNOWFLAKE_REQUEST_TIMEOUT', 100))  # seconds a request's queries may run, below the gunicorn timeout
+SNOWFLAKE_STATEMENT_TIMEOUT = int(os.getenv('SNOWFLAKE_STATEMENT_TIMEOUT', 0))  # STATEMENT_TIMEOUT_IN_SECONDS for every session, 0 keeps the account default
+SNOWFLAKE_TELEMETRY_SIZE = int(os.getenv('SNOWFLAKE_TELEMETRY_SIZE', 5000))  # query executions kept for monitoring/snowflake/queries/
+SNOWFLAKE_STREAM_BATCH_SIZE = int(os.getenv('SNOWFLAKE_STREAM_BATCH_SIZE', 10000))  # rows per fetchmany() when streaming
+
 # Snowflake OAuth 2.0 config
 JWT_CLIENT_ID = os.getenv('JWT_CLIENT_ID')
 JWT_CLIENT_SECRET = os.getenv('JWT_CLIENT_SECRET')
@@ -106,6 +120,10 @@ REST_FRAMEWORK = {
     # or allow read-only access for unauthenticated users.
     'DEFAULT_AUTHENTICATION_CLASSES': [],
     'TEST_REQUEST_DEFAULT_FORMAT': 'json',
+    'DEFAULT_RENDERER_CLASSES': [
+        'snowflake_drf.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
@@ -125,6 +143,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'snowflake_drf.middleware.QueryDeadlineMiddleware',
 ]
 
 # Gunicorn config
@@ -232,9 +251,48 @@ CACHES = {
     }
 }
 
+if 'test' in sys.argv or 'test\_coverage' in sys.argv:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
 # Cache time to live is 5 minutes.
 CACHE_TTL = 60 * 5
 
+# Time to live per cached Snowflake query (see snowflake_drf/queries/cache.py), CACHE_TTL otherwise
+SNOWFLAKE_CACHE_TTLS = {
+    'plant.region.dim': 60 * 60,
+    'plant.plant.dim': 60 * 60,
+    'plant.technology.dim': 60 * 60,
+    'mtpm.dim': 60 * 15,
+    'li.dim': 60 * 15,
+    'eq.dim': 60 * 15,
+}
+
+# Identical queries in flight at the same time run once (see snowflake_drf/queries/coalesce.py)
+SNOWFLAKE_COALESCE_ACROSS_WORKERS = os.getenv('SNOWFLAKE_COALESCE_ACROSS_WORKERS', 'false').lower() == 'true'  # also through a Redis lock
+SNOWFLAKE_COALESCE_WAIT = int(os.getenv('SNOWFLAKE_COALESCE_WAIT', 30))  # seconds to wait for another worker's result
+SNOWFLAKE_COALESCE_RESULT_TTL = 5  # seconds a shared result stays in Redis for waiting workers
+SNOWFLAKE_COALESCE_POLL = 0.05  # seconds between checks for another worker's result
+
+# Segment cache for leading indicator and equipment tag series (see snowflake_drf/queries/segments.py)
+SNOWFLAKE_SERIES_BUCKET = int(os.getenv('SNOWFLAKE_SERIES_BUCKET', 60 * 60))  # seconds per cached time bucket
+SNOWFLAKE_SERIES_SEAL_AFTER = int(os.getenv('SNOWFLAKE_SERIES_SEAL_AFTER', 60 * 60))  # seconds after its end before a bucket is cached
+SNOWFLAKE_SERIES_SEGMENT_TTL = None  # sealed buckets don't change, they stay until evicted
+SNOWFLAKE_SERIES_MAX_BUCKETS = int(os.getenv('SNOWFLAKE_SERIES_MAX_BUCKETS', 24 * 62))  # longer ranges bypass the cache
+
+# Epoch milliseconds and plant local times of series points computed by Snowflake (see snowflake_drf/queries/pipeline.py)
+SNOWFLAKE_SERIES_SQL_TIMES = os.getenv('SNOWFLAKE_SERIES_SQL_TIMES', 'false').lower() == 'true'
+
+# JSON responses are written with orjson when it is installed, 'json' writes them with the json module
+SNOWFLAKE_JSON_BACKEND = os.getenv('SNOWFLAKE_JSON_BACKEND', 'orjson')
+
+# Leading indicators per request of the batch metrics endpoint
+LI_BATCH_MAX_IDS = int(os.getenv('LI_BATCH_MAX_IDS', 50))
+
+# Leading indicator summaries precomputed by Celery beat (see snowflake_drf/queries/summaries.py)
+LI_SUMMARY_SNAPSHOT_INTERVAL = int(os.getenv('LI_SUMMARY_SNAPSHOT_INTERVAL', 60 * 5))  # seconds between refreshes
+LI_SUMMARY_SNAPSHOT_WINDOW = 60 * 60 * 24  # seconds summarized, ending at the refresh
+LI_SUMMARY_SNAPSHOT_TOLERANCE = int(os.getenv('LI_SUMMARY_SNAPSHOT_TOLERANCE', 60 * 15))  # seconds a request window may differ, also the TTL
+
 # CORS Configuration -#Do we really want to allow all? Api gateway will probably need more specific setup than here
 CORS_ALLOWED_ORIGINS = [
     "https://api.cglcloud.com",
@@ -32,16 +32,21 @@ urlpatterns = [
     path('snowflake/mtpm/', views.get_snowflake_mptm_list),
     path('snowflake/mtpm/metrics/', views.get_snowflake_mptm_targets),
     path('snowflake/mtpm/metrics/opportunity/', views.get_snowflake_mptm_opportunities),
+    path('snowflake/mtpm/metrics/export/', views.export_snowflake_mtpm_metrics),
     path('snowflake/mtpm/leadingindicators/', views.get_snowflake_mtpm_dim_leading_indicators),
     path('snowflake/mtpm/leadingindicators/summary/', views.get_snowflake_mtpm_leading_indicators_summary),
     path('snowflake/mtpm/leadingindicators/metrics/', views.get_snowflake_mtpm_metric_leading_indicators),
     path('snowflake/mtpm/leadingindicators/metrics/beta/', views.get_snowflake_mtpm_metric_leading_indicators_beta),
+    path('snowflake/mtpm/leadingindicators/metrics/beta/batch/', views.get_snowflake_mtpm_metric_leading_indicators_batch),
+    path('snowflake/mtpm/leadingindicators/metrics/export/', views.export_snowflake_mtpm_metric_leading_indicators),
     path('snowflake/mtpm/equipmenttags/', views.get_snowflake_mtpm_dim_equipment_tags),
     path('snowflake/mtpm/equipmenttags/metrics/', views.get_snowflake_mtpm_metric_equipment_tags),
     path('snowflake/mtpm/equipmenttags/metrics/beta/', views.get_snowflake_mtpm_metric_equipment_tags_beta),
     path('forms/', include('snowflake_drf.form_urls')),
     path('monitoring/snowflake/connection/', views.snowflake_persistent_connection_available),
     path('monitoring/snowflake/usable/', views.snowflake_is_usable),
+    path('monitoring/snowflake/stats/', views.snowflake_connection_stats),
+    path('monitoring/snowflake/queries/', views.snowflake_query_stats),
     path('test-authentication/', views.test_authentication),
     path('generate-sso-token/', views.generate_token_with_sso),
     path('generate-azure-oauth-token/', views.generate_azure_oauth_token),
@@ -1,5 +1,7 @@
 import logging
 import os
+import threading
+import time
 
 import msal
 from rest_framework import exceptions
@@ -7,6 +9,82 @@ from rest_framework import exceptions
 log = logging.getLogger(__name__)
 logging.getLogger("msal").setLevel(logging.ERROR)
 
+# seconds before expires_in at which a cached client credential token is renewed
+TOKEN_REFRESH_MARGIN = int(os.getenv('AZURE_TOKEN_REFRESH_MARGIN', 5 * 60))
+
+
+class ClientCredentialTokenProvider:
+    """
+    Process-wide client credential tokens for one app registration and resource.
+
+    The MSAL application, and with it its token cache and HTTP session, is created once and
+    reused. A token is handed out until ``refresh_margin`` seconds before it expires, so
+    reconnects and token endpoint calls don't go to Azure AD while it is still valid.
+    """
+
+    _providers = {}
+    _providers_lock = threading.Lock()
+
+    def __init__(self, tenant_id, client_id, client_secret, resource_id, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self._tenant_id = tenant_id
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._scope = [f'{resource_id}/.default']
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._app = None
+        self._access_token = None
+        self._expires_at = 0.0
+
+    @classmethod
+    def for_client(cls, tenant_id, client_id, client_secret, resource_id):
+        key = (tenant_id, client_id, client_secret, resource_id)
+        with cls._providers_lock:
+            if key not in cls._providers:
+                cls._providers[key] = cls(*key)
+            return cls._providers[key]
+
+    @classmethod
+    def _forget_providers(cls):
+        # after a fork the child must not share the parent's MSAL HTTP sessions
+        cls._providers = {}
+        cls._providers_lock = threading.Lock()
+
+    def _application(self):
+        if self._app is None:
+            # On the local, it gives SSL certificate chain error
+            verify_setting = os.getenv('LOCAL_ENVIRONMENT') != 'true'
+            self._app = msal.ConfidentialClientApplication(client_id=self._client_id,
+                                                           client_credential=self._client_secret,
+                                                           authority=f'https://login.microsoftonline.com/{self._tenant_id}',
+                                                           verify=verify_setting)
+        return self._app
+
+    def get_token(self, force_refresh=False):
+        """
+        Return a valid access token, asking Azure AD only when the cached one is (nearly)
+        expired or ``force_refresh`` is set, e.g. after Snowflake rejected it. Raises KeyError
+        when Azure AD answers without a token, like msal's error responses.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force_refresh and self._access_token and now < self._expires_at - self.refresh_margin:
+                return self._access_token
+
+            app = self._application()
+            if self._access_token:
+                # MSAL would keep answering from its own cache until the token runs out
+                for access_token in app.token_cache.find(msal.TokenCache.CredentialType.ACCESS_TOKEN):
+                    app.token_cache.remove_at(access_token)
+
+            log.debug('requesting a new client credential token from Azure AD')
+            token_details = app.acquire_token_for_client(self._scope)
+            if not token_details:
+                return None
+            self._access_token = token_details['access_token']
+            self._expires_at = now + int(token_details.get('expires_in', 0))
+            return self._access_token
+
 
 class AzureADToken:
     """ Application Registration is required and proper scope access need to be given.
@@ -63,25 +141,15 @@ class AzureADToken:
             log.error(f"Error while getting the token from Azure {err=}, {type(err)=}")
             raise exceptions.AuthenticationFailed(f"Error {err=}, {type(err)=}")
 
-    def client_credential_auth(self):
+    def client_credential_auth(self, force_refresh=False):
 
-        scope = [f'{self._resource_id}/.default']
-        authority = f'https://login.microsoftonline.com/{self._tenant_id}'
-        if os.getenv('LOCAL_ENVIRONMENT') == 'true':
-            verify_setting = False  # On the local, it gives SSL certificate chain error
-        else:
-            verify_setting = True
-
-        # Creating connection with Azure using the Client Credentials Flow
-        app = msal.ConfidentialClientApplication(client_id=self._client_id,
-                                                 client_credential=self._client_secret,
-                                                 authority=authority, verify=verify_setting)
+        # Tokens come from the process-wide provider, so the Client Credentials Flow only
+        # reaches Azure when the cached token is about to expire
+        provider = ClientCredentialTokenProvider.for_client(self._tenant_id, self._client_id,
+                                                            self._client_secret, self._resource_id)
         try:
-            # Acquire an access token for given account, without user interaction.
-            # https://msal-python.readthedocs.io/en/latest/#msal.PublicClientApplication.acquire_token_silent
-            token_details = app.acquire_token_for_client(scope)
-            if token_details:
-                access_token = token_details['access_token']
+            access_token = provider.get_token(force_refresh)
+            if access_token:
                 return access_token
             else:
                 log.debug('Error acquiring authorization token. Check your inputs')
@@ -94,4 +162,8 @@ class AzureADToken:
             logging.error(f'ClientCredentialToken - Something went wrong '
                           f'while getting the token from Azure -> {err}')
             raise exceptions.AuthenticationFailed(f'ClientCredentialToken - Something went wrong while '
-                                                  f'getting the token from Azure -> {err}')
\ No newline at end of file
+                                                  f'getting the token from Azure -> {err}')
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=ClientCredentialTokenProvider._forget_providers)
@@ -1,9 +1,40 @@
+import json
+
+import numpy as np
+from django.conf import settings
 from django.core.serializers.json import DjangoJSONEncoder
 from decimal import Decimal
 
+try:
+    import orjson
+except ImportError:  # responses are written with the json module then
+    orjson = None
+
+
 class MdpJSONEncoder(DjangoJSONEncoder):
-    
+
     def default(self, o):
         if isinstance(o, Decimal):
             return float(o)
-        return super().default(o)
\ No newline at end of file
+        if isinstance(o, np.generic):
+            return o.item()
+        if isinstance(o, np.ndarray):
+            return o.tolist()
+        return super().default(o)
+
+
+# orjson writes datetimes in ISO 8601 itself, UTC ones with 'Z' like DjangoJSONEncoder; unlike it,
+# it keeps all six digits of sub-second times (DjangoJSONEncoder cuts them to milliseconds)
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+
+def dumps(data, encoder=MdpJSONEncoder):
+    """
+    ``data`` as JSON bytes, written like json.dumps(data, cls=encoder). With orjson installed
+    and SNOWFLAKE_JSON_BACKEND 'orjson', orjson writes it: dicts, lists, strings, numbers,
+    datetimes and NumPy scalars and arrays natively, and whatever else (Decimals) with
+    encoder().default.
+    """
+    if orjson is not None and settings.SNOWFLAKE_JSON_BACKEND == 'orjson':
+        return orjson.dumps(data, default=encoder().default, option=ORJSON_OPTIONS)
+    return json.dumps(data, cls=encoder).encode()
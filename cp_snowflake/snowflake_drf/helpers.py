@@ -1,34 +1,19 @@
 import calendar
 import pytz
 from datetime import datetime, timezone
-from dateutil.parser import *
-from dateutil import tz
+
+from . import timestamps
 
 
 def get_datetime_obj(datetime_string, timezone=None):
-    if datetime_string is None:
-        return datetime_string
-    datetime_string = str(datetime_string)
-    return parse(datetime_string) if timezone is None else parse(datetime_string).replace(tzinfo=timezone)
+    return timestamps.parse(datetime_string, timezone)
 
 
 def convert_utc_to_local(datetime_utc, timezone):
-    if datetime_utc is None:
-        return datetime_utc
-    to_zone = tz.gettz(timezone)
-    from_zone = tz.gettz('UTC')
-    datetime_utc = datetime_utc.replace(tzinfo=from_zone)
-    localized = datetime_utc.astimezone(to_zone)
-    return localized
+    return timestamps.utc_to_local(datetime_utc, timezone)
 
 def convert_local_to_utc(datetime_local, origin_timezone):
-    if datetime_local is None:
-        return datetime_local
-    from_zone = tz.gettz(origin_timezone)
-    to_zone = tz.gettz('UTC')
-    datetime_utc = datetime_local.replace(tzinfo=from_zone)
-    localized = datetime_utc.astimezone(to_zone)
-    return localized
+    return timestamps.local_to_utc(datetime_local, origin_timezone)
 
 
 def format_datetime(datetime_obj):
@@ -37,12 +22,7 @@ def format_datetime(datetime_obj):
 
 
 def get_epoch(datetime_obj, local_timezone=None):
-    if local_timezone is None:
-        epoch_time = int(datetime.strftime(datetime_obj, '%s'))
-    else:
-        to_zone = tz.gettz(local_timezone)
-        epoch_time = int((datetime_obj - datetime(1970, 1, 1, tzinfo=to_zone)).total_seconds())
-    return epoch_time
+    return timestamps.epoch(datetime_obj, local_timezone)
 
 
 def get_eom(convert_date):
@@ -0,0 +1,30 @@
+import logging
+
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework import status
+
+from snowflake_wrapper.deadline import DeadlineExceeded, query_deadline
+
+log = logging.getLogger(__name__)
+
+
+class QueryDeadlineMiddleware:
+    """
+    Runs each request under a Snowflake query deadline of SNOWFLAKE_REQUEST_TIMEOUT seconds.
+    Queries that are still running at the deadline are cancelled, which frees the worker
+    and the warehouse, and the request is answered with 504 Gateway Timeout.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with query_deadline(settings.SNOWFLAKE_REQUEST_TIMEOUT):
+            return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, DeadlineExceeded):
+            return None
+        log.warning(f'{request.path}: {exception}')
+        return JsonResponse({'detail': str(exception)}, status=status.HTTP_504_GATEWAY_TIMEOUT)
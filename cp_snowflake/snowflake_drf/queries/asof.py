@@ -0,0 +1,55 @@
+import bisect
+from datetime import datetime, timezone
+from itertools import accumulate
+
+import numpy as np
+
+from .. import helpers
+
+
+def as_datetime(value):
+    # timestamps as naive datetimes, aware ones in UTC, so both compare and fit datetime64
+    value = value if isinstance(value, datetime) else helpers.get_datetime_obj(value)
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def as_datetime64(values):
+    return np.array([as_datetime(value) for value in values], dtype='datetime64[us]')
+
+
+class AsOfTargets:
+    """
+    Target values of one kind (e.g. all 'PB' rows of FACT_MTPM_TARGET), looked up as of a
+    point in time: the value of the last target at or before it.
+
+    The timestamps are parsed once. Targets come ordered by time from Snowflake, and they are
+    used in the order given: a point takes the last target before the first one that is
+    later than the point, the same as scanning the list until the first later target. That
+    cut is a binary search in the running maximum of the timestamps, which equals the
+    timestamps themselves when they are ordered.
+    """
+
+    def __init__(self, targets):
+        # targets are (timestamp, value) pairs; timestamps may be strings or datetimes
+        targets = list(targets)
+        self.values = [target[1] for target in targets]
+        self.reach = list(accumulate((as_datetime(target[0]) for target in targets), max))
+
+    def __len__(self):
+        return len(self.values)
+
+    def at(self, time):
+        """The target value as of ``time`` (None before the first target)."""
+        position = bisect.bisect_right(self.reach, as_datetime(time))
+        return self.values[position - 1] if position else None
+
+    def at_each(self, times):
+        """The target values as of each of ``times``, with one NumPy searchsorted."""
+        times = as_datetime64(times)
+        if not self.values:
+            return [None] * len(times)
+        positions = np.searchsorted(np.array(self.reach, dtype='datetime64[us]'), times, side='right')
+        return [self.values[position - 1] if position and not missing else None
+                for position, missing in zip(positions.tolist(), np.isnat(times).tolist())]
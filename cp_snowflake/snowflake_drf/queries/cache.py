@@ -0,0 +1,98 @@
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+log = logging.getLogger(__name__)
+
+
+def cache_key(name, arguments):
+    """
+    Key for ``name`` called with ``arguments`` (parameter name -> value). Parameters are
+    sorted by name and '' is the same as None, because the queries bind both as NULL, so
+    equivalent calls share one entry however they were made.
+    """
+    canonical = {param: None if value == '' else value for param, value in arguments.items()}
+    digest = hashlib.sha1(json.dumps(canonical, sort_keys=True, default=str).encode()).hexdigest()
+    return f'snowflake:{name}:{digest}'
+
+
+class QueryCache:
+    """
+    Results of rarely changing Snowflake queries, kept in the configured Django cache
+    (Redis outside of the tests).
+
+    Each query has a name (the name of its Statement). Its entries live for
+    SNOWFLAKE_CACHE_TTLS[name] seconds, or CACHE_TTL when the name has no TTL of its own.
+    Empty results are not cached, so an unreachable Snowflake isn't remembered. A failing
+    cache only costs the Snowflake round trip.
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def _count(self, name, outcome):
+        with self._lock:
+            counters = self._counters.setdefault(name, {'hits': 0, 'misses': 0, 'errors': 0})
+            counters[outcome] += 1
+
+    def ttl(self, name):
+        return settings.SNOWFLAKE_CACHE_TTLS.get(name, settings.CACHE_TTL)
+
+    def get_or_fetch(self, name, arguments, fetch):
+        key = cache_key(name, arguments)
+        cache = caches[self.alias]
+        try:
+            result = cache.get(key)
+        except Exception as err:
+            log.warning(f'query cache is unavailable: {err}')
+            self._count(name, 'errors')
+            return fetch()
+
+        if result is not None:
+            self._count(name, 'hits')
+            return result
+
+        self._count(name, 'misses')
+        result = fetch()
+        if result:
+            try:
+                cache.set(key, result, self.ttl(name))
+            except Exception as err:
+                log.warning(f'could not cache {name}: {err}')
+                self._count(name, 'errors')
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {name: dict(counters) for name, counters in self._counters.items()}
+
+
+query_cache = QueryCache()
+
+
+def cached_query(name):
+    """
+    Cache the records returned by a SnowflakeMethods method in ``query_cache`` under
+    ``name``, keyed on the method's arguments.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(list(bound.arguments.items())[1:])
+            return query_cache.get_or_fetch(name, arguments, lambda: method(self, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,143 @@
+import copy
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from snowflake_wrapper.deadline import DeadlineExceeded, remaining
+from .cache import cache_key
+
+log = logging.getLogger(__name__)
+
+
+def flight_key(kind, query):
+    # BoundStatements carry precompiled SQL, so identical calls have identical text and params
+    return cache_key(f'flight:{query.name}', {'kind': kind, 'sql': query.sql, 'params': list(query.params)})
+
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical queries that run at the same time.
+
+    The first caller of a key runs the query. Callers that arrive while it is in flight wait
+    for its result (each gets its own shallow copy) or its error, within their query
+    deadline. With SNOWFLAKE_COALESCE_ACROSS_WORKERS the leader also takes a lock in the
+    Django cache (Redis) and publishes its result there for SNOWFLAKE_COALESCE_RESULT_TTL
+    seconds, so leaders in other workers wait up to SNOWFLAKE_COALESCE_WAIT seconds for it
+    instead of running the query again.
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._counters = {'leaders': 0, 'coalesced': 0, 'remote_waits': 0, 'remote_results': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def do(self, key, fetch):
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+
+        if not leader:
+            self._count('coalesced')
+            return self._wait(flight)
+
+        self._count('leaders')
+        try:
+            flight.result = self._run(key, fetch)
+            # the callers may change their result (normalize_time_series does), so none of
+            # them gets the shared one
+            return copy.copy(flight.result)
+        except BaseException as err:
+            flight.error = err
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _wait(self, flight):
+        if not flight.done.wait(timeout=remaining()):
+            raise DeadlineExceeded('the request deadline passed while waiting for an identical query')
+        if flight.error is not None:
+            raise flight.error
+        return copy.copy(flight.result)
+
+    def _run(self, key, fetch):
+        if not settings.SNOWFLAKE_COALESCE_ACROSS_WORKERS:
+            return fetch()
+
+        cache = caches[self.alias]
+        lock_key, result_key = f'{key}:lock', f'{key}:result'
+        try:
+            leader = cache.add(lock_key, 1, settings.SNOWFLAKE_COALESCE_WAIT)
+            if not leader:
+                self._count('remote_waits')
+                result = self._wait_for_worker(cache, lock_key, result_key)
+                if result is not None:
+                    self._count('remote_results')
+                    return result
+        except Exception as err:
+            log.warning(f'query coalescing across workers is unavailable: {err}')
+            self._count('errors')
+            return fetch()
+
+        if not leader:
+            # the other worker failed or took too long
+            return fetch()
+        try:
+            result = fetch()
+            self._publish(cache, result_key, result)
+            return result
+        finally:
+            self._release(cache, lock_key)
+
+    def _wait_for_worker(self, cache, lock_key, result_key):
+        wait = settings.SNOWFLAKE_COALESCE_WAIT
+        left = remaining()
+        ends_at = time.monotonic() + (wait if left is None else min(wait, left))
+        while time.monotonic() < ends_at:
+            result = cache.get(result_key)
+            if result is not None:
+                return result
+            if cache.get(lock_key) is None:
+                return cache.get(result_key)
+            time.sleep(settings.SNOWFLAKE_COALESCE_POLL)
+        return None
+
+    def _publish(self, cache, result_key, result):
+        try:
+            cache.set(result_key, result, settings.SNOWFLAKE_COALESCE_RESULT_TTL)
+        except Exception as err:
+            log.warning(f'could not share query result with other workers: {err}')
+            self._count('errors')
+
+    def _release(self, cache, lock_key):
+        try:
+            cache.delete(lock_key)
+        except Exception as err:
+            log.warning(f'could not release query lock: {err}')
+            self._count('errors')
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._flights), **self._counters}
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,99 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .grouping import group_positions
+
+
+class SeriesColumns:
+    """
+    Column oriented time-series result.
+
+    ``series[i]`` is the i-th column of the SELECT as a NumPy array, so code written against
+    fetchall() rows (``row[i]``) reads the same column. Numeric columns are float64 with NaN for
+    NULL, everything else is an object array (timestamps as datetime objects).
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+
+    @classmethod
+    def from_arrow(cls, table):
+        if table is None:
+            return cls([])
+        return cls(_column_to_numpy(column) for column in table.columns)
+
+    @classmethod
+    def concat(cls, parts):
+        # parts without columns are empty results
+        parts = [part for part in parts if part.columns]
+        if not parts:
+            return cls([])
+        return cls(np.concatenate(columns) for columns in zip(*(part.columns for part in parts)))
+
+    @classmethod
+    def from_rows(cls, rows):
+        rows = list(rows)
+        if not rows:
+            return cls([])
+        return cls(np.array(column, dtype=object) for column in zip(*rows))
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def __getitem__(self, index):
+        return self.columns[index]
+
+    def rows(self):
+        return zip(*self.columns)
+
+    def take(self, mask):
+        """The rows selected by a boolean mask (or index array), as a new SeriesColumns."""
+        return SeriesColumns(column[mask] for column in self.columns)
+
+    def group_by(self, index):
+        """
+        The rows split by the values of column ``index`` in one pass, as key -> SeriesColumns
+        of the other columns, in the order the keys first appear (see grouping.group_by).
+        """
+        if not self.columns:
+            return {}
+        rest = SeriesColumns(column for position, column in enumerate(self.columns) if position != index)
+        return {key: rest.take(positions) for key, positions in group_positions(self.columns[index]).items()}
+
+    def prepend(self, *values):
+        """Insert one row in front of the series (None is stored as NaN in numeric columns)."""
+        self.columns = [np.concatenate((_values_like(column, value), column))
+                        for column, value in zip(self.columns, values)]
+        return self
+
+
+def as_series_columns(results):
+    # Accept fetchall() rows as well, e.g. results built by hand in tests
+    if isinstance(results, SeriesColumns):
+        return results
+    return SeriesColumns.from_rows(results)
+
+
+def numeric(column):
+    """Column as float64 with NaN for NULL."""
+    if column.dtype == np.float64:
+        return column
+    return np.array([np.nan if value is None else value for value in column], dtype=np.float64)
+
+
+def _values_like(column, value):
+    if column.dtype == np.float64:
+        return np.array([np.nan if value is None else value], dtype=np.float64)
+    return np.array([value], dtype=object)
+
+
+def _column_to_numpy(column):
+    if (pa.types.is_decimal(column.type) or pa.types.is_integer(column.type)
+            or pa.types.is_floating(column.type)):
+        return pc.cast(column, pa.float64(), safe=False).to_numpy()
+    if pa.types.is_timestamp(column.type):
+        # microseconds give plain datetime objects, like the cursor rows do
+        column = pc.cast(column, pa.timestamp('us', tz=column.type.tz), safe=False)
+        return np.array(column.to_pylist(), dtype=object)
+    return column.to_numpy()
@@ -0,0 +1,102 @@
+import math
+
+import numpy as np
+
+from .columns import numeric
+from ..timestamps import wall_times
+from .segments import naive
+
+LTTB = 'lttb'
+MIN_MAX = 'minmax'
+DOWNSAMPLING_MODES = (LTTB, MIN_MAX)
+
+# LTTB picks its points from Snowflake's min/max buckets, this many per point it returns
+LTTB_OVERSAMPLING = 4
+
+
+def min_max_buckets(time_column, value_column, series_column=None):
+    """
+    QUALIFY clause that keeps the rows with the lowest and the highest value of each
+    :bucket_seconds wide TIME_SLICE (of each series_column value, when the rows hold several
+    series), so at most two rows per bucket leave Snowflake and the extremes of the range
+    survive exactly.
+    """
+    partition = f"{series_column + ', ' if series_column else ''}TIME_SLICE({time_column}, :bucket_seconds, 'SECOND')"
+    return f"""QUALIFY ROW_NUMBER() OVER (PARTITION BY {partition}
+                                        ORDER BY {value_column} ASC NULLS LAST, {time_column}) = 1
+                    OR ROW_NUMBER() OVER (PARTITION BY {partition}
+                                        ORDER BY {value_column} DESC NULLS LAST, {time_column}) = 1"""
+
+
+def sql_buckets(max_points, mode):
+    # min/max buckets give two points each, LTTB gets more candidates than it returns
+    return max(1, max_points // 2) if mode == MIN_MAX else max_points * LTTB_OVERSAMPLING
+
+
+def bucket_seconds(date_time_start, date_time_end, buckets):
+    span = (naive(date_time_end) - naive(date_time_start)).total_seconds()
+    return max(1, math.ceil(span / buckets))
+
+
+def epoch_seconds(column):
+    return (wall_times(column) - np.datetime64(0, 'us')) / np.timedelta64(1, 's')
+
+
+def min_max_indices(times, values, buckets):
+    """Indices of the lowest and the highest value in each of ``buckets`` equal time spans."""
+    if len(times) == 0:
+        return np.arange(0)
+    width = (times[-1] - times[0]) / buckets
+    bucket = np.zeros(len(times), dtype=np.int64) if width == 0 else \
+        np.minimum(((times - times[0]) // width).astype(np.int64), buckets - 1)
+    order = np.lexsort((values, bucket))
+    firsts = np.r_[0, np.flatnonzero(np.diff(bucket[order])) + 1]
+    lasts = np.r_[firsts[1:], len(order)] - 1
+    return np.unique(np.concatenate((order[firsts], order[lasts])))
+
+
+def lttb_indices(times, values, threshold):
+    """Indices of the ``threshold`` points picked by largest-triangle-three-buckets."""
+    count = len(times)
+    if threshold >= count:
+        return np.arange(count)
+    if threshold < 3:
+        return np.unique([0, count - 1])[:max(threshold, 0)]
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, count - 1
+    every = (count - 2) / (threshold - 2)
+    previous = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * every) + 1
+        end = int((bucket + 1) * every) + 1
+        next_end = min(int((bucket + 2) * every) + 1, count)
+        average_time = times[end:next_end].mean()
+        average_value = values[end:next_end].mean()
+        areas = np.abs((times[previous] - average_time) * (values[start:end] - values[previous])
+                       - (times[previous] - times[start:end]) * (average_value - values[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def downsample(series, max_points, mode=LTTB, time_index=0, value_index=1):
+    """
+    At most ``max_points`` rows of a SeriesColumns, picked by LTTB or per time bucket
+    min/max. The first and the last row are always kept, so a gap marker added by
+    normalize_time_series stays; other rows without a value are dropped.
+    """
+    if not max_points or len(series) <= max_points:
+        return series
+
+    values = numeric(series[value_index])
+    present = np.flatnonzero(~np.isnan(values))
+    edges = {index for index in (0, len(series) - 1) if np.isnan(values[index])}
+    budget = max(max_points - len(edges), 0)
+
+    times = epoch_seconds(series[time_index][present])
+    if mode == MIN_MAX:
+        picked = min_max_indices(times, values[present], max(1, budget // 2))
+    else:
+        picked = lttb_indices(times, values[present], budget)
+    return series.take(np.union1d(present[picked], np.array(sorted(edges), dtype=np.int64)))
@@ -6,20 +6,17 @@ from .. import helpers
 import logging
 from decimal import Decimal, DecimalException
 from .methods import SnowflakeMethods
+from .columns import as_series_columns, numeric
+from .grouping import group_by
+from ..streaming import StreamedSeries
+from .cache import cached_query
+from .downsampling import LTTB, downsample, min_max_buckets
+from .pipeline import epoch_ms_columns
+from .statements import Statement, resolve_uom, uom_statements
 
 log = logging.getLogger(__name__)
 
-
-class EquipmentTags(SnowflakeMethods):
-    
-    def get_snowflake_equipment_tag_dim_data(self, leading_indicator_id, equipment_tag_id=''):
-
-        records = []
-
-        if equipment_tag_id:
-            equipment_tag_id = f"AND equipment_tag_id = '{equipment_tag_id}'"
-
-        results = self.wrapper.validate_and_execute(f"""
+EQUIPMENT_TAG_DIM = Statement('eq.dim', """
                 SELECT 
                     equipment_tag_id,
                     leading_indicator_id,
@@ -36,13 +33,128 @@ class EquipmentTags(SnowflakeMethods):
                     uom_metric,
                     uom_imperial
                 FROM 
-                    {os.getenv("SNOWFLAKE_DATABASE")}
-                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                    .DIM_EQUIPMENT_TAG
-                WHERE leading_indicator_id = '{leading_indicator_id}'
-                {equipment_tag_id if equipment_tag_id else ''}
+                    {schema}.DIM_EQUIPMENT_TAG
+                WHERE leading_indicator_id = :leading_indicator_id
+                AND (:equipment_tag_id IS NULL OR equipment_tag_id = :equipment_tag_id)
+                    """)
+
+EQUIPMENT_TAG_TS = Statement('eq.ts', """
+                SELECT 
+                    dt.equipment_tag_value_metric,
+                    dt.equipment_tag_value_imperial,
+                    dt.equipment_tag_value_timestamp_utc,
+                    dt.equipment_tag_value_timestamp_local,
+                    dt.is_equipment_tag_substituted_flag
+                FROM 
+                    {schema}."FACT_EQUIPMENT_TAG" dt                  
+                WHERE dt.equipment_tag_id = :equipment_tag_id
+                AND (dt.equipment_tag_value_timestamp_utc BETWEEN :date_time_start AND :date_time_end)
+                ORDER BY dt.equipment_tag_value_timestamp_utc
+                    """)
+
+EQUIPMENT_TAG_TS_BY_LEADING_INDICATOR = Statement('eq.ts.li', """
+                SELECT 
+                    ft.equipment_tag_value_metric,
+                    ft.equipment_tag_value_imperial,
+                    ft.equipment_tag_value_timestamp_utc,
+                    ft.equipment_tag_value_timestamp_local,
+                    ft.is_equipment_tag_substituted_flag,
+                    ft.equipment_tag_id
+                FROM 
+                    {schema}."FACT_EQUIPMENT_TAG" ft    
+                LEFT JOIN 
+                    {schema}."DIM_EQUIPMENT_TAG" dt 
+                ON dt.equipment_tag_id = ft.equipment_tag_id                    
+                WHERE dt.leading_indicator_id = :leading_indicator_id              
+                AND (ft.equipment_tag_value_timestamp_utc BETWEEN :date_time_start AND :date_time_end)
+                ORDER BY ft.equipment_tag_value_timestamp_utc
+                    """)
+
+EQUIPMENT_TAG_BETA_DIM = uom_statements('eq.beta.dim', """
+                SELECT 
+                    dt.equipment_tag_id,
+                    dt.leading_indicator_id,
+                    dt.equipment_tag_name,
+                    dt.equipment_tag_display_name,
+                    dt.display_high_{uom} as display_high,
+                    dt.display_low_{uom} as display_low,
+                    dt.uom_{uom} as uom,
+                    dt.max_{uom},
+                    dt.min_{uom}
+                FROM 
+                    {schema}.DIM_EQUIPMENT_TAG dt                  
+                WHERE dt.leading_indicator_id = :leading_indicator_id
+                AND (:equipment_tag_id IS NULL OR dt.equipment_tag_id = :equipment_tag_id)
+                    """)
+
+# {epoch_ms} is empty, or the epoch_ms_columns of the _SQL_TIMES variants (see pipeline.py)
+EQUIPMENT_TAG_BETA_TS_SQL = """
+                SELECT 
+                    dt.equipment_tag_value_timestamp_utc as time,
+                    dt.equipment_tag_value_{uom} as value{epoch_ms}
+                FROM 
+                    {schema}."FACT_EQUIPMENT_TAG" dt                  
+                WHERE dt.equipment_tag_id = :equipment_tag_id
+                AND (dt.equipment_tag_value_timestamp_utc BETWEEN :date_time_start AND :date_time_end)
+                {min_max_buckets}
+                ORDER BY dt.equipment_tag_value_timestamp_utc
                     """
-                                                    )
+
+EQUIPMENT_TAG_BETA_TS = uom_statements('eq.beta.ts', EQUIPMENT_TAG_BETA_TS_SQL, epoch_ms='', min_max_buckets='')
+
+EQUIPMENT_TAG_BETA_TS_SQL_TIMES = uom_statements('eq.beta.ts.sqltimes', EQUIPMENT_TAG_BETA_TS_SQL,
+    epoch_ms=epoch_ms_columns('dt.equipment_tag_value_timestamp_utc'), min_max_buckets='')
+
+EQUIPMENT_TAG_BETA_TS_MIN_MAX = uom_statements('eq.beta.ts.minmax', EQUIPMENT_TAG_BETA_TS_SQL, epoch_ms='',
+    min_max_buckets=min_max_buckets('dt.equipment_tag_value_timestamp_utc', 'dt.equipment_tag_value_{uom}'))
+
+EQUIPMENT_TAG_BETA_TS_MIN_MAX_SQL_TIMES = uom_statements('eq.beta.ts.minmax.sqltimes', EQUIPMENT_TAG_BETA_TS_SQL,
+    epoch_ms=epoch_ms_columns('dt.equipment_tag_value_timestamp_utc'),
+    min_max_buckets=min_max_buckets('dt.equipment_tag_value_timestamp_utc', 'dt.equipment_tag_value_{uom}'))
+
+EQUIPMENT_TAG_BETA_TS_BY_LEADING_INDICATOR_SQL = """
+                SELECT 
+                    ft.equipment_tag_value_timestamp_utc as time,
+                    ft.equipment_tag_value_{uom} as value,
+                    ft.equipment_tag_id{epoch_ms}
+                FROM 
+                    {schema}."FACT_EQUIPMENT_TAG" ft    
+                LEFT JOIN 
+                    {schema}."DIM_EQUIPMENT_TAG" dt 
+                ON dt.equipment_tag_id = ft.equipment_tag_id                    
+                WHERE dt.leading_indicator_id = :leading_indicator_id              
+                AND (ft.equipment_tag_value_timestamp_utc BETWEEN :date_time_start AND :date_time_end)
+                {min_max_buckets}
+                ORDER BY ft.equipment_tag_value_timestamp_utc
+                    """
+
+EQUIPMENT_TAG_BETA_TS_BY_LEADING_INDICATOR = uom_statements('eq.beta.ts.li',
+    EQUIPMENT_TAG_BETA_TS_BY_LEADING_INDICATOR_SQL, epoch_ms='', min_max_buckets='')
+
+EQUIPMENT_TAG_BETA_TS_BY_LEADING_INDICATOR_SQL_TIMES = uom_statements('eq.beta.ts.li.sqltimes',
+    EQUIPMENT_TAG_BETA_TS_BY_LEADING_INDICATOR_SQL, epoch_ms=epoch_ms_columns('ft.equipment_tag_value_timestamp_utc'),
+    min_max_buckets='')
+
+EQUIPMENT_TAG_BETA_TS_BY_LEADING_INDICATOR_MIN_MAX = uom_statements('eq.beta.ts.li.minmax',
+    EQUIPMENT_TAG_BETA_TS_BY_LEADING_INDICATOR_SQL, epoch_ms='',
+    min_max_buckets=min_max_buckets('ft.equipment_tag_value_timestamp_utc', 'ft.equipment_tag_value_{uom}',
+                                    'ft.equipment_tag_id'))
+
+EQUIPMENT_TAG_BETA_TS_BY_LEADING_INDICATOR_MIN_MAX_SQL_TIMES = uom_statements('eq.beta.ts.li.minmax.sqltimes',
+    EQUIPMENT_TAG_BETA_TS_BY_LEADING_INDICATOR_SQL, epoch_ms=epoch_ms_columns('ft.equipment_tag_value_timestamp_utc'),
+    min_max_buckets=min_max_buckets('ft.equipment_tag_value_timestamp_utc', 'ft.equipment_tag_value_{uom}',
+                                    'ft.equipment_tag_id'))
+
+
+class EquipmentTags(SnowflakeMethods):
+    
+    @cached_query('eq.dim')
+    def get_snowflake_equipment_tag_dim_data(self, leading_indicator_id, equipment_tag_id=''):
+
+        records = []
+
+        results = self.fetch(EQUIPMENT_TAG_DIM.bind(leading_indicator_id=leading_indicator_id,
+                                                    equipment_tag_id=equipment_tag_id or None))
 
         for equipment_tag in results:
             records.append({
@@ -71,52 +183,25 @@ class EquipmentTags(SnowflakeMethods):
 
         log.info(f"Fetching EQ metric data for eq tag {equipment_tag_id} and leading indicator {leading_indicator_id}")
 
-        equipment_tag_id_clause = ''
-
         if equipment_tag_id:
-            equipment_tag_id_clause = f" AND dt.equipment_tag_id = '{equipment_tag_id}'"
-            time_series_select = f"""
-                SELECT 
-                    dt.equipment_tag_value_metric,
-                    dt.equipment_tag_value_imperial,
-                    dt.equipment_tag_value_timestamp_utc,
-                    dt.equipment_tag_value_timestamp_local,
-                    dt.is_equipment_tag_substituted_flag
-                FROM 
-                    {os.getenv("SNOWFLAKE_DATABASE")}
-                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                    ."FACT_EQUIPMENT_TAG" dt                  
-                WHERE dt.equipment_tag_id = '{equipment_tag_id}'
-                AND (dt.equipment_tag_value_timestamp_utc BETWEEN '{date_time_start}' AND '{date_time_end}')
-                ORDER BY dt.equipment_tag_value_timestamp_utc
-                    """
+            time_series_select = EQUIPMENT_TAG_TS.bind(equipment_tag_id=equipment_tag_id,
+                                                       date_time_start=date_time_start,
+                                                       date_time_end=date_time_end)
         else:
-            time_series_select = f"""
-                SELECT 
-                    ft.equipment_tag_value_metric,
-                    ft.equipment_tag_value_imperial,
-                    ft.equipment_tag_value_timestamp_utc,
-                    ft.equipment_tag_value_timestamp_local,
-                    ft.is_equipment_tag_substituted_flag
-                FROM 
-                    {os.getenv("SNOWFLAKE_DATABASE")}
-                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                    ."FACT_EQUIPMENT_TAG" ft    
-                LEFT JOIN 
-                    {os.getenv("SNOWFLAKE_DATABASE")}
-                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                    ."DIM_EQUIPMENT_TAG" dt 
-                ON dt.equipment_tag_id = ft.equipment_tag_id                    
-                WHERE dt.leading_indicator_id = '{leading_indicator_id}'              
-                AND (ft.equipment_tag_value_timestamp_utc BETWEEN '{date_time_start}' AND '{date_time_end}')
-                ORDER BY ft.equipment_tag_value_timestamp_utc
-                    """
+            time_series_select = EQUIPMENT_TAG_TS_BY_LEADING_INDICATOR.bind(leading_indicator_id=leading_indicator_id,
+                                                                            date_time_start=date_time_start,
+                                                                            date_time_end=date_time_end)
 
-        dim_results = self.get_snowflake_equipment_tag_metric_dim_data(leading_indicator_id,
-                                                                       equipment_tag_id_clause)
-        time_series_results = self.get_snowflake_equipment_tag_metric_time_series_data(time_series_select,
-                                                                                       date_time_start,
-                                                                                       date_time_end)
+        dim_results = self.get_snowflake_equipment_tag_metric_dim_data(leading_indicator_id, equipment_tag_id)
+        if equipment_tag_id:
+            time_series_results = self.get_snowflake_equipment_tag_metric_time_series_data(time_series_select,
+                                                                                           date_time_start,
+                                                                                           date_time_end)
+            time_series_by_tag = {equipment_tag[0]: time_series_results for equipment_tag in dim_results}
+        else:
+            time_series_by_tag = self.get_snowflake_equipment_tag_metric_time_series_data_by_tag(time_series_select,
+                                                                                                 date_time_start,
+                                                                                                 date_time_end)
 
         for equipment_tag in dim_results:
             records.append({
@@ -134,49 +219,34 @@ class EquipmentTags(SnowflakeMethods):
                 'min_imperial': equipment_tag[11],
                 'uom_metric': equipment_tag[12],
                 'uom_imperial': equipment_tag[13],
-                # Pass the entire filtered datase to build the time series array inside the main object
-                'time_series': self.get_snowflake_equipment_tag_time_series(time_series_results)
+                'time_series': self.get_snowflake_equipment_tag_time_series(time_series_by_tag.get(equipment_tag[0], []))
             })
 
         return records
 
-    def get_snowflake_equipment_tag_metric_dim_data(self, leading_indicator_id, equipment_tag_id_clause):
-
-        result = self.wrapper.validate_and_execute(f"""
-                    SELECT 
-                        dt.equipment_tag_id,
-                        dt.leading_indicator_id,
-                        dt.equipment_tag_name,
-                        dt.equipment_tag_display_name,
-                        dt.display_high_metric,
-                        dt.display_low_metric,
-                        dt.display_high_imperial,
-                        dt.display_low_imperial,
-                        dt.max_metric,
-                        dt.min_metric,
-                        dt.max_imperial,
-                        dt.min_imperial,
-                        dt.uom_metric,
-                        dt.uom_imperial
-                    FROM
-                        {os.getenv("SNOWFLAKE_DATABASE")}
-                        .{os.getenv("SNOWFLAKE_SCHEMA")}
-                        .DIM_EQUIPMENT_TAG dt
-                    WHERE dt.leading_indicator_id = '{leading_indicator_id}'
-                    {equipment_tag_id_clause if equipment_tag_id_clause else ''}
-                        """
-                                                   )
+    def get_snowflake_equipment_tag_metric_dim_data(self, leading_indicator_id, equipment_tag_id=None):
+
+        result = self.fetch(EQUIPMENT_TAG_DIM.bind(leading_indicator_id=leading_indicator_id,
+                                                   equipment_tag_id=equipment_tag_id or None))
 
         return result
 
     def get_snowflake_equipment_tag_metric_time_series_data(self, time_series_select, date_time_start,
                                                             date_time_end):
 
-        time_series_results = self.wrapper.validate_and_execute(time_series_select)
+        time_series_results = self.fetch(time_series_select)
         time_series_results = self.normalize_time_series(time_series_results, date_time_start, date_time_end, 2)
 
         return time_series_results
 
+    def get_snowflake_equipment_tag_metric_time_series_data_by_tag(self, time_series_select, date_time_start,
+                                                                   date_time_end):
+        # The rows of all tags of a leading indicator end with their equipment_tag_id
+        time_series_by_tag = group_by(self.fetch(time_series_select), 5)
+
+        return {tag: self.normalize_time_series(rows, date_time_start, date_time_end, 2)
+                for tag, rows in time_series_by_tag.items()}
+
     def get_snowflake_equipment_tag_time_series(self, time_series_results):
 
         records = []
@@ -193,138 +263,120 @@ class EquipmentTags(SnowflakeMethods):
         return records
 
     def get_snowflake_equipment_tag_metric_data_beta(self, equipment_tag_id, leading_indicator_id, date_time_start,
-                                                     date_time_end, preferred_uom, timezone):
+                                                     date_time_end, preferred_uom, timezone, max_points=None,
+                                                     downsampling=LTTB, columnar=False):
 
         records = []
 
         log.info(f"Fetching EQ metric data for eq tag {equipment_tag_id} and leading indicator {leading_indicator_id}")
 
-        equipment_tag_id_clause = ''
+        uom = resolve_uom(preferred_uom)
+
+        dim_results = self.fetch(EQUIPMENT_TAG_BETA_DIM[uom].bind(leading_indicator_id=leading_indicator_id,
+                                                                  equipment_tag_id=equipment_tag_id or None))
+
+        # with SQL times Snowflake adds the epoch columns of the points in the request's zone
+        sql_times_zone = self.sql_times_zone(timezone)
+        sql_times = {'timezone': sql_times_zone} if sql_times_zone else {}
+
+        if equipment_tag_id and max_points:
+            statements = EQUIPMENT_TAG_BETA_TS_MIN_MAX_SQL_TIMES if sql_times else EQUIPMENT_TAG_BETA_TS_MIN_MAX
+            time_series_results = self.fetch_series_downsampled(statements[uom], date_time_start, date_time_end,
+                                                                max_points, downsampling,
+                                                                equipment_tag_id=equipment_tag_id, **sql_times)
+        elif equipment_tag_id:
+            statements = EQUIPMENT_TAG_BETA_TS_SQL_TIMES if sql_times else EQUIPMENT_TAG_BETA_TS
+            time_series_results = self.fetch_series_segmented(statements[uom], date_time_start, date_time_end,
+                                                               equipment_tag_id=equipment_tag_id, **sql_times)
+        elif max_points:
+            statements = EQUIPMENT_TAG_BETA_TS_BY_LEADING_INDICATOR_MIN_MAX_SQL_TIMES if sql_times \
+                else EQUIPMENT_TAG_BETA_TS_BY_LEADING_INDICATOR_MIN_MAX
+            time_series_results = self.fetch_series_downsampled(statements[uom], date_time_start, date_time_end,
+                                                                max_points, downsampling,
+                                                                leading_indicator_id=leading_indicator_id, **sql_times)
+        else:
+            statements = EQUIPMENT_TAG_BETA_TS_BY_LEADING_INDICATOR_SQL_TIMES if sql_times \
+                else EQUIPMENT_TAG_BETA_TS_BY_LEADING_INDICATOR
+            time_series_results = self.fetch_series_segmented(statements[uom], date_time_start, date_time_end,
+                                                               leading_indicator_id=leading_indicator_id, **sql_times)
 
         if equipment_tag_id:
-            equipment_tag_id_clause = f" AND dt.equipment_tag_id = '{equipment_tag_id}'"
-            time_series_select = f"""
-                SELECT 
-                    dt.equipment_tag_value_timestamp_utc as time,
-                    dt.equipment_tag_value_{preferred_uom} as value
-                FROM 
-                    {os.getenv("SNOWFLAKE_DATABASE")}
-                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                    ."FACT_EQUIPMENT_TAG" dt                  
-                WHERE dt.equipment_tag_id = '{equipment_tag_id}'
-                AND (dt.equipment_tag_value_timestamp_utc BETWEEN '{date_time_start}' AND '{date_time_end}')
-                ORDER BY dt.equipment_tag_value_timestamp_utc
-                    """
+            time_series_by_tag = {equipment_tag[0]: time_series_results for equipment_tag in dim_results}
         else:
-            time_series_select = f"""
-                SELECT 
-                    ft.equipment_tag_value_timestamp_utc as time,
-                    ft.equipment_tag_value_{preferred_uom} as value
-                FROM 
-                    {os.getenv("SNOWFLAKE_DATABASE")}
-                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                    ."FACT_EQUIPMENT_TAG" ft    
-                LEFT JOIN 
-                    {os.getenv("SNOWFLAKE_DATABASE")}
-                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                    ."DIM_EQUIPMENT_TAG" dt 
-                ON dt.equipment_tag_id = ft.equipment_tag_id                    
-                WHERE dt.leading_indicator_id = '{leading_indicator_id}'              
-                AND (ft.equipment_tag_value_timestamp_utc BETWEEN '{date_time_start}' AND '{date_time_end}')
-                ORDER BY ft.equipment_tag_value_timestamp_utc
-                    """
+            # (time, value, equipment_tag_id, ...) rows split into one (time, value, ...) series per tag
+            time_series_by_tag = as_series_columns(time_series_results).group_by(2)
 
-        dim_results = self.wrapper.validate_and_execute(f"""
-                SELECT 
-                    dt.equipment_tag_id,
-                    dt.leading_indicator_id,
-                    dt.equipment_tag_name,
-                    dt.equipment_tag_display_name,
-                    dt.display_high_{preferred_uom} as display_high,
-                    dt.display_low_{preferred_uom} as display_low,
-                    dt.uom_{preferred_uom} as uom,
-                    dt.max_{preferred_uom},
-                    dt.min_{preferred_uom}
-                FROM 
-                    {os.getenv("SNOWFLAKE_DATABASE")}
-                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                    .DIM_EQUIPMENT_TAG dt                  
-                WHERE dt.leading_indicator_id = '{leading_indicator_id}'
-                {equipment_tag_id_clause if equipment_tag_id_clause else ''}
-                    """
-                                                        )
+        for equipment_tag in dim_results:
+            time_series_results = self.normalize_time_series(time_series_by_tag.get(equipment_tag[0], []),
+                                                             date_time_start, date_time_end)
+            time_series = self.get_snowflake_equipment_tag_time_series_beta(time_series_results, timezone, max_points,
+                                                                            downsampling, columnar)
 
-        time_series_results = self.wrapper.validate_and_execute(time_series_select)
-        time_series_results = self.normalize_time_series(time_series_results, date_time_start, date_time_end)
+            record = self.build_equipment_tag_beta_record(equipment_tag)
+            record['ts_max'] = time_series[2]
+            record['ts_min'] = time_series[1]
+            record['time_series'] = time_series[0]
+            records.append(record)
 
+        return records
+
+    def stream_snowflake_equipment_tag_metric_data_beta(self, equipment_tag_id, leading_indicator_id, date_time_start,
+                                                        date_time_end, preferred_uom, timezone):
+        # Like get_snowflake_equipment_tag_metric_data_beta, but each tag's time series is read from
+        # Snowflake while the response is written (see streaming.stream_results). Every tag streams
+        # its own FACT_EQUIPMENT_TAG rows, one query at a time.
+        uom = resolve_uom(preferred_uom)
+        timezone = 'UTC' if timezone is None else timezone
+
+        dim_results = self.fetch(EQUIPMENT_TAG_BETA_DIM[uom].bind(leading_indicator_id=leading_indicator_id,
+                                                                  equipment_tag_id=equipment_tag_id or None))
+
+        records = []
         for equipment_tag in dim_results:
-            time_series = self.get_snowflake_equipment_tag_time_series_beta(time_series_results, timezone)
+            time_series_select = EQUIPMENT_TAG_BETA_TS[uom].bind(equipment_tag_id=equipment_tag[0],
+                                                                 date_time_start=date_time_start,
+                                                                 date_time_end=date_time_end)
+            rows = self.normalize_time_series_stream(self.fetch_stream(time_series_select), date_time_start)
 
-            records.append({
-                'equipment_tag_id': equipment_tag[0],
-                'leading_indicator_id': equipment_tag[1],
-                'equipment_tag_name': equipment_tag[2],
-                'equipment_tag_display_name': equipment_tag[3],
-                'display_high': self.convert_to_decimal(equipment_tag[4]),
-                'display_low': self.convert_to_decimal(equipment_tag[5]),
-                'ts_max': time_series[2],
-                'ts_min': time_series[1],
-                'uom': equipment_tag[6],
-                'max_target_value': equipment_tag[7],
-                'min_target_value': equipment_tag[8],
-                # Pass the entire filtered datase to build the time series array inside the main object
-                'time_series': time_series[0]
-            })
+            record = self.build_equipment_tag_beta_record(equipment_tag)
+            record['time_series'] = StreamedSeries(self.build_series_point(time_value, value, timezone)
+                                                   for time_value, value in rows)
+            records.append(record)
 
         return records
 
-    def get_snowflake_equipment_tag_time_series_beta(self, time_series_results, timezone=None):
+    def build_equipment_tag_beta_record(self, equipment_tag):
+        return {
+            'equipment_tag_id': equipment_tag[0],
+            'leading_indicator_id': equipment_tag[1],
+            'equipment_tag_name': equipment_tag[2],
+            'equipment_tag_display_name': equipment_tag[3],
+            'display_high': self.convert_to_decimal(equipment_tag[4]),
+            'display_low': self.convert_to_decimal(equipment_tag[5]),
+            'uom': equipment_tag[6],
+            'max_target_value': equipment_tag[7],
+            'min_target_value': equipment_tag[8],
+        }
 
-        records = []
+    def get_snowflake_equipment_tag_time_series_beta(self, time_series_results, timezone=None, max_points=None,
+                                                     downsampling=LTTB, columnar=False):
 
-        max = None
-        min = None
+        records = {'epoch': [], 'value': []} if columnar else []
 
         if timezone is None:
             timezone = 'UTC'
 
-        last_valid_value = None
+        series = as_series_columns(time_series_results)
+        if len(series) == 0:
+            return [records, None, None]
 
-        for res in time_series_results:
-            if res[1] is None:
-                res_value = None
-            else:
-                res_value = Decimal(round(Decimal(res[1]), 4))
-                last_valid_value = res_value
-            try:
-                if max is None or (res_value is not None and res_value > max):
-                    max = res_value
-            except DecimalException:
-                    log.error(f'Error occurred processing decimal values: max: {max} res_value: {res_value}')
-            try:
-                if min is None or (res_value is not None and res_value < min):
-                    min = res_value
-            except DecimalException:
-                    log.error(f'Error occurred processing decimal values: min: {min} res_value: {res_value}')
-            if res[0] is not None:
-                time = helpers.convert_utc_to_local(helpers.get_datetime_obj(res[0]), timezone)
-                formatted_date = helpers.format_datetime(time)
-                time_epoch = helpers.get_epoch(time, timezone)
-            else:
-                res_value = last_valid_value
-                time = helpers.convert_utc_to_local(helpers.get_datetime_obj(res[2]), timezone)
-                formatted_date = helpers.format_datetime(time)
-                time_epoch = helpers.get_epoch(time, timezone)
-            records.append({
-                'time': time,
-                'value': res_value,
-                'formatted_date': formatted_date,
-                'time_epoch': time_epoch,
-            })
-        
-        if max is not None:
-            max = Decimal(max)
-        if min is not None:
-            min = Decimal(min)
+        # ts_min/ts_max are taken before downsampling, so they stay exact
+        ts_min, ts_max = self.series_min_max(numeric(series[1]))
+        series = downsample(series, max_points, downsampling)
+
+        # series fetched with SQL times have their (UTC, local) epoch milliseconds after the value
+        epoch_ms = [numeric(column) for column in series.columns[2:4]] if len(series.columns) == 4 else None
+        build = self.build_series_columns if columnar else self.build_series_points
+        records = build(series[0], numeric(series[1]), timezone, epoch_ms)
 
-        return [records, min, max]
\ No newline at end of file
+        return [records, ts_min, ts_max]
@@ -0,0 +1,26 @@
+def group_by(rows, key):
+    """
+    Rows split by key in one pass: key -> list of its rows. ``key`` is a column index or a
+    function of the row. Groups come in the order their keys first appear and each keeps
+    the order of its rows, so time ordered results stay time ordered per group.
+    """
+    get_key = key if callable(key) else (lambda row: row[key])
+    groups = {}
+    for row in rows:
+        row_key = get_key(row)
+        if row_key in groups:
+            groups[row_key].append(row)
+        else:
+            groups[row_key] = [row]
+    return groups
+
+
+def group_positions(keys):
+    """Like group_by for one column of keys: key -> the positions that hold it, ascending."""
+    groups = {}
+    for position, row_key in enumerate(keys):
+        if row_key in groups:
+            groups[row_key].append(position)
+        else:
+            groups[row_key] = [position]
+    return groups
@@ -6,21 +6,17 @@ from .. import helpers
 import logging
 from decimal import Decimal, DecimalException
 from .methods import SnowflakeMethods
+from .columns import as_series_columns, numeric
+from ..streaming import StreamedSeries
 
-log = logging.getLogger(__name__)
-
-
-class LeadingIndicators(SnowflakeMethods):
-    
-
-    def get_snowflake_leading_indicator_dim_data(self, mtpm_id, leading_indicator_id=''):
+from .cache import cached_query
+from .downsampling import LTTB, downsample, min_max_buckets
+from .pipeline import epoch_ms_columns
+from .statements import Statement, in_list, resolve_uom, uom_statements
 
-        records = []
-
-        if leading_indicator_id:
-            leading_indicator_id = f"AND leading_indicator_id = '{leading_indicator_id}'"
+log = logging.getLogger(__name__)
 
-        results = self.wrapper.validate_and_execute(f"""
+LEADING_INDICATOR_DIM = Statement('li.dim', """
                 SELECT 
                     leading_indicator_id,
                     leading_indicator_name,
@@ -43,13 +39,391 @@ class LeadingIndicators(SnowflakeMethods):
                     uom_inside_envelope,
                     pi_vision_display_url                
                 FROM 
-                    {os.getenv("SNOWFLAKE_DATABASE")}
-                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                    .DIM_LEADING_INDICATOR                    
-                WHERE mtpm_id = '{mtpm_id}'
-                {leading_indicator_id if leading_indicator_id else ''}
-                    """
-                                                    )
+                    {schema}.DIM_LEADING_INDICATOR                    
+                WHERE mtpm_id = :mtpm_id
+                AND (:leading_indicator_id IS NULL OR leading_indicator_id = :leading_indicator_id)
+                    """)
+
+LEADING_INDICATOR_ID = Statement('li.id', """SELECT leading_indicator_id FROM {schema}.DIM_LEADING_INDICATOR
+            WHERE mtpm_id = :mtpm_id""")
+
+LEADING_INDICATOR_TS = Statement('li.ts', """SELECT
+                fl.leading_indicator_value_metric,
+                fl.leading_indicator_value_imperial,
+                fl.leading_indicator_value_timestamp_utc,
+                fl.leading_indicator_value_timestamp_local,
+                fl.is_leading_indicator_substituted_flag
+            FROM
+                {schema}.FACT_LEADING_INDICATOR fl
+            WHERE
+                fl.leading_indicator_id = :leading_indicator_id AND
+                (
+                    leading_indicator_value_timestamp_utc >= :date_time_start
+                    AND leading_indicator_value_timestamp_utc <= :date_time_end
+                )
+            ORDER BY
+                leading_indicator_value_timestamp_utc""")
+
+LEADING_INDICATOR_METRIC_DIM = Statement('li.metric.dim', """SELECT
+                l.leading_indicator_id,
+                l.leading_indicator_name,
+                l.leading_indicator_display_name,
+                l.is_big_energy_user,
+                l.is_big_water_user,
+                l.corrective_action,
+                l.corrective_action_input_language,
+                l.cmo,
+                l.display_high_metric,
+                l.display_low_metric,
+                l.display_high_imperial,
+                l.display_low_imperial,
+                l.max_metric,
+                l.min_metric,
+                l.max_imperial,
+                l.min_imperial,
+                l.uom_metric,
+                l.uom_imperial,
+                l.uom_inside_envelope,
+                (SELECT TOP 1 leading_indicator_inside_envelope_last1h_value
+            
+            FROM
+                {schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
+            WHERE
+                fl.leading_indicator_id = :leading_indicator_id AND
+                leading_indicator_value_timestamp_utc <= :date_time_end
+                AND leading_indicator_inside_envelope_last1h_value IS NOT NULL
+            ORDER BY
+                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_enevelope_last1h_value,
+            (SELECT TOP 1 leading_indicator_inside_envelope_last8h_value
+            
+            FROM
+                {schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
+            WHERE
+                fl.leading_indicator_id = :leading_indicator_id AND
+                leading_indicator_value_timestamp_utc <= :date_time_end
+                AND leading_indicator_inside_envelope_last8h_value IS NOT NULL
+            ORDER BY
+                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_envelope_last8h_value,
+            (SELECT TOP 1 leading_indicator_inside_envelope_last12h_value
+            
+            FROM
+                {schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
+            WHERE
+                fl.leading_indicator_id = :leading_indicator_id AND
+                leading_indicator_value_timestamp_utc <= :date_time_end
+                AND leading_indicator_inside_envelope_last12h_value IS NOT NULL
+            ORDER BY
+                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_envelope_last12h_value,
+            (SELECT TOP 1 leading_indicator_inside_envelope_last24h_value
+            
+            FROM
+                {schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
+            WHERE
+                fl.leading_indicator_id = :leading_indicator_id AND
+                leading_indicator_value_timestamp_utc <= :date_time_end
+                AND leading_indicator_inside_envelope_last24h_value IS NOT NULL
+            ORDER BY
+                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_envelope_last24h_value,
+                CASE
+                    WHEN EXISTS (
+                        SELECT
+                            det.equipment_tag_id
+                        FROM
+                            DIM_EQUIPMENT_TAG det
+                        WHERE
+                            det.leading_indicator_id = l.leading_indicator_id
+                    ) THEN 'true'
+                    ELSE 'false'
+                END as has_equipment_tags,
+            pi_vision_display_url
+            FROM
+                {schema}.DIM_LEADING_INDICATOR l
+            WHERE l.leading_indicator_id = :leading_indicator_id""")
+
+# {epoch_ms} is empty, or the epoch_ms_columns of the _SQL_TIMES variants (see pipeline.py)
+LEADING_INDICATOR_BETA_TS_SQL = """SELECT
+                fl.leading_indicator_value_timestamp_utc as time,
+                fl.leading_indicator_value_{uom} as value{epoch_ms}
+            FROM
+                {schema}.FACT_LEADING_INDICATOR fl
+            WHERE
+                fl.leading_indicator_id = :leading_indicator_id AND
+                (
+                    leading_indicator_value_timestamp_utc >= :date_time_start
+                    AND leading_indicator_value_timestamp_utc <= :date_time_end
+                )
+            ORDER BY
+                leading_indicator_value_timestamp_utc"""
+
+LEADING_INDICATOR_BETA_TS = uom_statements('li.beta.ts', LEADING_INDICATOR_BETA_TS_SQL, epoch_ms='')
+
+LEADING_INDICATOR_BETA_TS_SQL_TIMES = uom_statements('li.beta.ts.sqltimes', LEADING_INDICATOR_BETA_TS_SQL,
+    epoch_ms=epoch_ms_columns('fl.leading_indicator_value_timestamp_utc'))
+
+LEADING_INDICATOR_BETA_TS_MIN_MAX_SQL = """SELECT
+                fl.leading_indicator_value_timestamp_utc as time,
+                fl.leading_indicator_value_{uom} as value{epoch_ms}
+            FROM
+                {schema}.FACT_LEADING_INDICATOR fl
+            WHERE
+                fl.leading_indicator_id = :leading_indicator_id AND
+                (
+                    leading_indicator_value_timestamp_utc >= :date_time_start
+                    AND leading_indicator_value_timestamp_utc <= :date_time_end
+                )
+            {min_max_buckets}
+            ORDER BY
+                leading_indicator_value_timestamp_utc"""
+
+LEADING_INDICATOR_BETA_TS_MIN_MAX = uom_statements('li.beta.ts.minmax', LEADING_INDICATOR_BETA_TS_MIN_MAX_SQL, epoch_ms='',
+    min_max_buckets=min_max_buckets('fl.leading_indicator_value_timestamp_utc', 'fl.leading_indicator_value_{uom}'))
+
+LEADING_INDICATOR_BETA_TS_MIN_MAX_SQL_TIMES = uom_statements('li.beta.ts.minmax.sqltimes',
+    LEADING_INDICATOR_BETA_TS_MIN_MAX_SQL, epoch_ms=epoch_ms_columns('fl.leading_indicator_value_timestamp_utc'),
+    min_max_buckets=min_max_buckets('fl.leading_indicator_value_timestamp_utc', 'fl.leading_indicator_value_{uom}'))
+
+LEADING_INDICATOR_BETA_DIM = uom_statements('li.beta.dim', """SELECT
+                l.leading_indicator_id,
+                l.leading_indicator_name,
+                l.leading_indicator_display_name,
+                l.is_big_energy_user,
+                l.is_big_water_user,
+                l.corrective_action,
+                l.corrective_action_input_language,
+                l.cmo,
+                l.display_high_{uom} as display_high,
+                l.display_low_{uom} as display_low,
+                l.uom_{uom} as uom,
+                l.uom_inside_envelope,
+                (SELECT TOP 1 leading_indicator_inside_envelope_last1h_value
+            
+            FROM
+                {schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
+            WHERE
+                fl.leading_indicator_id = :leading_indicator_id AND
+                leading_indicator_value_timestamp_utc <= :date_time_end
+                AND leading_indicator_inside_envelope_last1h_value IS NOT NULL
+            ORDER BY
+                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_enevelope_last1h_value,
+            (SELECT TOP 1 leading_indicator_inside_envelope_last8h_value
+            
+            FROM
+                {schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
+            WHERE
+                fl.leading_indicator_id = :leading_indicator_id AND
+                leading_indicator_value_timestamp_utc <= :date_time_end
+                AND leading_indicator_inside_envelope_last8h_value IS NOT NULL
+            ORDER BY
+                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_envelope_last8h_value,
+            (SELECT TOP 1 leading_indicator_inside_envelope_last12h_value
+            
+            FROM
+                {schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
+            WHERE
+                fl.leading_indicator_id = :leading_indicator_id AND
+                leading_indicator_value_timestamp_utc <= :date_time_end
+                AND leading_indicator_inside_envelope_last12h_value IS NOT NULL
+            ORDER BY
+                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_envelope_last12h_value,
+            (SELECT TOP 1 leading_indicator_inside_envelope_last24h_value
+            
+            FROM
+                {schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
+            WHERE
+                fl.leading_indicator_id = :leading_indicator_id AND
+                leading_indicator_value_timestamp_utc <= :date_time_end
+                AND leading_indicator_inside_envelope_last24h_value IS NOT NULL
+            ORDER BY
+                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_envelope_last24h_value,
+                CASE
+                    WHEN EXISTS (
+                        SELECT
+                            det.equipment_tag_id
+                        FROM
+                            DIM_EQUIPMENT_TAG det
+                        WHERE
+                            det.leading_indicator_id = l.leading_indicator_id
+                    ) THEN 'true'
+                    ELSE 'false'
+                END as has_equipment_tags,
+            pi_vision_display_url,
+            l.max_{uom},
+            l.min_{uom}
+            FROM
+                {schema}.DIM_LEADING_INDICATOR l
+            WHERE l.leading_indicator_id = :leading_indicator_id""")
+
+LEADING_INDICATOR_BATCH_DIM = uom_statements('li.batch.dim', """WITH health AS (
+                SELECT
+                    fl.leading_indicator_id,
+                    MAX_BY(fl.leading_indicator_inside_envelope_last1h_value,
+                           IFF(fl.leading_indicator_inside_envelope_last1h_value IS NOT NULL, fl.leading_indicator_value_timestamp_utc, NULL)) AS last1h,
+                    MAX_BY(fl.leading_indicator_inside_envelope_last8h_value,
+                           IFF(fl.leading_indicator_inside_envelope_last8h_value IS NOT NULL, fl.leading_indicator_value_timestamp_utc, NULL)) AS last8h,
+                    MAX_BY(fl.leading_indicator_inside_envelope_last12h_value,
+                           IFF(fl.leading_indicator_inside_envelope_last12h_value IS NOT NULL, fl.leading_indicator_value_timestamp_utc, NULL)) AS last12h,
+                    MAX_BY(fl.leading_indicator_inside_envelope_last24h_value,
+                           IFF(fl.leading_indicator_inside_envelope_last24h_value IS NOT NULL, fl.leading_indicator_value_timestamp_utc, NULL)) AS last24h
+                FROM
+                    {schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
+                WHERE
+                    fl.leading_indicator_id IN {in_leading_indicator_ids} AND
+                    fl.leading_indicator_value_timestamp_utc <= :date_time_end
+                GROUP BY fl.leading_indicator_id)
+            SELECT
+                l.leading_indicator_id,
+                l.leading_indicator_name,
+                l.leading_indicator_display_name,
+                l.is_big_energy_user,
+                l.is_big_water_user,
+                l.corrective_action,
+                l.corrective_action_input_language,
+                l.cmo,
+                l.display_high_{uom} as display_high,
+                l.display_low_{uom} as display_low,
+                l.uom_{uom} as uom,
+                l.uom_inside_envelope,
+                h.last1h,
+                h.last8h,
+                h.last12h,
+                h.last24h,
+                CASE
+                    WHEN EXISTS (
+                        SELECT
+                            det.equipment_tag_id
+                        FROM
+                            DIM_EQUIPMENT_TAG det
+                        WHERE
+                            det.leading_indicator_id = l.leading_indicator_id
+                    ) THEN 'true'
+                    ELSE 'false'
+                END as has_equipment_tags,
+            pi_vision_display_url,
+            l.max_{uom},
+            l.min_{uom}
+            FROM
+                {schema}.DIM_LEADING_INDICATOR l
+            LEFT JOIN health h ON h.leading_indicator_id = l.leading_indicator_id
+            WHERE l.leading_indicator_id IN {in_leading_indicator_ids}""",
+    in_leading_indicator_ids=in_list(':leading_indicator_ids'))
+
+LEADING_INDICATOR_BATCH_TS_SQL = """SELECT
+                fl.leading_indicator_id,
+                fl.leading_indicator_value_timestamp_utc as time,
+                fl.leading_indicator_value_{uom} as value{epoch_ms}
+            FROM
+                {schema}.FACT_LEADING_INDICATOR fl
+            WHERE
+                fl.leading_indicator_id IN {in_leading_indicator_ids} AND
+                (
+                    leading_indicator_value_timestamp_utc >= :date_time_start
+                    AND leading_indicator_value_timestamp_utc <= :date_time_end
+                )
+            ORDER BY
+                leading_indicator_value_timestamp_utc"""
+
+LEADING_INDICATOR_BATCH_TS = uom_statements('li.batch.ts', LEADING_INDICATOR_BATCH_TS_SQL, epoch_ms='',
+    in_leading_indicator_ids=in_list(':leading_indicator_ids'))
+
+LEADING_INDICATOR_BATCH_TS_SQL_TIMES = uom_statements('li.batch.ts.sqltimes', LEADING_INDICATOR_BATCH_TS_SQL,
+    epoch_ms=epoch_ms_columns('fl.leading_indicator_value_timestamp_utc'),
+    in_leading_indicator_ids=in_list(':leading_indicator_ids'))
+
+LEADING_INDICATOR_SUMMARY = Statement('li.summary', """
+                        SELECT
+                            di.leading_indicator_id,
+                            lih24h.leading_indicator_inside_envelope_last24h_value p_24h,
+                            lih12h.leading_indicator_inside_envelope_last12h_value p_12h,
+                            lih8h.leading_indicator_inside_envelope_last8h_value p_8h,
+                            lih1h.leading_indicator_inside_envelope_last1h_value p_1h,
+                            di.leading_indicator_display_name
+                                FROM {schema}."DIM_LEADING_INDICATOR" di
+                                LEFT JOIN (SELECT leading_indicator_id, leading_indicator_inside_envelope_last1h_value, leading_indicator_value_timestamp_utc, ROW_NUMBER() OVER (PARTITION BY leading_indicator_id ORDER BY leading_indicator_value_timestamp_utc DESC) row_id
+                                FROM {schema}."FACT_LEADING_INDICATOR_TARGET_HEALTH"
+                                WHERE leading_indicator_value_timestamp_utc BETWEEN :date_time_start AND :date_time_end
+                                AND leading_indicator_inside_envelope_last1h_value IS NOT NULL) lih1h
+                                ON lih1h.leading_indicator_id = di.leading_indicator_id AND lih1h.row_id = 1
+                                LEFT JOIN (SELECT leading_indicator_id, leading_indicator_inside_envelope_last8h_value, leading_indicator_value_timestamp_utc, ROW_NUMBER() OVER (PARTITION BY leading_indicator_id ORDER BY leading_indicator_value_timestamp_utc DESC) row_id
+                                FROM {schema}."FACT_LEADING_INDICATOR_TARGET_HEALTH"
+                                WHERE leading_indicator_value_timestamp_utc BETWEEN :date_time_start AND :date_time_end 
+                                AND leading_indicator_inside_envelope_last8h_value IS NOT NULL) lih8h
+                                ON lih8h.leading_indicator_id = di.leading_indicator_id AND lih8h.row_id = 1
+                                LEFT JOIN (SELECT leading_indicator_id, leading_indicator_inside_envelope_last12h_value, leading_indicator_value_timestamp_utc, ROW_NUMBER() OVER (PARTITION BY leading_indicator_id ORDER BY leading_indicator_value_timestamp_utc DESC) row_id
+                                FROM {schema}."FACT_LEADING_INDICATOR_TARGET_HEALTH"
+                                WHERE leading_indicator_value_timestamp_utc BETWEEN :date_time_start AND :date_time_end
+                                AND leading_indicator_inside_envelope_last12h_value IS NOT NULL) lih12h
+                                ON lih12h.leading_indicator_id = di.leading_indicator_id AND lih12h.row_id = 1
+                                LEFT JOIN (SELECT leading_indicator_id, leading_indicator_inside_envelope_last24h_value, leading_indicator_value_timestamp_utc, ROW_NUMBER() OVER (PARTITION BY leading_indicator_id ORDER BY leading_indicator_value_timestamp_utc DESC) row_id
+                                FROM {schema}."FACT_LEADING_INDICATOR_TARGET_HEALTH"
+                                WHERE leading_indicator_value_timestamp_utc BETWEEN :date_time_start AND :date_time_end
+                                AND leading_indicator_inside_envelope_last24h_value IS NOT NULL) lih24h
+                                ON lih24h.leading_indicator_id = di.leading_indicator_id AND lih24h.row_id = 1
+                                WHERE di.leading_indicator_id in (
+                                    SELECT l.leading_indicator_id 
+                                    FROM {schema}."DIM_LEADING_INDICATOR" l 
+                                    INNER JOIN {schema}."DIM_MTPM" m ON m.mtpm_id = l.mtpm_id 
+                                    WHERE l.mtpm_id IN {in_mtpm_ids})
+                                ORDER BY p_24h, p_12h, p_8h, p_1h ASC
+                        """, in_mtpm_ids=in_list(':mtpm_ids'))
+
+LEADING_INDICATOR_SUMMARY_MTPM = Statement('li.summary.mtpm', """SELECT DISTINCT mtpm_id FROM {schema}.DIM_LEADING_INDICATOR""")
+
+LEADING_INDICATOR_SUMMARY_DIM = uom_statements('li.summary.dim', """WITH cte_recent_vals AS (
+                        SELECT fl.leading_indicator_id, fl.leading_indicator_value_{uom}
+                        FROM {schema}."FACT_LEADING_INDICATOR" fl
+                        INNER JOIN (SELECT leading_indicator_id, max(leading_indicator_value_timestamp_utc) AS dtc 
+                            FROM {schema}."FACT_LEADING_INDICATOR" 
+                            WHERE leading_indicator_value_timestamp_utc <= :date_time_end
+                            GROUP BY leading_indicator_id) fli 
+                        ON fli.leading_indicator_id = fl.leading_indicator_id and fl.leading_indicator_value_timestamp_utc = dtc
+                        WHERE fl.leading_indicator_id in 
+                            (SELECT l.leading_indicator_id from DIM_LEADING_INDICATOR l 
+                                INNER JOIN DIM_MTPM m ON m.mtpm_id = l.mtpm_id 
+                                WHERE l.mtpm_id IN {in_mtpm_ids}
+                            )
+                        ),
+                        cte_timestamp_vals AS (
+                        SELECT fl.leading_indicator_id, fl.cdp_datetime_updated
+                        FROM {schema}."FACT_LEADING_INDICATOR" fl
+                        INNER JOIN (SELECT leading_indicator_id, max(leading_indicator_value_timestamp_utc) AS dtc 
+                            FROM {schema}."FACT_LEADING_INDICATOR" 
+                            GROUP BY leading_indicator_id) fli 
+                        ON fli.leading_indicator_id = fl.leading_indicator_id and fl.leading_indicator_value_timestamp_utc = dtc
+                        WHERE fl.leading_indicator_id in 
+                            (SELECT l.leading_indicator_id from DIM_LEADING_INDICATOR l 
+                                INNER JOIN DIM_MTPM m ON m.mtpm_id = l.mtpm_id 
+                                WHERE l.mtpm_id IN {in_mtpm_ids})
+                            ) 
+                        SELECT l.leading_indicator_id,
+                        l.leading_indicator_display_name,
+                        l.max_{uom},
+                        l.min_{uom},
+                        l.uom_{uom},
+                        l.uom_inside_envelope,
+                        m.mtpm_id,
+                        m.mtpm_display_name,
+                        ts.cdp_datetime_updated,
+                        rv.leading_indicator_value_{uom}
+                    FROM
+                        {schema}."DIM_LEADING_INDICATOR" l
+                    INNER JOIN {schema}."DIM_MTPM" m 
+                    ON m.mtpm_id = l.mtpm_id
+                    LEFT JOIN cte_recent_vals rv on rv.leading_indicator_id = l.leading_indicator_id
+                    LEFT JOIN cte_timestamp_vals ts on ts.leading_indicator_id = l.leading_indicator_id
+                    WHERE l.mtpm_id in {in_mtpm_ids}
+                    ORDER BY mtpm_display_name, leading_indicator_display_name""", in_mtpm_ids=in_list(':mtpm_ids'))
+
+
+class LeadingIndicators(SnowflakeMethods):
+    
+
+    @cached_query('li.dim')
+    def get_snowflake_leading_indicator_dim_data(self, mtpm_id, leading_indicator_id=''):
+
+        records = []
+
+        results = self.fetch(LEADING_INDICATOR_DIM.bind(mtpm_id=mtpm_id,
+                                                        leading_indicator_id=leading_indicator_id or None))
 
         for leading_indicator in results:
             records.append({
@@ -82,13 +456,10 @@ class LeadingIndicators(SnowflakeMethods):
 
         records = []
 
-        snowflake_db_and_schema = f'{os.getenv("SNOWFLAKE_DATABASE")}.{os.getenv("SNOWFLAKE_SCHEMA")}'
-
         start_date = helpers.get_datetime_obj(date_time_start)
         end_date = helpers.get_datetime_obj(date_time_end)
 
-        results = self.get_snowflake_leading_indicator_metric(start_date, end_date, snowflake_db_and_schema,
-                                                              mtpm_id, leading_indicator_id)
+        results = self.get_snowflake_leading_indicator_metric(start_date, end_date, mtpm_id, leading_indicator_id)
 
         leading_indicator = results[0]
 
@@ -139,163 +510,143 @@ class LeadingIndicators(SnowflakeMethods):
 
         return records
 
-    def get_snowflake_leading_indicator_metric(self, date_time_start, date_time_end, snowflake_db_and_schema,
-                                               mtpm_id,
-                                               leading_indicator_id):
-
-        leading_indicator_id_filter = ''
-        time_series_filter = ''
-        li_where_query = ''
+    def get_snowflake_leading_indicator_metric(self, date_time_start, date_time_end, mtpm_id, leading_indicator_id):
 
         if not leading_indicator_id:
-            leading_indicator_id = self.get_leading_indicator_id(mtpm_id, snowflake_db_and_schema)
-
-        leading_indicator_id_filter = f"AND l.leading_indicator_id = '{leading_indicator_id}'"
-        time_series_filter = f"fl.leading_indicator_id = '{leading_indicator_id}' AND "
-        li_where_query = f"WHERE l.leading_indicator_id = '{leading_indicator_id}'"
+            leading_indicator_id = self.get_leading_indicator_id(mtpm_id)
 
-        dim_payload = self.get_leading_indicator_metric_dim_data(date_time_end, snowflake_db_and_schema,
-                                                                 time_series_filter, li_where_query)
+        dim_payload = self.get_leading_indicator_metric_dim_data(date_time_end, leading_indicator_id)
         time_series_payload = self.get_leading_indicator_metric_time_series_data(date_time_start, date_time_end,
-                                                                                 snowflake_db_and_schema,
-                                                                                 time_series_filter)
+                                                                                 leading_indicator_id)
         return [dim_payload, time_series_payload]
 
-    def get_leading_indicator_id(self, mtpm_id, snowflake_db_and_schema):
+    def get_leading_indicator_id(self, mtpm_id):
 
-        select_query = f"""SELECT leading_indicator_id FROM {snowflake_db_and_schema}.DIM_LEADING_INDICATOR
-            WHERE mtpm_id = {mtpm_id}"""
-        results = self.wrapper.validate_and_execute(select_query)
+        results = self.fetch(LEADING_INDICATOR_ID.bind(mtpm_id=mtpm_id))
 
         return results[0][0]
 
-    def get_leading_indicator_metric_time_series_data(self, date_time_start, date_time_end,
-                                                      snowflake_db_and_schema, time_series_filter):
+    def get_leading_indicator_metric_time_series_data(self, date_time_start, date_time_end, leading_indicator_id):
 
-        time_series_query = f"""SELECT
-                fl.leading_indicator_value_metric,
-                fl.leading_indicator_value_imperial,
-                fl.leading_indicator_value_timestamp_utc,
-                fl.leading_indicator_value_timestamp_local,
-                fl.is_leading_indicator_substituted_flag
-            FROM
-                {snowflake_db_and_schema}.FACT_LEADING_INDICATOR fl
-            WHERE
-                {time_series_filter}
-                (
-                    leading_indicator_value_timestamp_utc >= '{date_time_start}'
-                    AND leading_indicator_value_timestamp_utc <= '{date_time_end}'
-                )
-            ORDER BY
-                leading_indicator_value_timestamp_utc"""
-
-        time_series_payload = self.wrapper.validate_and_execute(time_series_query)
+        time_series_payload = self.fetch(LEADING_INDICATOR_TS.bind(leading_indicator_id=leading_indicator_id,
+                                                                   date_time_start=date_time_start,
+                                                                   date_time_end=date_time_end))
 
         time_series_payload = self.normalize_time_series(time_series_payload, date_time_start, date_time_end, 2)
 
         return time_series_payload
 
-    def get_leading_indicator_metric_dim_data(self, date_time_end, snowflake_db_and_schema, time_series_filter,
-                                              li_where_query):
+    def get_leading_indicator_metric_dim_data(self, date_time_end, leading_indicator_id):
 
-        li_dim_query = f"""SELECT
-                l.leading_indicator_id,
-                l.leading_indicator_name,
-                l.leading_indicator_display_name,
-                l.is_big_energy_user,
-                l.is_big_water_user,
-                l.corrective_action,
-                l.corrective_action_input_language,
-                l.cmo,
-                l.display_high_metric,
-                l.display_low_metric,
-                l.display_high_imperial,
-                l.display_low_imperial,
-                l.max_metric,
-                l.min_metric,
-                l.max_imperial,
-                l.min_imperial,
-                l.uom_metric,
-                l.uom_imperial,
-                l.uom_inside_envelope,
-                (SELECT TOP 1 leading_indicator_inside_envelope_last1h_value
-            
-            FROM
-                {snowflake_db_and_schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
-            WHERE
-                {time_series_filter}
-                leading_indicator_value_timestamp_utc <= '{date_time_end}'
-                AND leading_indicator_inside_envelope_last1h_value IS NOT NULL
-            ORDER BY
-                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_enevelope_last1h_value,
-            (SELECT TOP 1 leading_indicator_inside_envelope_last8h_value
-            
-            FROM
-                {snowflake_db_and_schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
-            WHERE
-                {time_series_filter}
-                leading_indicator_value_timestamp_utc <= '{date_time_end}'
-                AND leading_indicator_inside_envelope_last8h_value IS NOT NULL
-            ORDER BY
-                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_envelope_last8h_value,
-            (SELECT TOP 1 leading_indicator_inside_envelope_last12h_value
-            
-            FROM
-                {snowflake_db_and_schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
-            WHERE
-                {time_series_filter}
-                leading_indicator_value_timestamp_utc <= '{date_time_end}'
-                AND leading_indicator_inside_envelope_last12h_value IS NOT NULL
-            ORDER BY
-                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_envelope_last12h_value,
-            (SELECT TOP 1 leading_indicator_inside_envelope_last24h_value
-            
-            FROM
-                {snowflake_db_and_schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
-            WHERE
-                {time_series_filter}
-                leading_indicator_value_timestamp_utc <= '{date_time_end}'
-                AND leading_indicator_inside_envelope_last24h_value IS NOT NULL
-            ORDER BY
-                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_envelope_last24h_value,
-                CASE
-                    WHEN EXISTS (
-                        SELECT
-                            det.equipment_tag_id
-                        FROM
-                            DIM_EQUIPMENT_TAG det
-                        WHERE
-                            det.leading_indicator_id = l.leading_indicator_id
-                    ) THEN 'true'
-                    ELSE 'false'
-                END as has_equipment_tags,
-            pi_vision_display_url
-            FROM
-                {snowflake_db_and_schema}.DIM_LEADING_INDICATOR l
-            {li_where_query}"""
-
-        dim_payload = self.wrapper.validate_and_execute(li_dim_query)
+        dim_payload = self.fetch(LEADING_INDICATOR_METRIC_DIM.bind(leading_indicator_id=leading_indicator_id,
+                                                                   date_time_end=date_time_end))
 
         return dim_payload[0]
 
     def get_snowflake_leading_indicator_metric_data_beta(self, leading_indicator_id, mtpm_id, date_time_start,
-                                                         date_time_end, preferred_uom, timezone):
+                                                         date_time_end, preferred_uom, timezone, max_points=None,
+                                                         downsampling=LTTB, columnar=False):
 
         records = []
 
-        snowflake_db_and_schema = f'{os.getenv("SNOWFLAKE_DATABASE")}.{os.getenv("SNOWFLAKE_SCHEMA")}'
+        start_date = helpers.get_datetime_obj(date_time_start)
+        end_date = helpers.get_datetime_obj(date_time_end)
+
+        results = self.get_snowflake_leading_indicator_metric_beta(start_date, end_date, mtpm_id, leading_indicator_id,
+                                                                   preferred_uom, max_points, downsampling, timezone)
+
+        time_series_data = self.get_snowflake_leading_indicator_time_series_and_sum(results[1], timezone, max_points,
+                                                                                    downsampling, columnar)
 
+        record = self.build_leading_indicator_beta_record(results[0])
+        record['ts_min'] = time_series_data[1]
+        record['ts_max'] = time_series_data[2]
+        # Pass the entire filtered datase to build the time series array inside the main object
+        record['time_series'] = time_series_data[0]
+        records.append(record)
+
+        return records
+
+    def stream_snowflake_leading_indicator_metric_data_beta(self, leading_indicator_id, mtpm_id, date_time_start,
+                                                            date_time_end, preferred_uom, timezone):
+        # Like get_snowflake_leading_indicator_metric_data_beta, but the time series is read from
+        # Snowflake while the response is written (see streaming.stream_results)
         start_date = helpers.get_datetime_obj(date_time_start)
         end_date = helpers.get_datetime_obj(date_time_end)
 
-        results = self.get_snowflake_leading_indicator_metric_beta(start_date, end_date, snowflake_db_and_schema,
-                                                                   mtpm_id, leading_indicator_id, preferred_uom)
+        if not leading_indicator_id:
+            leading_indicator_id = self.get_leading_indicator_id(mtpm_id)
 
-        leading_indicator = results[0]
+        leading_indicator = self.get_leading_indicator_metric_dim_data_beta(end_date, leading_indicator_id, preferred_uom)
 
-        time_series_data = self.get_snowflake_leading_indicator_time_series_and_sum(results[1], timezone)
+        time_series_query = LEADING_INDICATOR_BETA_TS[resolve_uom(preferred_uom)].bind(
+            leading_indicator_id=leading_indicator_id,
+            date_time_start=start_date,
+            date_time_end=end_date)
+        rows = self.normalize_time_series_stream(self.fetch_stream(time_series_query), start_date)
 
-        records.append({
+        timezone = 'UTC' if timezone is None else timezone
+        record = self.build_leading_indicator_beta_record(leading_indicator)
+        record['time_series'] = StreamedSeries(self.build_series_point(time_value, value, timezone)
+                                               for time_value, value in rows)
+
+        return [record]
+
+    def export_leading_indicator_time_series(self, leading_indicator_id, mtpm_id, date_time_start, date_time_end,
+                                             preferred_uom):
+        # The beta time series as Arrow record batches, read from Snowflake while the export is written
+        if not leading_indicator_id:
+            leading_indicator_id = self.get_leading_indicator_id(mtpm_id)
+
+        time_series_query = LEADING_INDICATOR_BETA_TS[resolve_uom(preferred_uom)].bind(
+            leading_indicator_id=leading_indicator_id,
+            date_time_start=helpers.get_datetime_obj(date_time_start),
+            date_time_end=helpers.get_datetime_obj(date_time_end))
+        return self.fetch_arrow_stream(time_series_query)
+
+    def get_snowflake_leading_indicator_metric_data_batch(self, leading_indicator_ids, date_time_start, date_time_end,
+                                                          preferred_uom, timezone, max_points=None, downsampling=LTTB):
+        # Like get_snowflake_leading_indicator_metric_data_beta for many leading indicators, with one
+        # dim query and one time series query for all of them. Records follow the order of the ids.
+        start_date = helpers.get_datetime_obj(date_time_start)
+        end_date = helpers.get_datetime_obj(date_time_end)
+        uom = resolve_uom(preferred_uom)
+        sql_times_zone = self.sql_times_zone(timezone)
+        if sql_times_zone:
+            time_series_query = LEADING_INDICATOR_BATCH_TS_SQL_TIMES[uom].bind(
+                leading_indicator_ids=leading_indicator_ids, date_time_start=start_date, date_time_end=end_date,
+                timezone=sql_times_zone)
+        else:
+            time_series_query = LEADING_INDICATOR_BATCH_TS[uom].bind(
+                leading_indicator_ids=leading_indicator_ids, date_time_start=start_date, date_time_end=end_date)
+
+        results = self.fetch_concurrently({
+            'dim': lambda: self.fetch(LEADING_INDICATOR_BATCH_DIM[uom].bind(leading_indicator_ids=leading_indicator_ids,
+                                                                           date_time_end=end_date)),
+            'time_series': lambda: self.fetch_series(time_series_query),
+        })
+        dim_by_id = {row[0]: row for row in results['dim']}
+
+        # (leading_indicator_id, time, value) rows split into one (time, value) series per id
+        series_by_id = as_series_columns(results['time_series']).group_by(0)
+
+        records = []
+        for leading_indicator_id in dict.fromkeys(leading_indicator_ids):
+            if leading_indicator_id not in dim_by_id:
+                continue
+            time_series = self.normalize_time_series(series_by_id.get(leading_indicator_id, []), start_date, end_date)
+            time_series_data = self.get_snowflake_leading_indicator_time_series_and_sum(time_series, timezone, max_points,
+                                                                                        downsampling)
+            record = self.build_leading_indicator_beta_record(dim_by_id[leading_indicator_id])
+            record['ts_min'] = time_series_data[1]
+            record['ts_max'] = time_series_data[2]
+            record['time_series'] = time_series_data[0]
+            records.append(record)
+
+        return records
+
+    def build_leading_indicator_beta_record(self, leading_indicator):
+        return {
             'leading_indicator_id': leading_indicator[0],
             'leading_indicator_name': leading_indicator[1],
             'leading_indicator_display_name': leading_indicator[2],
@@ -306,8 +657,6 @@ class LeadingIndicators(SnowflakeMethods):
             'cmo': leading_indicator[7],
             'display_high': self.convert_to_decimal(leading_indicator[8]),
             'display_low': self.convert_to_decimal(leading_indicator[9]),
-            'ts_min': time_series_data[1],
-            'ts_max': time_series_data[2],
             'uom': leading_indicator[10],
             'uom_inside_envelope': leading_indicator[11],
             'pi_vision_display_url': leading_indicator[17],
@@ -318,174 +667,72 @@ class LeadingIndicators(SnowflakeMethods):
             'l8h': leading_indicator[13],
             'l12h': leading_indicator[14],
             'l24h': leading_indicator[15],
-            # Pass the entire filtered datase to build the time series array inside the main object
-            'time_series': time_series_data[0]
-        })
-
-        return records
+        }
 
-    def get_snowflake_leading_indicator_time_series_and_sum(self, filtered_indicators, timezone=None):
+    def get_snowflake_leading_indicator_time_series_and_sum(self, filtered_indicators, timezone=None, max_points=None,
+                                                            downsampling=LTTB, columnar=False):
 
-        records = []
-
-        max = None
-        min = None
+        records = {'epoch': [], 'value': []} if columnar else []
 
         timezone = 'UTC' if timezone is None else timezone
-        last_valid_value = None
 
-        for res in filtered_indicators:
-            if res[1] is None:
-                res_value = None
-            else:
-                res_value = Decimal(round(Decimal(res[1]), 4))
-                last_valid_value = res_value
-            if max is None or (res_value is not None and res_value > max):
-                max = res_value
-            if min is None or (res_value is not None and res_value < min):
-                min = res_value
-            if res[0] is not None:
-                time = helpers.convert_utc_to_local(helpers.get_datetime_obj(res[0]), timezone)
-                formatted_date = helpers.format_datetime(time)
-                time_epoch = helpers.get_epoch(time, timezone)
-            else:
-                res_value = last_valid_value
-                time = helpers.convert_utc_to_local(helpers.get_datetime_obj(res[2]), timezone)
-                formatted_date = helpers.format_datetime(time)
-                time_epoch = helpers.get_epoch(time, timezone)
-            records.append({
-                'time': time,
-                'value': res_value,
-                'formatted_date': formatted_date,
-                'time_epoch': time_epoch
-            })
+        series = as_series_columns(filtered_indicators)
+        if len(series) == 0:
+            return [records, None, None]
 
-        if max is not None:
-            max = Decimal(max)
-        if min is not None:
-            min = Decimal(min)
+        # ts_min/ts_max are taken before downsampling, so they stay exact
+        ts_min, ts_max = self.series_min_max(numeric(series[1]))
+        series = downsample(series, max_points, downsampling)
 
-        return [records, min, max]
+        # series fetched with SQL times have their (UTC, local) epoch milliseconds after the value
+        epoch_ms = [numeric(column) for column in series.columns[2:4]] if len(series.columns) == 4 else None
+        build = self.build_series_columns if columnar else self.build_series_points
+        records = build(series[0], numeric(series[1]), timezone, epoch_ms)
 
-    def get_snowflake_leading_indicator_metric_beta(self, date_time_start, date_time_end, snowflake_db_and_schema,
-                                                    mtpm_id, leading_indicator_id, preferred_uom):
+        return [records, ts_min, ts_max]
 
-        leading_indicator_id_filter = ''
-        time_series_filter = ''
-        li_where_query = ''
+    def get_snowflake_leading_indicator_metric_beta(self, date_time_start, date_time_end, mtpm_id, leading_indicator_id,
+                                                    preferred_uom, max_points=None, downsampling=LTTB, timezone=None):
 
         if not leading_indicator_id:
-            leading_indicator_id = self.get_leading_indicator_id(mtpm_id, snowflake_db_and_schema)
-
-        leading_indicator_id_filter = f"AND l.leading_indicator_id = '{leading_indicator_id}'"
-        time_series_filter = f"fl.leading_indicator_id = '{leading_indicator_id}' AND "
-        li_where_query = f"WHERE l.leading_indicator_id = '{leading_indicator_id}'"
+            leading_indicator_id = self.get_leading_indicator_id(mtpm_id)
 
-        dim_payload = self.get_leading_indicator_metric_dim_data_beta(date_time_end, snowflake_db_and_schema,
-                                                                      time_series_filter, li_where_query, preferred_uom)
+        dim_payload = self.get_leading_indicator_metric_dim_data_beta(date_time_end, leading_indicator_id, preferred_uom)
         time_series_payload = self.get_leading_indicator_metric_time_series_data_beta(date_time_start, date_time_end,
-                                                                                      snowflake_db_and_schema,
-                                                                                      time_series_filter, preferred_uom)
+                                                                                      leading_indicator_id, preferred_uom,
+                                                                                      max_points, downsampling, timezone)
         return [dim_payload, time_series_payload]
 
-    def get_leading_indicator_metric_time_series_data_beta(self, date_time_start, date_time_end,
-                                                           snowflake_db_and_schema, time_series_filter, preferred_uom):
+    def get_leading_indicator_metric_time_series_data_beta(self, date_time_start, date_time_end, leading_indicator_id,
+                                                           preferred_uom, max_points=None, downsampling=LTTB,
+                                                           timezone=None):
 
-        time_series_query = f"""SELECT
-                fl.leading_indicator_value_timestamp_utc as time,
-                fl.leading_indicator_value_{preferred_uom} as value
-            FROM
-                {snowflake_db_and_schema}.FACT_LEADING_INDICATOR fl
-            WHERE
-                {time_series_filter}
-                (
-                    leading_indicator_value_timestamp_utc >= '{date_time_start}'
-                    AND leading_indicator_value_timestamp_utc <= '{date_time_end}'
-                )
-            ORDER BY
-                leading_indicator_value_timestamp_utc"""
+        uom = resolve_uom(preferred_uom)
+        # with SQL times Snowflake adds the epoch columns of the points in the request's zone
+        sql_times_zone = self.sql_times_zone(timezone)
+        sql_times = {'timezone': sql_times_zone} if sql_times_zone else {}
 
-        time_series_payload = self.wrapper.validate_and_execute(time_series_query)
+        if max_points:
+            statements = LEADING_INDICATOR_BETA_TS_MIN_MAX_SQL_TIMES if sql_times else LEADING_INDICATOR_BETA_TS_MIN_MAX
+            time_series_payload = self.fetch_series_downsampled(statements[uom], date_time_start, date_time_end,
+                                                                max_points, downsampling,
+                                                                leading_indicator_id=leading_indicator_id, **sql_times)
+        else:
+            statements = LEADING_INDICATOR_BETA_TS_SQL_TIMES if sql_times else LEADING_INDICATOR_BETA_TS
+            time_series_payload = self.fetch_series_segmented(statements[uom], date_time_start, date_time_end,
+                                                              leading_indicator_id=leading_indicator_id, **sql_times)
 
         time_series_payload = self.normalize_time_series(time_series_payload, date_time_start, date_time_end)
 
         return time_series_payload
 
-    def get_leading_indicator_metric_dim_data_beta(self, date_time_end, snowflake_db_and_schema,
-                                                   time_series_filter, li_where_query, preferred_uom):
+    def get_leading_indicator_metric_dim_data_beta(self, date_time_end, leading_indicator_id, preferred_uom):
 
-        li_dim_query = f"""SELECT
-                l.leading_indicator_id,
-                l.leading_indicator_name,
-                l.leading_indicator_display_name,
-                l.is_big_energy_user,
-                l.is_big_water_user,
-                l.corrective_action,
-                l.corrective_action_input_language,
-                l.cmo,
-                l.display_high_{preferred_uom} as display_high,
-                l.display_low_{preferred_uom} as display_low,
-                l.uom_{preferred_uom} as uom,
-                l.uom_inside_envelope,
-                (SELECT TOP 1 leading_indicator_inside_envelope_last1h_value
-            
-            FROM
-                {snowflake_db_and_schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
-            WHERE
-                {time_series_filter}
-                leading_indicator_value_timestamp_utc <= '{date_time_end}'
-                AND leading_indicator_inside_envelope_last1h_value IS NOT NULL
-            ORDER BY
-                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_enevelope_last1h_value,
-            (SELECT TOP 1 leading_indicator_inside_envelope_last8h_value
-            
-            FROM
-                {snowflake_db_and_schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
-            WHERE
-                {time_series_filter}
-                leading_indicator_value_timestamp_utc <= '{date_time_end}'
-                AND leading_indicator_inside_envelope_last8h_value IS NOT NULL
-            ORDER BY
-                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_envelope_last8h_value,
-            (SELECT TOP 1 leading_indicator_inside_envelope_last12h_value
-            
-            FROM
-                {snowflake_db_and_schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
-            WHERE
-                {time_series_filter}
-                leading_indicator_value_timestamp_utc <= '{date_time_end}'
-                AND leading_indicator_inside_envelope_last12h_value IS NOT NULL
-            ORDER BY
-                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_envelope_last12h_value,
-            (SELECT TOP 1 leading_indicator_inside_envelope_last24h_value
+        li_dim_query = LEADING_INDICATOR_BETA_DIM[resolve_uom(preferred_uom)].bind(
+            leading_indicator_id=leading_indicator_id,
+            date_time_end=date_time_end)
 
-            FROM
-                {snowflake_db_and_schema}.FACT_LEADING_INDICATOR_TARGET_HEALTH fl
-            WHERE
-                {time_series_filter}
-                leading_indicator_value_timestamp_utc <= '{date_time_end}'
-                AND leading_indicator_inside_envelope_last24h_value IS NOT NULL
-            ORDER BY
-                leading_indicator_value_timestamp_utc desc) as leading_indicator_inside_envelope_last24h_value,
-                CASE
-                    WHEN EXISTS (
-                        SELECT
-                            det.equipment_tag_id
-                        FROM
-                            DIM_EQUIPMENT_TAG det
-                        WHERE
-                            det.leading_indicator_id = l.leading_indicator_id
-                    ) THEN 'true'
-                    ELSE 'false'
-                END as has_equipment_tags,
-            pi_vision_display_url,
-            l.max_{preferred_uom},
-            l.min_{preferred_uom}
-            FROM
-                {snowflake_db_and_schema}.DIM_LEADING_INDICATOR l
-            {li_where_query}"""
-
-        dim_payload = self.wrapper.validate_and_execute(li_dim_query)
+        dim_payload = self.fetch(li_dim_query)
 
         return dim_payload[0]
 
@@ -497,17 +744,21 @@ class LeadingIndicators(SnowflakeMethods):
     def get_snowflake_leading_indicator_summary(self, mtpm_list, datetimestart, datetimeend, preferred_uom, top):
         start_date = helpers.get_datetime_obj(datetimestart)
         end_date = helpers.get_datetime_obj(datetimeend)
-        mtpm_list_enum = f"""{",".join([f"'{str(elem)}'" for i, elem in enumerate(mtpm_list)])}"""
-        snowflake_db_and_schema = f'{os.getenv("SNOWFLAKE_DATABASE")}.{os.getenv("SNOWFLAKE_SCHEMA")}'
-        dim_query = self.get_li_summary_dim_query(mtpm_list_enum, preferred_uom, snowflake_db_and_schema, datetimestart, datetimeend)
-        time_query = self.get_li_summary_query(mtpm_list_enum, start_date, end_date, snowflake_db_and_schema)
+        dim_query = self.get_li_summary_dim_query(mtpm_list, preferred_uom, datetimestart, datetimeend)
+        time_query = self.get_li_summary_query(mtpm_list, start_date, end_date)
         dim_data = self.execute_dim_query(dim_query, top)
         time_data = self.execute_summary_query(time_query, dim_data, top)
         return time_data
-        
+
+    def get_snowflake_leading_indicator_summary_from_snapshot(self, snapshot, top):
+        # snapshot is a SummarySnapshot (see summaries.py) holding the rows both queries returned
+        dim_data = self.build_dim_data(snapshot.dim_rows, top)
+        return self.build_summary_records(snapshot.summary_rows, dim_data, top)
 
     def execute_dim_query(self, query, top):
-        dim_results = self.wrapper.validate_and_execute(query)
+        return self.build_dim_data(self.fetch(query), top)
+
+    def build_dim_data(self, dim_results, top):
         if not top:
             return dim_results
         dim_data = {}
@@ -527,8 +778,9 @@ class LeadingIndicators(SnowflakeMethods):
         return dim_data
 
     def execute_summary_query(self, query, dim_data, top):
-        summary_results = self.wrapper.validate_and_execute(query)
-        
+        return self.build_summary_records(self.fetch(query), dim_data, top)
+
+    def build_summary_records(self, summary_results, dim_data, top):
         records = []
 
         # If we've received a 'top' value, we'll have the dim data already in a dictionary for us
@@ -581,92 +833,13 @@ class LeadingIndicators(SnowflakeMethods):
                 records.append(dim_dict)
         return records
     
-    def get_li_summary_query(self, mtpm_list, datetimestart, datetimeend, snowflake_db_and_schema):
-        summary_query = f"""
-                        SELECT
-                            di.leading_indicator_id,
-                            lih24h.leading_indicator_inside_envelope_last24h_value p_24h,
-                            lih12h.leading_indicator_inside_envelope_last12h_value p_12h,
-                            lih8h.leading_indicator_inside_envelope_last8h_value p_8h,
-                            lih1h.leading_indicator_inside_envelope_last1h_value p_1h,
-                            di.leading_indicator_display_name
-                                FROM {snowflake_db_and_schema}."DIM_LEADING_INDICATOR" di
-                                LEFT JOIN (SELECT leading_indicator_id, leading_indicator_inside_envelope_last1h_value, leading_indicator_value_timestamp_utc, ROW_NUMBER() OVER (PARTITION BY leading_indicator_id ORDER BY leading_indicator_value_timestamp_utc DESC) row_id
-                                FROM {snowflake_db_and_schema}."FACT_LEADING_INDICATOR_TARGET_HEALTH"
-                                WHERE leading_indicator_value_timestamp_utc BETWEEN '{datetimestart}' AND '{datetimeend}'
-                                AND leading_indicator_inside_envelope_last1h_value IS NOT NULL) lih1h
-                                ON lih1h.leading_indicator_id = di.leading_indicator_id AND lih1h.row_id = 1
-                                LEFT JOIN (SELECT leading_indicator_id, leading_indicator_inside_envelope_last8h_value, leading_indicator_value_timestamp_utc, ROW_NUMBER() OVER (PARTITION BY leading_indicator_id ORDER BY leading_indicator_value_timestamp_utc DESC) row_id
-                                FROM {snowflake_db_and_schema}."FACT_LEADING_INDICATOR_TARGET_HEALTH"
-                                WHERE leading_indicator_value_timestamp_utc BETWEEN '{datetimestart}' AND '{datetimeend}' 
-                                AND leading_indicator_inside_envelope_last8h_value IS NOT NULL) lih8h
-                                ON lih8h.leading_indicator_id = di.leading_indicator_id AND lih8h.row_id = 1
-                                LEFT JOIN (SELECT leading_indicator_id, leading_indicator_inside_envelope_last12h_value, leading_indicator_value_timestamp_utc, ROW_NUMBER() OVER (PARTITION BY leading_indicator_id ORDER BY leading_indicator_value_timestamp_utc DESC) row_id
-                                FROM {snowflake_db_and_schema}."FACT_LEADING_INDICATOR_TARGET_HEALTH"
-                                WHERE leading_indicator_value_timestamp_utc BETWEEN '{datetimestart}' AND '{datetimeend}'
-                                AND leading_indicator_inside_envelope_last12h_value IS NOT NULL) lih12h
-                                ON lih12h.leading_indicator_id = di.leading_indicator_id AND lih12h.row_id = 1
-                                LEFT JOIN (SELECT leading_indicator_id, leading_indicator_inside_envelope_last24h_value, leading_indicator_value_timestamp_utc, ROW_NUMBER() OVER (PARTITION BY leading_indicator_id ORDER BY leading_indicator_value_timestamp_utc DESC) row_id
-                                FROM {snowflake_db_and_schema}."FACT_LEADING_INDICATOR_TARGET_HEALTH"
-                                WHERE leading_indicator_value_timestamp_utc BETWEEN '{datetimestart}' AND '{datetimeend}'
-                                AND leading_indicator_inside_envelope_last24h_value IS NOT NULL) lih24h
-                                ON lih24h.leading_indicator_id = di.leading_indicator_id AND lih24h.row_id = 1
-                                WHERE di.leading_indicator_id in (
-                                    SELECT l.leading_indicator_id 
-                                    FROM {snowflake_db_and_schema}."DIM_LEADING_INDICATOR" l 
-                                    INNER JOIN {snowflake_db_and_schema}."DIM_MTPM" m ON m.mtpm_id = l.mtpm_id 
-                                    WHERE l.mtpm_id IN ({mtpm_list}))
-                                ORDER BY p_24h, p_12h, p_8h, p_1h ASC
-                        """
-        return summary_query
-
-    def get_li_summary_dim_query(self, mtpm_list, preferred_uom, snowflake_db_and_schema, datetimestart, datetimeend):
+    def get_li_summary_query(self, mtpm_list, datetimestart, datetimeend):
+        return LEADING_INDICATOR_SUMMARY.bind(mtpm_ids=mtpm_list, date_time_start=datetimestart,
+                                              date_time_end=datetimeend)
 
-        if preferred_uom is None or preferred_uom not in ('metric', 'imperial'):
-            preferred_uom = 'metric'
+    def get_li_summary_dim_query(self, mtpm_list, preferred_uom, datetimestart, datetimeend):
+        return LEADING_INDICATOR_SUMMARY_DIM[resolve_uom(preferred_uom)].bind(mtpm_ids=mtpm_list,
+                                                                              date_time_end=datetimeend)
 
-        dim_query = f"""WITH cte_recent_vals AS (
-                        SELECT fl.leading_indicator_id, fl.leading_indicator_value_{preferred_uom}
-                        FROM {snowflake_db_and_schema}."FACT_LEADING_INDICATOR" fl
-                        INNER JOIN (SELECT leading_indicator_id, max(leading_indicator_value_timestamp_utc) AS dtc 
-                            FROM {snowflake_db_and_schema}."FACT_LEADING_INDICATOR" 
-                            WHERE leading_indicator_value_timestamp_utc <= '{datetimeend}'
-                            GROUP BY leading_indicator_id) fli 
-                        ON fli.leading_indicator_id = fl.leading_indicator_id and fl.leading_indicator_value_timestamp_utc = dtc
-                        WHERE fl.leading_indicator_id in 
-                            (SELECT l.leading_indicator_id from DIM_LEADING_INDICATOR l 
-                                INNER JOIN DIM_MTPM m ON m.mtpm_id = l.mtpm_id 
-                                WHERE l.mtpm_id IN ({mtpm_list})
-                            )
-                        ),
-                        cte_timestamp_vals AS (
-                        SELECT fl.leading_indicator_id, fl.cdp_datetime_updated
-                        FROM {snowflake_db_and_schema}."FACT_LEADING_INDICATOR" fl
-                        INNER JOIN (SELECT leading_indicator_id, max(leading_indicator_value_timestamp_utc) AS dtc 
-                            FROM {snowflake_db_and_schema}."FACT_LEADING_INDICATOR" 
-                            GROUP BY leading_indicator_id) fli 
-                        ON fli.leading_indicator_id = fl.leading_indicator_id and fl.leading_indicator_value_timestamp_utc = dtc
-                        WHERE fl.leading_indicator_id in 
-                            (SELECT l.leading_indicator_id from DIM_LEADING_INDICATOR l 
-                                INNER JOIN DIM_MTPM m ON m.mtpm_id = l.mtpm_id 
-                                WHERE l.mtpm_id IN ({mtpm_list}))
-                            ) 
-                        SELECT l.leading_indicator_id,
-                        l.leading_indicator_display_name,
-                        l.max_{preferred_uom},
-                        l.min_{preferred_uom},
-                        l.uom_{preferred_uom},
-                        l.uom_inside_envelope,
-                        m.mtpm_id,
-                        m.mtpm_display_name,
-                        ts.cdp_datetime_updated,
-                        rv.leading_indicator_value_{preferred_uom}
-                    FROM
-                        {snowflake_db_and_schema}."DIM_LEADING_INDICATOR" l
-                    INNER JOIN {snowflake_db_and_schema}."DIM_MTPM" m 
-                    ON m.mtpm_id = l.mtpm_id
-                    LEFT JOIN cte_recent_vals rv on rv.leading_indicator_id = l.leading_indicator_id
-                    LEFT JOIN cte_timestamp_vals ts on ts.leading_indicator_id = l.leading_indicator_id
-                    WHERE l.mtpm_id in ({mtpm_list})
-                    ORDER BY mtpm_display_name, leading_indicator_display_name"""
-        return dim_query
\ No newline at end of file
+    def get_li_summary_mtpm_query(self):
+        return LEADING_INDICATOR_SUMMARY_MTPM.bind()
@@ -2,9 +2,18 @@ import os
 from snowflake_wrapper.base import SnowflakeWrapper
 from datetime import timedelta, datetime
 import concurrent.futures
+import contextvars
 from .. import helpers
 import logging
 from decimal import Decimal, DecimalException
+import numpy as np
+from django.conf import settings
+from .columns import SeriesColumns
+from .segments import series_segments
+from .coalesce import flight_key, single_flight
+from .downsampling import bucket_seconds, sql_buckets
+from .pipeline import series_columns, series_points, series_points_from_epochs
+from ..timestamps import zone
 
 log = logging.getLogger(__name__)
 
@@ -20,6 +29,48 @@ class SnowflakeMethods:
         else:
             self.wrapper = SnowflakeWrapper()
 
+    def fetch(self, query):
+        # query is a BoundStatement from queries/statements.py. Identical queries running at
+        # the same time share one execution (see coalesce.py); the statement's name is its
+        # QUERY_TAG and telemetry tag.
+        return single_flight.do(flight_key('rows', query),
+                                lambda: self.wrapper.validate_and_execute(query.sql, query.params, tag=query.name))
+
+    def fetch_series(self, query):
+        # FACT_* series are fetched as Arrow and handed on column by column
+        return single_flight.do(flight_key('series', query), lambda: SeriesColumns.from_arrow(
+            self.wrapper.validate_and_execute_arrow(query.sql, query.params, tag=query.name)))
+
+    def fetch_series_segmented(self, statement, date_time_start, date_time_end, **values):
+        # Like fetch_series(statement.bind(...)) with the sealed time buckets of the range
+        # served from the series segment cache (see segments.py)
+        return series_segments.fetch(statement, date_time_start, date_time_end, values, self.fetch_series)
+
+    def fetch_series_downsampled(self, statement, date_time_start, date_time_end, max_points, downsampling, **values):
+        # statement keeps the min/max rows of :bucket_seconds wide TIME_SLICEs (see downsampling.py),
+        # sized so the result is about max_points rows (a few times more for LTTB to pick from)
+        seconds = bucket_seconds(date_time_start, date_time_end, sql_buckets(max_points, downsampling))
+        return self.fetch_series(statement.bind(date_time_start=date_time_start, date_time_end=date_time_end,
+                                                bucket_seconds=seconds, **values))
+
+    def fetch_stream(self, query):
+        return self.wrapper.stream_execute(query.sql, query.params, tag=query.name)
+
+    def fetch_arrow_stream(self, query):
+        # the result as pyarrow.RecordBatches read while they are consumed, for the exports
+        return self.wrapper.stream_execute_arrow(query.sql, query.params, tag=query.name)
+
+    def fetch_concurrently(self, calls):
+        """
+        Run independent query calls (name -> callable) in parallel, each on its own pooled
+        connection, and return name -> result. The request waits for the slowest query
+        instead of the sum of all of them. Each call runs in a copy of the caller's context,
+        so the request's query deadline applies to it as well.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(calls)) as executor:
+            futures = {name: executor.submit(contextvars.copy_context().run, call) for name, call in calls.items()}
+            return {name: future.result() for name, future in futures.items()}
+
     def convert_boolean_value(self, value):
         if value is not None:
             return int(value) == 1
@@ -30,6 +81,13 @@ class SnowflakeMethods:
             return Decimal(round(Decimal(value), places))
         return None
 
+    def series_min_max(self, values):
+        # min/max of a float column ignoring NULLs, rounded like the series values
+        present = values[~np.isnan(values)]
+        if len(present) == 0:
+            return None, None
+        return self.convert_to_decimal(present.min()), self.convert_to_decimal(present.max())
+
     def handle_nulls(self, value):
         if value is None:
             return ''
@@ -38,21 +96,82 @@ class SnowflakeMethods:
     # Refer to PBI 170401 for context.
     def normalize_time_series(self, time_series_results, date_time_start, date_time_end, time_index=0):
         if len(time_series_results) > 0:
-            result_start_stripped = str(time_series_results[0][time_index]).split(" ")[0]
-            result_end_stripped = str(time_series_results[-1][time_index]).split(" ")[0]
-            if " " in str(date_time_start):
-                date_time_start = str(date_time_start).split(" ")[0]
-            if "+" in str(date_time_start):
-                date_time_start = str(date_time_start).split("+")[0]
-            if " " in str(date_time_end):
-                date_time_end = str(date_time_end).split(" ")[0]
-            if "+" in str(date_time_end):
-                date_time_end = str(date_time_end).split("+")[0]
-            if helpers.get_datetime_obj(result_start_stripped).date() > helpers.get_datetime_obj(
-                    f"{date_time_start}").date():
-                time_series_results.insert(0, (None, None, f'{date_time_start}', f'{date_time_start}', 0))
+            columnar = isinstance(time_series_results, SeriesColumns)
+            if columnar:
+                first_time = time_series_results[time_index][0]
+            else:
+                first_time = time_series_results[0][time_index]
+            if self.series_starts_late(first_time, date_time_start):
+                date_time_start = self.strip_time(date_time_start)
+                if columnar:
+                    # (time, value, ...) columns: the gap is marked by a point without a value
+                    time_series_results.prepend(f'{date_time_start}', *[None] * (len(time_series_results.columns) - 1))
+                else:
+                    time_series_results.insert(0, (None, None, f'{date_time_start}', f'{date_time_start}', 0))
         return time_series_results
 
+    def normalize_time_series_stream(self, rows, date_time_start):
+        # Same as normalize_time_series for streamed (time, value) rows
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return
+        if self.series_starts_late(first[0], date_time_start):
+            yield f'{self.strip_time(date_time_start)}', None
+        yield first
+        yield from rows
+
+    def series_starts_late(self, first_time, date_time_start):
+        first_date = str(first_time).split(" ")[0]
+        return helpers.get_datetime_obj(first_date).date() > helpers.get_datetime_obj(
+            f"{self.strip_time(date_time_start)}").date()
+
+    @staticmethod
+    def strip_time(date_time):
+        if " " in str(date_time):
+            date_time = str(date_time).split(" ")[0]
+        if "+" in str(date_time):
+            date_time = str(date_time).split("+")[0]
+        return date_time
+
+    def build_series_point(self, time_value, value, timezone):
+        time = helpers.convert_utc_to_local(helpers.get_datetime_obj(time_value), timezone)
+        return {
+            'time': time,
+            'value': None if value is None else self.convert_to_decimal(value),
+            'formatted_date': helpers.format_datetime(time),
+            'time_epoch': helpers.get_epoch(time, timezone)
+        }
+
+    def build_series_points(self, times, values, timezone, epoch_ms=None):
+        # build_series_point for whole columns (see pipeline.py), from the (UTC, local) epoch_ms
+        # columns when the series was fetched with SQL times; a zone that dateutil doesn't know
+        # keeps the point by point path, and how it fails
+        if zone(timezone) is None:
+            return [self.build_series_point(time_value, None if np.isnan(value) else value, timezone)
+                    for time_value, value in zip(times, values)]
+        if epoch_ms is not None:
+            return series_points_from_epochs(times, values, *epoch_ms, timezone)
+        return series_points(times, values, timezone)
+
+    def build_series_columns(self, times, values, timezone, epoch_ms=None):
+        # the format=columnar counterpart of build_series_points
+        if zone(timezone) is None:
+            points = self.build_series_points(times, values, timezone)
+            return {'epoch': [point['time_epoch'] for point in points],
+                    'value': [None if point['value'] is None else float(point['value']) for point in points]}
+        return series_columns(times, values, timezone, epoch_ms)
+
+    @staticmethod
+    def sql_times_zone(timezone):
+        """
+        The IANA name of ``timezone`` when series times are converted by Snowflake
+        (SNOWFLAKE_SERIES_SQL_TIMES), None when they are converted here.
+        """
+        if not settings.SNOWFLAKE_SERIES_SQL_TIMES:
+            return None
+        return getattr(zone('UTC' if timezone is None else timezone), 'key', None)
+
 def date_range(start_date, end_date):
     current_date = start_date
     next_date = current_date + timedelta(days=3)
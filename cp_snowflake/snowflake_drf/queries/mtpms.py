@@ -2,21 +2,24 @@ import os
 from snowflake_wrapper.base import SnowflakeWrapper
 from datetime import timedelta, datetime
 import concurrent.futures
+from functools import partial
 from .. import helpers
 import logging
+from django.conf import settings
 from decimal import Decimal, DecimalException
 from .methods import SnowflakeMethods
+from .columns import as_series_columns, numeric
+from .asof import AsOfTargets
+from .grouping import group_by
+from .pipeline import decimals, epoch_ms_columns, epoch_ms_times, labels, rounded
+from ..timestamps import epochs, wall_times
 
-log = logging.getLogger(__name__)
-
-
-class Mtpms(SnowflakeMethods):
-
-    def get_snowflake_mtpm_dim_data(self, plant_technology_id):
+from .cache import cached_query
+from .statements import Statement, in_list, resolve_uom, uom_statements
 
-        records = []
+log = logging.getLogger(__name__)
 
-        results = self.wrapper.validate_and_execute(f"""
+MTPM_DIM = Statement('mtpm.dim', """
                 SELECT 
                     m.mtpm_id, 
                     pt.plant_technology_id, 
@@ -34,144 +37,59 @@ class Mtpms(SnowflakeMethods):
                     m.big_water_user_drilldown_display_text,
                     m.target_type
                 FROM 
-                    {os.getenv("SNOWFLAKE_DATABASE")}
-                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                    .DIM_MTPM m
+                    {schema}.DIM_MTPM m
                 LEFT JOIN 
-                    {os.getenv("SNOWFLAKE_DATABASE")}
-                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                    ."DIM_PLANT_TECHNOLOGY" pt 
+                    {schema}."DIM_PLANT_TECHNOLOGY" pt 
                 ON m.plant_technology_id = pt.plant_technology_id 
-                {f"WHERE m.plant_technology_id='{plant_technology_id}'" if plant_technology_id else ''}
-                    """
-                                                    )
+                WHERE (:plant_technology_id IS NULL OR m.plant_technology_id = :plant_technology_id)
+                    """)
 
-        for res in results:
-            records.append({
-                'mtpm_id': res[0],
-                'plant_technology_id': res[1],
-                'plant_id': res[2],
-                'mtpm_name': res[3],
-                'mtpm_display_name': res[4],
-                'area_name': res[5],
-                'has_big_energy_user_leading_indicator': self.convert_boolean_value(res[6]),
-                'has_big_water_user_leading_indicator': self.convert_boolean_value(res[7]),
-                'is_natural_resource_flag': self.convert_boolean_value(res[8]),
-                'ui_level': res[9],
-                'uom_metric': res[10],
-                'uom_imperial': res[11],
-                'big_energy_user_drilldown_display_text': res[12],
-                'big_water_user_drilldown_display_text': res[13],
-                'target_type': res[14],
-            })
-
-        return records
-
-    def get_snowflake_mtpm_target_data_generic(self, plant_technology_id, datetimestart, datetimeend,
-                                       preferred_uom=None, mtpm_list=None, ui_level=None, opportunity_flag=None):
-
-        if preferred_uom is not None and mtpm_list is not None:
-            time_series_results = None
-            if opportunity_flag is None:
-                time_series_results = self.get_mtpm_ts_results(datetimestart, datetimeend, preferred_uom, mtpm_list)
+# Targets, opportunities and the MTPM filter differ between the mtpm_list and ui_level
+# variants of the MTPM queries; the rest of the statement is shared.
+_MTPM_LIST_FILTER = """WHERE m.mtpm_id IN {in_mtpm_ids}"""
+_MTPM_LIST_OPPORTUNITY_FILTER = """WHERE mtpm_id IN {in_mtpm_ids} AND opportunity_value_timestamp_local BETWEEN :datetimestart
+                            AND :datetimeend"""
+_UI_LEVEL_FILTER = """WHERE m.ui_level = :ui_level"""
 
-            dim_results = self.get_mtpm_dim_results(plant_technology_id, datetimestart, datetimeend, preferred_uom, mtpm_list, ui_level)
-            target_results = self.get_mtpm_target_results(preferred_uom, mtpm_list, datetimestart, datetimeend)
-            return self.snowflake_build_mtpm_dim_object_preferred_uom(dim_results, time_series_results, target_results)
-
-        else:
-            mtpm_query = self.build_mtpm_query(plant_technology_id, datetimestart, datetimeend, mtpm_list, ui_level)
-            dim_results = self.wrapper.validate_and_execute(mtpm_query)
-            return self.snowflake_build_mtpm_dim_object(dim_results, opportunity_flag)
-        return []
-    
-    def get_mtpm_dim_results(self, plant_technology_id, datetimestart, datetimeend, preferred_uom, mtpm_list, ui_level):
-        mtpm_query = self.build_mtpm_query_preferred_uom(plant_technology_id, datetimestart, datetimeend, preferred_uom, mtpm_list, ui_level)
-        dim_results = self.wrapper.validate_and_execute(mtpm_query)
-        return dim_results
-
-    def get_mtpm_ts_results(self, datetimestart, datetimeend, preferred_uom, mtpm_list):
-        time_series_query = self.build_mtpm_time_series_query(datetimestart, datetimeend, preferred_uom, mtpm_list)
-        ts_results = self.wrapper.validate_and_execute(time_series_query)
-        return ts_results
-
-    def get_mtpm_target_results(self, preferred_uom, mtpm_list, datetimestart, datetimeend):
-        target_query = self.build_mtpm_target_query(preferred_uom, mtpm_list, datetimestart, datetimeend)
-        target_results = self.wrapper.validate_and_execute(target_query)
-        return target_results
-
-    def build_mtpm_query(self, plant_technology_id, datetimestart, datetimeend, mtpm_list=None, ui_level=None):
-
-        snowflake_db_and_schema = f'{os.getenv("SNOWFLAKE_DATABASE")}.{os.getenv("SNOWFLAKE_SCHEMA")}'
-
-        financial_value = """b_opp_cte.opportunity_financial_value opportunity_financial_value_budget,
-                pb_opp_cte.opportunity_financial_value opportunity_financial_value_pb,
-                lfy_opp_cte.opportunity_financial_value opportunity_financial_value_lfy"""
-
-        preferred_uom_query = 'mtpm_target_value_metric, mtpm_target_value_imperial'
-        preferred_uom_t = 't.mtpm_target_value_metric, t.mtpm_target_value_imperial'
-        uom = 'uom_imperial, uom_metric'
-        uom_low_high = 'display_high_imperial, display_low_imperial, display_high_metric, display_low_metric'
-        uom_min_max = 'max_imperial, min_imperial, max_metric, min_metric'
-        mtpm_value = 'mtpm_value_imperial, mtpm_value_metric'
-        targets_uom = """lfy_cte.mtpm_target_value_metric mtpm_target_value_metric_lfy, 
-                        lfy_cte.mtpm_target_value_imperial mtpm_target_value_imperial_lfy,
-                        pb_cte.mtpm_target_value_metric mtpm_target_value_metric_pb,
-                        pb_cte.mtpm_target_value_imperial mtpm_target_value_imperial_pb,
-                        b_cte.mtpm_target_value_metric mtpm_target_value_metric_budget,
-                        b_cte.mtpm_target_value_imperial mtpm_target_value_imperial_budget"""
-
-        if mtpm_list is not None:
-            mtpm_list_enum = f"""{",".join([f"'{str(elem)}'" for i, elem in enumerate(mtpm_list)])}"""
-            mtpm_id_clause = f"""WHERE m.mtpm_id IN ({mtpm_list_enum})"""
-            opportunity_where_clause = f"""WHERE mtpm_id IN ({mtpm_list_enum}) AND opportunity_value_timestamp_local BETWEEN '{datetimestart}'
-                            AND '{datetimeend}'"""
-            cte_subquery = f"""WITH SORTED_MTPM_TARGETS AS (
+_MTPM_TARGETS = """WITH SORTED_MTPM_TARGETS AS (
                             SELECT
                                 mtpm_id,
                                 mtpm_target_type,
                                 mtpm_target_value_timestamp_local,
-                                {preferred_uom_query},
+                                {target_columns},
                                 ROW_NUMBER() OVER (PARTITION BY mtpm_id,mtpm_target_type
                                 ORDER BY mtpm_id, mtpm_target_value_timestamp_local desc) AS row_number
                                 FROM FACT_MTPM_TARGET
                             WHERE
-                                mtpm_id IN ({mtpm_list_enum})
-                                AND mtpm_target_value_timestamp_local <= '{datetimeend}'
-                                AND (mtpm_target_value_metric IS NOT NULL OR mtpm_target_value_imperial IS NOT NULL)
+                                mtpm_id IN {in_mtpm_ids}
+                                AND mtpm_target_value_timestamp_local <= :datetimeend
+                                AND {target_not_null}
                         )
                         SELECT row_number as row_id, mtpm_id,
                                 mtpm_target_type,
-                                {preferred_uom_query}
+                                {target_columns}
                         FROM SORTED_MTPM_TARGETS
                         WHERE row_number = 1
                         ORDER BY mtpm_id, mtpm_target_type, mtpm_target_value_timestamp_local"""
 
-        if ui_level is not None:
-            mtpm_id_clause = f"""WHERE m.ui_level = '{ui_level}'"""
-            opportunity_where_clause = ""
-            cte_subquery = f"""SELECT RANK() OVER (ORDER BY mtpm_target_value_timestamp_utc ASC) row_id,
+_UI_LEVEL_TARGETS = """SELECT RANK() OVER (ORDER BY mtpm_target_value_timestamp_utc ASC) row_id,
                                 t.mtpm_id,
                                 mtpm_target_type,
-                                {preferred_uom_query}
-                        FROM {os.getenv("SNOWFLAKE_DATABASE")}
-                            .{os.getenv("SNOWFLAKE_SCHEMA")}
-                            ."DIM_MTPM" m
+                                {target_columns}
+                        FROM {schema}."DIM_MTPM" m
                         LEFT JOIN
-                            {os.getenv("SNOWFLAKE_DATABASE")}
-                            .{os.getenv("SNOWFLAKE_SCHEMA")}
-                            ."FACT_MTPM_TARGET" t  ON m.mtpm_id = t.mtpm_id
-                        WHERE m.ui_level = '{ui_level}'
-                        AND plant_technology_id = '{plant_technology_id}'
-                        AND mtpm_target_value_timestamp_local <= '{datetimeend}'"""
-
-        mtpm_query = f"""WITH cte_target_values(
+                            {schema}."FACT_MTPM_TARGET" t  ON m.mtpm_id = t.mtpm_id
+                        WHERE m.ui_level = :ui_level
+                        AND plant_technology_id = :plant_technology_id
+                        AND mtpm_target_value_timestamp_local <= :datetimeend"""
+
+_MTPM = """WITH cte_target_values(
                         row_id,
                         mtpm_id,
                         mtpm_target_type,
-                        {preferred_uom_query}
+                        {target_columns}
                         ) AS (
-                            {cte_subquery}
+                            {targets}
                         ),
                         cte_opportunity_values(
                         mtpm_id,
@@ -185,7 +103,7 @@ class Mtpms(SnowflakeMethods):
                         FROM
                             DIM_OPPORTUNITY op
                             LEFT JOIN FACT_OPPORTUNITY fo ON op.opportunity_id = fo.opportunity_id
-                            {opportunity_where_clause}
+                            {opportunity_filter}
 
                         GROUP BY
                             mtpm_id,
@@ -202,49 +120,46 @@ class Mtpms(SnowflakeMethods):
                         has_big_water_user_leading_indicator,
                         is_natural_resource_flag,
                         ui_level,
-                        {targets_uom},
-                        {financial_value},
+                        lfy_cte.mtpm_target_value_metric mtpm_target_value_metric_lfy, 
+                        lfy_cte.mtpm_target_value_imperial mtpm_target_value_imperial_lfy,
+                        pb_cte.mtpm_target_value_metric mtpm_target_value_metric_pb,
+                        pb_cte.mtpm_target_value_imperial mtpm_target_value_imperial_pb,
+                        b_cte.mtpm_target_value_metric mtpm_target_value_metric_budget,
+                        b_cte.mtpm_target_value_imperial mtpm_target_value_imperial_budget,
+                        b_opp_cte.opportunity_financial_value opportunity_financial_value_budget,
+                        pb_opp_cte.opportunity_financial_value opportunity_financial_value_pb,
+                        lfy_opp_cte.opportunity_financial_value opportunity_financial_value_lfy,
                         (
                             CASE
                                 WHEN (SELECT COUNT(*) FROM
-                                    {os.getenv("SNOWFLAKE_DATABASE")}
-                                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                                    ."DIM_OPPORTUNITY" op
+                                    {schema}."DIM_OPPORTUNITY" op
                                     JOIN
-                                    {os.getenv("SNOWFLAKE_DATABASE")}
-                                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                                    ."FACT_OPPORTUNITY" fop
+                                    {schema}."FACT_OPPORTUNITY" fop
                                     ON op.opportunity_id = fop.opportunity_id
                                     WHERE op.mtpm_id = m.mtpm_id
-                                    AND fop.opportunity_value_timestamp_local BETWEEN '{datetimestart}' AND '{datetimeend}') > 0
+                                    AND fop.opportunity_value_timestamp_local BETWEEN :datetimestart AND :datetimeend) > 0
                                 THEN 1
                                 ELSE 0
                             END) has_oportunity,
                         (
                             CASE
                                 WHEN (SELECT COUNT(*) FROM
-                                    {os.getenv("SNOWFLAKE_DATABASE")}
-                                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                                    ."DIM_LEADING_INDICATOR" li
+                                    {schema}."DIM_LEADING_INDICATOR" li
                                     WHERE li.mtpm_id = m.mtpm_id) > 0 
                                 THEN 1
                                 ELSE 0
                             END) has_leading_indicator,
-                        {mtpm_value},
+                        mtpm_value_imperial, mtpm_value_metric,
                         mtpm_value_timestamp_utc,
                         mtpm_value_timestamp_local,
-                        {uom},
-                        {uom_low_high},
-                        {uom_min_max},
+                        uom_imperial, uom_metric,
+                        display_high_imperial, display_low_imperial, display_high_metric, display_low_metric,
+                        max_imperial, min_imperial, max_metric, min_metric,
                         m.target_type
                     FROM
-                        {os.getenv("SNOWFLAKE_DATABASE")}
-                        .{os.getenv("SNOWFLAKE_SCHEMA")}
-                        ."DIM_MTPM" m
+                        {schema}."DIM_MTPM" m
                     LEFT JOIN
-                        {os.getenv("SNOWFLAKE_DATABASE")}
-                        .{os.getenv("SNOWFLAKE_SCHEMA")}
-                        ."FACT_MTPM" fm ON m.mtpm_id = fm.mtpm_id AND (fm.mtpm_value_timestamp_local >= '{datetimestart}' AND fm.mtpm_value_timestamp_local <= '{datetimeend}')
+                        {schema}."FACT_MTPM" fm ON m.mtpm_id = fm.mtpm_id AND (fm.mtpm_value_timestamp_local >= :datetimestart AND fm.mtpm_value_timestamp_local <= :datetimeend)
                     LEFT JOIN cte_target_values b_cte ON m.mtpm_id = b_cte.mtpm_id AND b_cte.mtpm_target_type = 'Budget'
                     LEFT JOIN cte_target_values lfy_cte ON m.mtpm_id = lfy_cte.mtpm_id AND lfy_cte.mtpm_target_type = 'LFY'
                     LEFT JOIN cte_target_values pb_cte ON m.mtpm_id = pb_cte.mtpm_id AND pb_cte.mtpm_target_type = 'PB'
@@ -254,67 +169,29 @@ class Mtpms(SnowflakeMethods):
                     AND lfy_opp_cte.opportunity_type = 'OP LFY'
                     LEFT JOIN cte_opportunity_values pb_opp_cte ON m.mtpm_id = pb_opp_cte.mtpm_id
                     AND pb_opp_cte.opportunity_type = 'OP PB'
-                    {mtpm_id_clause}
-                    AND m.plant_technology_id = '{plant_technology_id}'
+                    {mtpm_filter}
+                    AND m.plant_technology_id = :plant_technology_id
                     ORDER BY mtpm_value_timestamp_local ASC
                     """
-        return mtpm_query
-
-    def build_mtpm_query_preferred_uom(self, plant_technology_id, datetimestart, datetimeend,
-                                       preferred_uom, mtpm_list=None, ui_level=None):
-
-        snowflake_db_and_schema = f'{os.getenv("SNOWFLAKE_DATABASE")}.{os.getenv("SNOWFLAKE_SCHEMA")}'
-
-        financial_value = """b_opp_cte.opportunity_financial_value opportunity_financial_value_budget,                        
-                pb_opp_cte.opportunity_financial_value opportunity_financial_value_pb,                        
-                lfy_opp_cte.opportunity_financial_value opportunity_financial_value_lfy"""
 
-        target_values = f"""lfy_cte.mtpm_target_value_{preferred_uom} mtpm_target_value_{preferred_uom}_lfy,
-            pb_cte.mtpm_target_value_{preferred_uom} mtpm_target_value_{preferred_uom}_pb,
-            b_cte.mtpm_target_value_{preferred_uom} mtpm_target_value_{preferred_uom}_budget"""
+_BOTH_UOM_TARGET_COLUMNS = 'mtpm_target_value_metric, mtpm_target_value_imperial'
+_BOTH_UOM_TARGET_NOT_NULL = '(mtpm_target_value_metric IS NOT NULL OR mtpm_target_value_imperial IS NOT NULL)'
 
-        uom = 'uom_imperial' if preferred_uom == 'imperial' else 'uom_metric'
-        uom_low_high = 'display_high_imperial, display_low_imperial' if preferred_uom == 'imperial' else 'display_high_metric, display_low_metric'
-        uom_min_max = 'max_imperial, min_imperial' if preferred_uom == 'imperial' else 'max_metric, min_metric'
+MTPM_BY_LIST = Statement('mtpm.list', _MTPM, targets=_MTPM_TARGETS, target_columns=_BOTH_UOM_TARGET_COLUMNS,
+                         target_not_null=_BOTH_UOM_TARGET_NOT_NULL, in_mtpm_ids=in_list(':mtpm_ids'),
+                         opportunity_filter=_MTPM_LIST_OPPORTUNITY_FILTER, mtpm_filter=_MTPM_LIST_FILTER)
 
-        if mtpm_list is not None:
-            mtpm_list_enum = f"""{",".join([f"'{str(elem)}'" for i, elem in enumerate(mtpm_list)])}"""
-            mtpm_id_clause = f"""WHERE m.mtpm_id IN ({mtpm_list_enum})"""
-            opportunity_where_clause = f"""WHERE mtpm_id IN ({mtpm_list_enum}) AND opportunity_value_timestamp_local BETWEEN '{datetimestart}'
-                            AND '{datetimeend}'"""
+MTPM_BY_UI_LEVEL = Statement('mtpm.ui_level', _MTPM, targets=_UI_LEVEL_TARGETS,
+                             target_columns=_BOTH_UOM_TARGET_COLUMNS, opportunity_filter='',
+                             mtpm_filter=_UI_LEVEL_FILTER)
 
-        if ui_level is not None:
-            mtpm_id_clause = f"""WHERE m.ui_level = '{ui_level}'"""
-            opportunity_where_clause = ""
-
-        cte_subquery = f"""WITH SORTED_MTPM_TARGETS AS (
-                            SELECT 
-                                mtpm_id, 
-                                mtpm_target_type,
-                                mtpm_target_value_timestamp_local,
-                                mtpm_target_value_{preferred_uom}, 
-                                ROW_NUMBER() OVER (PARTITION BY mtpm_id,mtpm_target_type 
-                                ORDER BY mtpm_id, mtpm_target_value_timestamp_local desc) AS row_number
-                                FROM FACT_MTPM_TARGET
-                            WHERE 
-                                mtpm_id IN ({mtpm_list_enum}) 
-                                AND mtpm_target_value_timestamp_local <= '{datetimeend}'
-                                AND mtpm_target_value_{preferred_uom} IS NOT NULL
-                        ) 
-                        SELECT row_number as row_id, mtpm_id, 
-                                mtpm_target_type, 
-                                mtpm_target_value_{preferred_uom}
-                        FROM SORTED_MTPM_TARGETS
-                        WHERE row_number = 1
-                        ORDER BY mtpm_id, mtpm_target_type, mtpm_target_value_timestamp_local"""
-
-        mtpm_query = f"""WITH cte_target_values(
+_MTPM_PREFERRED_UOM = """WITH cte_target_values(
                         row_id, 
                         mtpm_id, 
                         mtpm_target_type, 
-                        mtpm_target_value_{preferred_uom}
+                        mtpm_target_value_{uom}
                         ) AS (
-                            {cte_subquery}   
+                            {targets}   
                         ),
                         cte_opportunity_values(
                         mtpm_id,
@@ -328,7 +205,7 @@ class Mtpms(SnowflakeMethods):
                         FROM
                             DIM_OPPORTUNITY op
                             LEFT JOIN FACT_OPPORTUNITY fo ON op.opportunity_id = fo.opportunity_id
-                            {opportunity_where_clause}
+                            {opportunity_filter}
                             
                         GROUP BY
                             mtpm_id,
@@ -345,38 +222,42 @@ class Mtpms(SnowflakeMethods):
                         has_big_water_user_leading_indicator, 
                         is_natural_resource_flag, 
                         ui_level, 
-                        {financial_value},
-                        {target_values},
+                        b_opp_cte.opportunity_financial_value opportunity_financial_value_budget,                        
+                        pb_opp_cte.opportunity_financial_value opportunity_financial_value_pb,                        
+                        lfy_opp_cte.opportunity_financial_value opportunity_financial_value_lfy,
+                        lfy_cte.mtpm_target_value_{uom} mtpm_target_value_{uom}_lfy,
+                        pb_cte.mtpm_target_value_{uom} mtpm_target_value_{uom}_pb,
+                        b_cte.mtpm_target_value_{uom} mtpm_target_value_{uom}_budget,
                         (
                             CASE  
                                 WHEN (SELECT COUNT(*) FROM 
-                                    {snowflake_db_and_schema}
+                                    {schema}
                                     ."DIM_OPPORTUNITY" op
                                     JOIN 
-                                    {snowflake_db_and_schema}
+                                    {schema}
                                     ."FACT_OPPORTUNITY" fop 
                                     ON op.opportunity_id = fop.opportunity_id 
                                     WHERE op.mtpm_id = m.mtpm_id 
-                                    AND fop.opportunity_value_timestamp_local BETWEEN '{datetimestart}' AND '{datetimeend}') > 0 
+                                    AND fop.opportunity_value_timestamp_local BETWEEN :datetimestart AND :datetimeend) > 0 
                                 THEN 1 
                                 ELSE 0
                             END) has_oportunity,
                         (
                             CASE
                                 WHEN (SELECT COUNT(*) FROM 
-                                    {snowflake_db_and_schema}
+                                    {schema}
                                     ."DIM_LEADING_INDICATOR" li 
                                     WHERE li.mtpm_id = m.mtpm_id) > 0
                                 THEN 1 
                                 ELSE 0
                             END) has_leading_indicator,
-                        {uom},
-                        {uom_low_high},
-                        {uom_min_max},
+                        uom_{uom},
+                        display_high_{uom}, display_low_{uom},
+                        max_{uom}, min_{uom},
                         m.target_type,
                         m.targets_are_calculated_flag
                     FROM
-                        {snowflake_db_and_schema}
+                        {schema}
                         ."DIM_MTPM" m
                     LEFT JOIN cte_target_values b_cte ON m.mtpm_id = b_cte.mtpm_id AND b_cte.mtpm_target_type = 'Budget'
                     LEFT JOIN cte_target_values lfy_cte ON m.mtpm_id = lfy_cte.mtpm_id AND lfy_cte.mtpm_target_type = 'LFY'
@@ -387,83 +268,199 @@ class Mtpms(SnowflakeMethods):
                     AND lfy_opp_cte.opportunity_type = 'OP LFY'
                     LEFT JOIN cte_opportunity_values pb_opp_cte ON m.mtpm_id = pb_opp_cte.mtpm_id
                     AND pb_opp_cte.opportunity_type = 'OP PB'
-                    {mtpm_id_clause}
-                    AND m.plant_technology_id = '{plant_technology_id}'
+                    {mtpm_filter}
+                    AND m.plant_technology_id = :plant_technology_id
                     """
-        return mtpm_query    
 
-    def build_mtpm_time_series_query(self, datetimestart, datetimeend, preferred_uom, mtpm_id):
-        mtpm_list_enum = f"""({",".join([f"'{str(elem)}'" for i, elem in enumerate(mtpm_id)])})"""
-        query = f"""WITH cte_target_values(
+MTPM_PREFERRED_UOM_BY_LIST = uom_statements('mtpm.dim.uom', _MTPM_PREFERRED_UOM, targets=_MTPM_TARGETS,
+                                            target_columns='mtpm_target_value_{uom}',
+                                            target_not_null='mtpm_target_value_{uom} IS NOT NULL',
+                                            in_mtpm_ids=in_list(':mtpm_ids'),
+                                            opportunity_filter=_MTPM_LIST_OPPORTUNITY_FILTER,
+                                            mtpm_filter=_MTPM_LIST_FILTER)
+
+MTPM_PREFERRED_UOM_BY_UI_LEVEL = uom_statements('mtpm.dim.uom.ui_level', _MTPM_PREFERRED_UOM, targets=_MTPM_TARGETS,
+                                                target_columns='mtpm_target_value_{uom}',
+                                                target_not_null='mtpm_target_value_{uom} IS NOT NULL',
+                                                in_mtpm_ids=in_list(':mtpm_ids'), opportunity_filter='',
+                                                mtpm_filter=_UI_LEVEL_FILTER)
+
+# {epoch_ms} is empty, or the epoch_ms_columns of MTPM_TIME_SERIES_SQL_TIMES (see pipeline.py)
+MTPM_TIME_SERIES_SQL = """WITH cte_target_values(
                         row_id, 
                         mtpm_id, 
                         mtpm_target_type, 
-                        mtpm_target_value_{preferred_uom}
+                        mtpm_target_value_{uom}
                         ) AS (
                             WITH SORTED_MTPM_TARGETS AS (
                             SELECT 
                                 mtpm_id, 
                                 mtpm_target_type,
                                 mtpm_target_value_timestamp_local,
-                                mtpm_target_value_{preferred_uom}, 
+                                mtpm_target_value_{uom}, 
                                 ROW_NUMBER() OVER (PARTITION BY mtpm_id,mtpm_target_type 
                                 ORDER BY mtpm_id, mtpm_target_value_timestamp_local desc) AS row_number
                                 FROM FACT_MTPM_TARGET
                             WHERE 
-                                mtpm_id in {mtpm_list_enum}
-                                AND mtpm_target_value_timestamp_local <= '{datetimeend}'
-                                AND (mtpm_target_value_{preferred_uom} IS NOT NULL)
+                                mtpm_id in {in_mtpm_ids}
+                                AND mtpm_target_value_timestamp_local <= :datetimeend
+                                AND (mtpm_target_value_{uom} IS NOT NULL)
                         ) 
                         SELECT row_number as row_id, mtpm_id, 
                                 mtpm_target_type, 
-                                mtpm_target_value_{preferred_uom}
+                                mtpm_target_value_{uom}
                         FROM SORTED_MTPM_TARGETS
                         WHERE row_number = 1
                         ORDER BY mtpm_id, mtpm_target_type, mtpm_target_value_timestamp_local   
                         )
                         SELECT 
-                        fm.mtpm_value_{preferred_uom},
+                        fm.mtpm_value_{uom},
                         fm.mtpm_value_timestamp_utc,
-                        lfy_cte.mtpm_target_value_{preferred_uom} mtpm_target_value_{preferred_uom}_lfy, 
-                        pb_cte.mtpm_target_value_{preferred_uom} mtpm_target_value_{preferred_uom}_pb, 
-                        b_cte.mtpm_target_value_{preferred_uom} mtpm_target_value_{preferred_uom}_budget
+                        lfy_cte.mtpm_target_value_{uom} mtpm_target_value_{uom}_lfy, 
+                        pb_cte.mtpm_target_value_{uom} mtpm_target_value_{uom}_pb, 
+                        b_cte.mtpm_target_value_{uom} mtpm_target_value_{uom}_budget{epoch_ms}
                      FROM 
-                        {os.getenv("SNOWFLAKE_DATABASE")}
-                        .{os.getenv("SNOWFLAKE_SCHEMA")}
-                        ."FACT_MTPM" fm
+                        {schema}."FACT_MTPM" fm
                     LEFT JOIN cte_target_values b_cte ON fm.mtpm_id = b_cte.mtpm_id AND b_cte.mtpm_target_type = 'Budget'
                     LEFT JOIN cte_target_values lfy_cte ON fm.mtpm_id = lfy_cte.mtpm_id AND lfy_cte.mtpm_target_type = 'LFY'
                     LEFT JOIN cte_target_values pb_cte ON fm.mtpm_id = pb_cte.mtpm_id AND pb_cte.mtpm_target_type = 'PB'
-                    WHERE fm.mtpm_id in {mtpm_list_enum}  
-                    AND fm.mtpm_value_timestamp_local BETWEEN '{datetimestart}' AND '{datetimeend}'
+                    WHERE fm.mtpm_id in {in_mtpm_ids}  
+                    AND fm.mtpm_value_timestamp_local BETWEEN :datetimestart AND :datetimeend
                     ORDER BY fm.mtpm_value_timestamp_local ASC"""
-        return query
 
-    def build_mtpm_target_query(self, preferred_uom, mtpm_id, datetimestart, datetimeend):
-        mtpm_list_enum = f"""({",".join([f"'{str(elem)}'" for i, elem in enumerate(mtpm_id)])})"""
-        query = f"""SELECT DISTINCT TOP 300 fmt.mtpm_target_value_timestamp_utc, fmt.mtpm_target_value_{preferred_uom}, fmt.mtpm_target_type
+MTPM_TIME_SERIES = uom_statements('mtpm.ts', MTPM_TIME_SERIES_SQL, in_mtpm_ids=in_list(':mtpm_ids'), epoch_ms='')
+
+# MTPM points are labelled with their UTC wall clock time, so no local epochs are needed
+MTPM_TIME_SERIES_SQL_TIMES = uom_statements('mtpm.ts.sqltimes', MTPM_TIME_SERIES_SQL, in_mtpm_ids=in_list(':mtpm_ids'),
+                                            epoch_ms=epoch_ms_columns('fm.mtpm_value_timestamp_utc', local=False))
+
+MTPM_TARGETS = uom_statements('mtpm.target', """SELECT DISTINCT TOP 300 fmt.mtpm_target_value_timestamp_utc, fmt.mtpm_target_value_{uom}, fmt.mtpm_target_type
                     FROM 
-                        {os.getenv("SNOWFLAKE_DATABASE")}
-                        .{os.getenv("SNOWFLAKE_SCHEMA")}
-                        ."FACT_MTPM_TARGET" fmt
-                WHERE fmt.mtpm_id in {mtpm_list_enum}
-                AND fmt.mtpm_target_value_{preferred_uom} IS NOT NULL
-                AND fmt.mtpm_target_value_timestamp_utc >= '{datetimestart}'
-                AND fmt.mtpm_target_value_timestamp_utc <= '{datetimeend}'
-                AND fmt.mtpm_target_value_{preferred_uom} != 0
-                ORDER BY fmt.mtpm_target_value_timestamp_utc ASC"""
-        return query
+                        {schema}."FACT_MTPM_TARGET" fmt
+                WHERE fmt.mtpm_id in {in_mtpm_ids}
+                AND fmt.mtpm_target_value_{uom} IS NOT NULL
+                AND fmt.mtpm_target_value_timestamp_utc >= :datetimestart
+                AND fmt.mtpm_target_value_timestamp_utc <= :datetimeend
+                AND fmt.mtpm_target_value_{uom} != 0
+                ORDER BY fmt.mtpm_target_value_timestamp_utc ASC""", in_mtpm_ids=in_list(':mtpm_ids'))
 
-    def snowflake_build_mtpm_dim_object(self, results, opportunity_flag=None):
+
+# the parallel lists of a format=columnar MTPM time series
+MTPM_SERIES_COLUMNS = ('epoch', 'value', 'target_lfy', 'target_pb', 'target_budget')
+
+
+class Mtpms(SnowflakeMethods):
+
+    @cached_query('mtpm.dim')
+    def get_snowflake_mtpm_dim_data(self, plant_technology_id):
 
         records = []
 
-        # Extract unique mtpm ids from resultset and loop them
-        mtpm_ids = set(map(lambda a: a[0], results))
+        results = self.fetch(MTPM_DIM.bind(plant_technology_id=plant_technology_id or None))
+
+        for res in results:
+            records.append({
+                'mtpm_id': res[0],
+                'plant_technology_id': res[1],
+                'plant_id': res[2],
+                'mtpm_name': res[3],
+                'mtpm_display_name': res[4],
+                'area_name': res[5],
+                'has_big_energy_user_leading_indicator': self.convert_boolean_value(res[6]),
+                'has_big_water_user_leading_indicator': self.convert_boolean_value(res[7]),
+                'is_natural_resource_flag': self.convert_boolean_value(res[8]),
+                'ui_level': res[9],
+                'uom_metric': res[10],
+                'uom_imperial': res[11],
+                'big_energy_user_drilldown_display_text': res[12],
+                'big_water_user_drilldown_display_text': res[13],
+                'target_type': res[14],
+            })
+
+        return records
+
+    def get_snowflake_mtpm_target_data_generic(self, plant_technology_id, datetimestart, datetimeend,
+                                       preferred_uom=None, mtpm_list=None, ui_level=None, opportunity_flag=None,
+                                       columnar=False):
+
+        if preferred_uom is not None and mtpm_list is not None:
+            queries = {
+                'dim': partial(self.get_mtpm_dim_results, plant_technology_id, datetimestart, datetimeend,
+                               preferred_uom, mtpm_list, ui_level),
+                'target': partial(self.get_mtpm_target_results, preferred_uom, mtpm_list, datetimestart, datetimeend),
+            }
+            if opportunity_flag is None:
+                queries['time_series'] = partial(self.get_mtpm_ts_results, datetimestart, datetimeend, preferred_uom,
+                                                 mtpm_list)
+
+            results = self.fetch_concurrently(queries)
+            return self.snowflake_build_mtpm_dim_object_preferred_uom(results['dim'], results.get('time_series'),
+                                                                      results['target'], columnar)
+
+        else:
+            mtpm_query = self.build_mtpm_query(plant_technology_id, datetimestart, datetimeend, mtpm_list, ui_level)
+            dim_results = self.fetch(mtpm_query)
+            return self.snowflake_build_mtpm_dim_object(dim_results, opportunity_flag)
+        return []
+    
+    def get_mtpm_dim_results(self, plant_technology_id, datetimestart, datetimeend, preferred_uom, mtpm_list, ui_level):
+        mtpm_query = self.build_mtpm_query_preferred_uom(plant_technology_id, datetimestart, datetimeend, preferred_uom, mtpm_list, ui_level)
+        dim_results = self.fetch(mtpm_query)
+        return dim_results
+
+    def get_mtpm_ts_results(self, datetimestart, datetimeend, preferred_uom, mtpm_list):
+        time_series_query = self.build_mtpm_time_series_query(datetimestart, datetimeend, preferred_uom, mtpm_list)
+        ts_results = self.fetch_series(time_series_query)
+        return ts_results
+
+    def export_mtpm_time_series(self, datetimestart, datetimeend, preferred_uom, mtpm_list):
+        # the time series of get_mtpm_ts_results as Arrow record batches, read while the export is written
+        return self.fetch_arrow_stream(self.build_mtpm_time_series_query(datetimestart, datetimeend, preferred_uom,
+                                                                         mtpm_list))
+
+    def get_mtpm_target_results(self, preferred_uom, mtpm_list, datetimestart, datetimeend):
+        target_query = self.build_mtpm_target_query(preferred_uom, mtpm_list, datetimestart, datetimeend)
+        target_results = self.fetch(target_query)
+        return target_results
+
+    def build_mtpm_query(self, plant_technology_id, datetimestart, datetimeend, mtpm_list=None, ui_level=None):
+
+        if ui_level is not None:
+            return MTPM_BY_UI_LEVEL.bind(plant_technology_id=plant_technology_id, datetimestart=datetimestart,
+                                         datetimeend=datetimeend, ui_level=ui_level)
+
+        return MTPM_BY_LIST.bind(plant_technology_id=plant_technology_id, datetimestart=datetimestart,
+                                 datetimeend=datetimeend, mtpm_ids=mtpm_list)
+
+    def build_mtpm_query_preferred_uom(self, plant_technology_id, datetimestart, datetimeend,
+                                       preferred_uom, mtpm_list=None, ui_level=None):
+
+        uom = resolve_uom(preferred_uom)
+
+        if ui_level is not None:
+            return MTPM_PREFERRED_UOM_BY_UI_LEVEL[uom].bind(plant_technology_id=plant_technology_id,
+                                                            datetimestart=datetimestart, datetimeend=datetimeend,
+                                                            mtpm_ids=mtpm_list, ui_level=ui_level)
+
+        return MTPM_PREFERRED_UOM_BY_LIST[uom].bind(plant_technology_id=plant_technology_id,
+                                                    datetimestart=datetimestart, datetimeend=datetimeend,
+                                                    mtpm_ids=mtpm_list)
+
+    def build_mtpm_time_series_query(self, datetimestart, datetimeend, preferred_uom, mtpm_id):
+        statements = MTPM_TIME_SERIES_SQL_TIMES if settings.SNOWFLAKE_SERIES_SQL_TIMES else MTPM_TIME_SERIES
+        return statements[resolve_uom(preferred_uom)].bind(datetimestart=datetimestart, datetimeend=datetimeend,
+                                                           mtpm_ids=mtpm_id)
+
+    def build_mtpm_target_query(self, preferred_uom, mtpm_id, datetimestart, datetimeend):
+        return MTPM_TARGETS[resolve_uom(preferred_uom)].bind(datetimestart=datetimestart, datetimeend=datetimeend,
+                                                             mtpm_ids=mtpm_id)
+
+    def snowflake_build_mtpm_dim_object(self, results, opportunity_flag=None):
+
+        records = []
 
-        for mtpm in mtpm_ids:
-            # Filter the dataset by each mtpm ID, and take only the first row for header/dim values
-            filtered_mtpms = list(filter(lambda r: r[0] == mtpm, results))
+        # Group the dataset by mtpm ID in one pass, and take only the first row for header/dim values
+        for filtered_mtpms in group_by(results, 0).values():
 
             record = {
                 'mtpm_id': filtered_mtpms[0][0],
@@ -506,7 +503,8 @@ class Mtpms(SnowflakeMethods):
 
         return records
 
-    def snowflake_build_mtpm_dim_object_preferred_uom(self, dim_results, time_series_results, target_results=None):
+    def snowflake_build_mtpm_dim_object_preferred_uom(self, dim_results, time_series_results, target_results=None,
+                                                      columnar=False):
         records = []
 
         for mtpm in dim_results:
@@ -537,7 +535,7 @@ class Mtpms(SnowflakeMethods):
 
             if time_series_results is not None:
                 # Pass the entire filtered datase to build the time series array inside the main object
-                time_series_data = self.get_mtpm_time_series_preferred_uom(time_series_results, target_results, mtpm[11], mtpm[12], mtpm[13], self.convert_boolean_value(mtpm[22]))
+                time_series_data = self.get_mtpm_time_series_preferred_uom(time_series_results, target_results, mtpm[11], mtpm[12], mtpm[13], self.convert_boolean_value(mtpm[22]), columnar)
                 record['time_series'] = time_series_data[0]
                 record['ts_min'] = time_series_data[1]
                 record['ts_max'] = time_series_data[2]
@@ -546,84 +544,61 @@ class Mtpms(SnowflakeMethods):
 
         return records
 
-    def get_mtpm_time_series_preferred_uom(self, time_series_results, target_results=None, lfy_dim=None, pb_dim=None, budget_dim=None, dynamic_targets=False):
-        records = []
+    def get_mtpm_time_series_preferred_uom(self, time_series_results, target_results=None, lfy_dim=None, pb_dim=None, budget_dim=None, dynamic_targets=False, columnar=False):
+        records = {column: [] for column in MTPM_SERIES_COLUMNS} if columnar else []
 
-        max = None
-        min = None
         lfy_vals = None
         pb_vals = None
         bdgt_vals = None
 
         if target_results:
-            lfy_vals = [x for x in target_results if (len(x) > 2 and x[2].lower() == 'lfy')]
-            pb_vals = [x for x in target_results if (len(x) > 2 and x[2].lower() == 'pb')]
-            bdgt_vals = [x for x in target_results if (len(x) > 2 and x[2].lower() == 'budget')]
-
-        for res in time_series_results:
-            time = None
-            formatted_date = ''
-            lfy = None
-            pb = None
-            bdgt = None
-
-            if res[1] is not None:
-                time = res[1]
-                formatted_date = helpers.format_datetime(time)
-
-            # Round value to 4 decimals
-            value = res[0]
-            if value is not None:
-                value = round(value, 4)
-
-            if max is None or (value is not None and value > max):
-                max = value
-            if min is None or (value is not None and value < min):
-                min = value
-
-            if dynamic_targets:
-                if target_results:
-                    series_time = helpers.get_datetime_obj(time)
-                    for val in lfy_vals:
-                        target_time = helpers.get_datetime_obj(val[0])
-                        if target_time <= series_time:
-                            lfy = val[1]
-                        if target_time > series_time:
-                            break
-                    for val in pb_vals:
-                        target_time = helpers.get_datetime_obj(val[0])
-                        if target_time <= series_time:
-                            pb = val[1]
-                        if target_time > series_time:
-                            break
-                    for val in bdgt_vals:
-                        target_time = helpers.get_datetime_obj(val[0])
-                        if target_time <= series_time:
-                            bdgt = val[1]
-                        if target_time > series_time:
-                            break
-            if not dynamic_targets or len(target_results) < 1:
-                # populate targets from dim query
-                if lfy is None:
-                    lfy = lfy_dim
-                if pb is None:
-                    pb = pb_dim
-                if bdgt is None:
-                    bdgt = budget_dim
-
-                    
+            targets_by_type = group_by(target_results, lambda x: x[2].lower() if len(x) > 2 else None)
+            lfy_vals = AsOfTargets(targets_by_type.get('lfy', []))
+            pb_vals = AsOfTargets(targets_by_type.get('pb', []))
+            bdgt_vals = AsOfTargets(targets_by_type.get('budget', []))
+
+        series = as_series_columns(time_series_results)
+        if len(series) == 0:
+            return [records, None, None]
+
+        values = numeric(series[0])
+        times = series[1]
+
+        # the targets of every point, joined as of the point's time
+        if dynamic_targets and target_results:
+            lfy_at, pb_at, bdgt_at = (targets.at_each(times) for targets in (lfy_vals, pb_vals, bdgt_vals))
+        else:
+            lfy_at = pb_at = bdgt_at = [None] * len(times)
+
+        if not dynamic_targets or len(target_results) < 1:
+            # populate targets from dim query
+            lfy_at = [lfy_dim if lfy is None else lfy for lfy in lfy_at]
+            pb_at = [pb_dim if pb is None else pb for pb in pb_at]
+            bdgt_at = [budget_dim if bdgt is None else bdgt for bdgt in bdgt_at]
+
+        # labels, epochs and values rounded to 4 decimals for the whole column (see pipeline.py),
+        # from the epoch milliseconds Snowflake adds after the targets with SQL times
+        wall = epoch_ms_times(numeric(series[5])) if len(series.columns) == 6 else wall_times(times)
+
+        if columnar:
+            records = dict(zip(MTPM_SERIES_COLUMNS, (epochs(wall), rounded(values), lfy_at, pb_at, bdgt_at)))
+            return [records, *self.series_min_max(values)]
+
+        columns = zip(decimals(values), times, labels(wall, missing=''), epochs(wall), lfy_at, pb_at, bdgt_at)
+
+        for value, time, formatted_date, epoch_local, lfy, pb, bdgt in columns:
             # Send empty values in case of nulls for frontend use
             records.append({
                 'value': value,
                 'date': time,
                 'date_formatted': formatted_date,
-                'epoch_local': helpers.get_epoch(time),
+                'epoch_local': epoch_local,
                 'target_value_lfy': lfy,    
                 'target_value_pb': pb,    
                 'target_value_budget': bdgt
             })
 
-        return [records, min, max]
+        return [records, *self.series_min_max(values)]
 
     def get_snowflake_mtpm_time_series(self, filtered_mtpms):
 
@@ -0,0 +1,133 @@
+import calendar
+from decimal import Decimal
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from ..timestamps import datetimes, epochs, utc_to_local_many, wall_times
+
+# the '%d %b, %H:%M' labels of helpers.format_datetime, built from whole columns
+MONTH_ABBR = list(calendar.month_abbr)
+
+
+def labels(times, missing=None):
+    """helpers.format_datetime of each time, ``missing`` for NaT."""
+    times = pd.DatetimeIndex(times)
+    present = ~np.asarray(times.isna())
+    parts = zip(present.tolist(), times.day.fillna(0).astype(int).tolist(), times.month.fillna(0).astype(int).tolist(),
+                times.hour.fillna(0).astype(int).tolist(), times.minute.fillna(0).astype(int).tolist())
+    return [f'{day:02d} {MONTH_ABBR[month]}, {hour:02d}:{minute:02d}' if is_present else missing
+            for is_present, day, month, hour, minute in parts]
+
+
+def decimals(values, places=4):
+    """
+    Float column as Decimals rounded to ``places`` (None for NaN). Formatting rounds the exact
+    binary value half to even, like SnowflakeMethods.convert_to_decimal does.
+    """
+    pattern = f'{{:.{places}f}}'
+    return [None if value != value else Decimal(pattern.format(value)) for value in values.tolist()]
+
+
+def rounded(values, places=4):
+    """decimals as floats, which is how MdpJSONEncoder writes them."""
+    pattern = f'{{:.{places}f}}'
+    return [None if value != value else float(pattern.format(value)) for value in values.tolist()]
+
+
+def series_points(times, values, timezone):
+    """
+    The {time, value, formatted_date, time_epoch} points of SnowflakeMethods.build_series_point
+    for whole columns: UTC ``times`` and float ``values`` (NaN for NULL).
+    """
+    local = utc_to_local_many(wall_times(times), timezone)
+    return [{'time': time, 'value': value, 'formatted_date': formatted_date, 'time_epoch': time_epoch}
+            for time, value, formatted_date, time_epoch
+            in zip(datetimes(local, timezone), decimals(values), labels(local), epochs(local))]
+
+
+def epoch_ms_columns(time_column, local=True):
+    """
+    Columns a series SELECT adds when SNOWFLAKE_SERIES_SQL_TIMES is on: the epoch milliseconds
+    of ``time_column`` (UTC wall clock times) and, with ``local``, those of its wall clock time
+    in the bound :timezone. series_points_from_epochs builds the points from them.
+    """
+    columns = f""",
+                DATE_PART(epoch_millisecond, {time_column}) as time_epoch_ms"""
+    if local:
+        columns += f""",
+                DATE_PART(epoch_millisecond, CONVERT_TIMEZONE('UTC', :timezone, {time_column})) as local_epoch_ms"""
+    return columns
+
+
+def epoch_ms_times(epoch_ms):
+    """Epoch milliseconds (float, NaN for NULL) as datetime64[ms] wall clock times, NaT for NaN."""
+    missing = np.isnan(epoch_ms)
+    whole = np.where(missing, 0, epoch_ms).astype(np.int64)
+    whole[missing] = np.iinfo(np.int64).min
+    return whole.view('datetime64[ms]')
+
+
+@lru_cache(maxsize=None)
+def _utc_offset(minutes):
+    if minutes == 0:
+        return 'Z'
+    sign = '-' if minutes < 0 else '+'
+    return f'{sign}{abs(minutes) // 60:02d}:{abs(minutes) % 60:02d}'
+
+
+def iso_times(local_ms, utc_ms=None):
+    """
+    The text DjangoJSONEncoder writes for the datetimes at ``local_ms`` epoch milliseconds:
+    ISO 8601 with milliseconds when there are any, followed by the UTC offset (local_ms -
+    utc_ms, 'Z' for none) unless utc_ms is None.
+    """
+    local_ms = local_ms.astype(np.int64)
+    seconds = np.datetime_as_string((local_ms // 1000).astype('datetime64[s]'), unit='s').tolist()
+    millis = (local_ms % 1000).tolist()
+    if utc_ms is None:
+        offsets = [''] * len(local_ms)
+    else:
+        offsets = [_utc_offset(minutes) for minutes in ((local_ms - utc_ms.astype(np.int64)) // 60000).tolist()]
+    return [f'{second}.{milli:03d}{offset}' if milli else f'{second}{offset}'
+            for second, milli, offset in zip(seconds, millis, offsets)]
+
+
+def series_points_from_epochs(times, values, utc_ms, local_ms, timezone):
+    """
+    series_points from the epoch_ms_columns of a series instead of its times, so no datetime is
+    made per point: 'time' is the text the JSON encoder writes for the local time. Rows added
+    in Python (the gap marker of normalize_time_series) have no epochs yet and get them here.
+    """
+    utc_ms, local_ms = _filled_epoch_ms(times, utc_ms, local_ms, timezone)
+    local = epoch_ms_times(local_ms)
+    time_epochs = np.trunc(local_ms / 1000).astype(np.int64).tolist()
+    return [{'time': time, 'value': value, 'formatted_date': formatted_date, 'time_epoch': time_epoch}
+            for time, value, formatted_date, time_epoch
+            in zip(iso_times(local_ms, utc_ms), decimals(values), labels(local), time_epochs)]
+
+
+def _filled_epoch_ms(times, utc_ms, local_ms, timezone):
+    missing = np.isnan(utc_ms)
+    if missing.any():
+        wall = wall_times(times[missing])
+        utc_ms, local_ms = utc_ms.copy(), local_ms.copy()
+        utc_ms[missing] = wall.astype('datetime64[ms]').astype(np.int64)
+        local_ms[missing] = utc_to_local_many(wall, timezone).tz_localize(None).to_numpy().astype(
+            'datetime64[ms]').astype(np.int64)
+    return utc_ms, local_ms
+
+
+def series_columns(times, values, timezone, epoch_ms=None):
+    """
+    The columnar form of series_points (format=columnar): the 'time_epoch' and 'value' of the
+    points as parallel 'epoch' and 'value' lists, from the times or from the (UTC, local)
+    ``epoch_ms`` columns. Labels and ISO times are left to the client.
+    """
+    if epoch_ms is None:
+        time_epochs = epochs(utc_to_local_many(wall_times(times), timezone))
+    else:
+        _, local_ms = _filled_epoch_ms(times, *epoch_ms, timezone)
+        time_epochs = np.trunc(local_ms / 1000).astype(np.int64).tolist()
+    return {'epoch': time_epochs, 'value': rounded(values)}
@@ -6,29 +6,57 @@ from .. import helpers
 import logging
 from decimal import Decimal, DecimalException
 from .methods import SnowflakeMethods
+from .statements import Statement
+from .cache import cached_query
 
 log = logging.getLogger(__name__)
 
+REGION_DIM = Statement('plant.region.dim', """
+                SELECT 
+                    region_id, 
+                    region_name 
+                FROM 
+                    {schema}.DIM_REGION
+                WHERE (:region_id IS NULL OR region_id = :region_id)
+                    """)
+
+PLANT_DIM = Statement('plant.plant.dim', """
+                SELECT 
+                    p.plant_id, 
+                    r.region_id, 
+                    p.plant_name, 
+                    COALESCE(r.region_name, p.region_name) region_name 
+                FROM 
+                    {schema}.DIM_PLANT p 
+                    LEFT JOIN 
+                        {schema}.DIM_REGION r 
+                    ON p.region_name = r.region_name
+                WHERE (:region_id IS NULL OR r.region_id = :region_id)
+                AND (:plant_id IS NULL OR p.plant_id = :plant_id)
+                    """)
+
+PLANT_TECHNOLOGY_DIM = Statement('plant.technology.dim', """
+                SELECT 
+                    plant_technology_id, 
+                    plant_id, 
+                    technology_name, 
+                    plant_name, 
+                    plant_technology_path
+                FROM 
+                    {schema}.DIM_PLANT_TECHNOLOGY
+                WHERE (:plant_id IS NULL OR plant_id = :plant_id)
+                AND (:plant_technology_id IS NULL OR plant_technology_id = :plant_technology_id)
+                    """)
+
 
 class PlantData(SnowflakeMethods):
 
+    @cached_query('plant.region.dim')
     def get_snowflake_region_dim_data(self, region_id=''):
 
         records = []
 
-        if region_id:
-            region_id = f"WHERE region_id = '{region_id}'"
-
-        results = self.wrapper.validate_and_execute(f"""
-                SELECT 
-                    region_id, 
-                    region_name 
-                FROM 
-                    {os.getenv("SNOWFLAKE_DATABASE")}
-                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                    .DIM_REGION
-                {region_id}
-                    """)
+        results = self.fetch(REGION_DIM.bind(region_id=region_id or None))
 
         for res in results:
             records.append({
@@ -38,33 +66,12 @@ class PlantData(SnowflakeMethods):
 
         return records
 
+    @cached_query('plant.plant.dim')
     def get_snowflake_plant_dim_data(self, region_id, plant_id=''):
 
         records = []
 
-        if region_id and plant_id:
-            plant_id = f"AND p.plant_id='{plant_id}'"
-        elif plant_id:
-            plant_id = f"WHERE p.plant_id='{plant_id}'"
-
-        results = self.wrapper.validate_and_execute(f"""
-                SELECT 
-                    p.plant_id, 
-                    r.region_id, 
-                    p.plant_name, 
-                    COALESCE(r.region_name, p.region_name) region_name 
-                FROM 
-                    {os.getenv("SNOWFLAKE_DATABASE")}
-                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                    .DIM_PLANT p 
-                    LEFT JOIN 
-                        {os.getenv("SNOWFLAKE_DATABASE")}
-                        .{os.getenv("SNOWFLAKE_SCHEMA")}
-                        .DIM_REGION r 
-                    ON p.region_name = r.region_name
-                    {f"WHERE r.region_id='{region_id}'" if region_id else ''}
-                    {plant_id if plant_id else ''}
-                    """)
+        results = self.fetch(PLANT_DIM.bind(region_id=region_id or None, plant_id=plant_id or None))
 
         for res in results:
             records.append({
@@ -76,29 +83,13 @@ class PlantData(SnowflakeMethods):
 
         return records
 
+    @cached_query('plant.technology.dim')
     def get_snowflake_plant_technology_dim_data(self, plant_id, plant_technology_id=''):
 
         records = []
 
-        if plant_id and plant_technology_id:
-            plant_technology_id = f"AND plant_technology_id='{plant_technology_id}'"
-        elif plant_technology_id:
-            plant_technology_id = f"WHERE plant_technology_id='{plant_technology_id}'"
-
-        results = self.wrapper.validate_and_execute(f"""
-                SELECT 
-                    plant_technology_id, 
-                    plant_id, 
-                    technology_name, 
-                    plant_name, 
-                    plant_technology_path
-                FROM 
-                    {os.getenv("SNOWFLAKE_DATABASE")}
-                    .{os.getenv("SNOWFLAKE_SCHEMA")}
-                    .DIM_PLANT_TECHNOLOGY
-                    {f"WHERE plant_id='{plant_id}'" if plant_id else ''}
-                    {plant_technology_id if plant_technology_id else ''}
-                    """)
+        results = self.fetch(PLANT_TECHNOLOGY_DIM.bind(plant_id=plant_id or None,
+                                                       plant_technology_id=plant_technology_id or None))
 
         for res in results:
             records.append({
@@ -109,4 +100,4 @@ class PlantData(SnowflakeMethods):
                 'plant_technology_path': res[4]
             })
 
-        return records
\ No newline at end of file
+        return records
@@ -0,0 +1,151 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+from .. import helpers
+from .cache import cache_key
+from .columns import SeriesColumns
+
+log = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def naive(value):
+    # Snowflake casts bound '... +02:00' strings to TIMESTAMP_NTZ by dropping the offset, so
+    # bucket bounds do the same
+    value = helpers.get_datetime_obj(value)
+    return value.replace(tzinfo=None)
+
+
+class SegmentCache:
+    """
+    Time series results cached in fixed, epoch aligned time buckets of
+    SNOWFLAKE_SERIES_BUCKET seconds.
+
+    A bucket is sealed once it ended more than SNOWFLAKE_SERIES_SEAL_AFTER seconds ago (late
+    rows have arrived by then). Sealed buckets are cached for SNOWFLAKE_SERIES_SEGMENT_TTL
+    seconds (None keeps them until evicted). Only the buckets that are missing or still open
+    are read from Snowflake, one query per run of adjacent buckets. A dashboard that refreshes
+    a sliding window therefore queries only its newest minutes. Edge buckets are read
+    in full so they can be cached, and the assembled series is trimmed to the requested range.
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'open': 0, 'queries': 0, 'bypassed': 0, 'errors': 0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    @property
+    def size(self):
+        return timedelta(seconds=settings.SNOWFLAKE_SERIES_BUCKET)
+
+    def buckets(self, start, end):
+        size = self.size
+        bucket = EPOCH + (start - EPOCH) // size * size
+        while bucket <= end:
+            yield bucket
+            bucket += size
+
+    def is_sealed(self, bucket, now=None):
+        now = datetime.utcnow() if now is None else now
+        return bucket + self.size <= now - timedelta(seconds=settings.SNOWFLAKE_SERIES_SEAL_AFTER)
+
+    def key(self, statement, values, bucket):
+        # the statement text tells metric and imperial variants of one Statement apart
+        return cache_key(f'segment:{statement.name}', {**values, 'sql': statement.sql,
+                                                        'bucket': bucket.isoformat(), 'size': str(self.size)})
+
+    def fetch(self, statement, date_time_start, date_time_end, values, fetch_series, time_index=0):
+        """
+        Return the SeriesColumns of ``statement`` bound to ``values`` between date_time_start
+        and date_time_end (both included), like ``fetch_series(statement.bind(...))`` would.
+        """
+        start, end = naive(date_time_start), naive(date_time_end)
+        buckets = list(self.buckets(start, end))
+        if not buckets or len(buckets) > settings.SNOWFLAKE_SERIES_MAX_BUCKETS:
+            self._count('bypassed')
+            return fetch_series(statement.bind(date_time_start=date_time_start, date_time_end=date_time_end, **values))
+
+        now = datetime.utcnow()
+        sealed = [bucket for bucket in buckets if self.is_sealed(bucket, now)]
+        keys = {bucket: self.key(statement, values, bucket) for bucket in sealed}
+        cache = caches[self.alias]
+        try:
+            cached = cache.get_many(list(keys.values()))
+        except Exception as err:
+            log.warning(f'series segment cache is unavailable: {err}')
+            self._count('errors')
+            cached = {}
+
+        segments = {}
+        run = []
+        for bucket in buckets:
+            if bucket in keys and keys[bucket] in cached:
+                segments[bucket] = cached[keys[bucket]]
+                self._count('hits')
+                if run:
+                    segments.update(self._fetch_run(statement, values, run, start, end, keys, fetch_series, time_index))
+                    run = []
+            else:
+                run.append(bucket)
+        if run:
+            segments.update(self._fetch_run(statement, values, run, start, end, keys, fetch_series, time_index))
+
+        series = SeriesColumns.concat(segments[bucket] for bucket in buckets if bucket in segments)
+        if len(series) == 0:
+            return series
+        times = self._times(series[time_index])
+        return series.take((times >= np.datetime64(start)) & (times <= np.datetime64(end)))
+
+    def _fetch_run(self, statement, values, run, start, end, keys, fetch_series, time_index):
+        sealed = [bucket for bucket in run if bucket in keys]
+        self._count('misses', len(sealed))
+        self._count('open', len(run) - len(sealed))
+        self._count('queries')
+
+        # sealed edge buckets are read completely, the open one up to the requested end
+        run_start = run[0] if run[0] in keys else max(start, run[0])
+        run_end = run[-1] + self.size if run[-1] in keys else end
+        series = fetch_series(statement.bind(date_time_start=run_start, date_time_end=run_end, **values))
+
+        if len(series) == 0:
+            # nothing to tell an empty range from an unreachable Snowflake, so nothing is cached
+            return {}
+        bucket_of = self._bucket_index(self._times(series[time_index]))
+        segments = {bucket: series.take(bucket_of == self._bucket_number(bucket)) for bucket in run}
+
+        stored = {keys[bucket]: segments[bucket] for bucket in sealed}
+        if stored:
+            try:
+                caches[self.alias].set_many(stored, settings.SNOWFLAKE_SERIES_SEGMENT_TTL)
+            except Exception as err:
+                log.warning(f'could not cache series segments of {statement.name}: {err}')
+                self._count('errors')
+        return segments
+
+    @staticmethod
+    def _times(column):
+        return np.array([value.replace(tzinfo=None) if isinstance(value, datetime) else naive(value)
+                         for value in column], dtype='datetime64[us]')
+
+    def _bucket_index(self, times):
+        return (times - np.datetime64(EPOCH)) // np.timedelta64(self.size)
+
+    def _bucket_number(self, bucket):
+        return (bucket - EPOCH) // self.size
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+series_segments = SegmentCache()
@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from rest_framework.serializers import Serializer, CharField, ListField
+from rest_framework.serializers import Serializer, CharField, IntegerField, ListField
 
 @dataclass
 class SnowFlakeMTPMRequest(object):
@@ -20,6 +20,15 @@ class SnowFlakeMTPMRequestSerializer(Serializer):
         self.datetimestart = self.context['datetimestart']
         self.datetimeend = self.context['datetimeend']
 
+class SnowFlakeLeadingIndicatorBatchRequestSerializer(Serializer):
+    leading_indicator_ids = ListField()
+    datetimestart = CharField()
+    datetimeend = CharField()
+    preferred_uom = CharField()
+    timezone = CharField()
+    max_points = IntegerField(required=False)
+    downsampling = CharField(required=False)
+
 @dataclass
 class SnowFlakeBaseResponse:
     results: ListField 
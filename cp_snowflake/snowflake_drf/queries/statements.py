@@ -0,0 +1,86 @@
+import json
+import os
+import re
+from datetime import date, datetime
+from typing import NamedTuple, Tuple
+
+SNOWFLAKE_DB_AND_SCHEMA = f'{os.getenv("SNOWFLAKE_DATABASE")}.{os.getenv("SNOWFLAKE_SCHEMA")}'
+
+PREFERRED_UOMS = ('metric', 'imperial')
+
+# :name placeholders; '::' casts and 'HH24:MI' style literals are left alone
+_PLACEHOLDER = re.compile(r'(?<![:\w]):([a-z_][a-z0-9_]*)\b')
+
+
+class BoundStatement(NamedTuple):
+    name: str
+    sql: str
+    params: Tuple
+
+
+class Statement:
+    """
+    A SQL statement compiled once at import time.
+
+    The text is written with ``{schema}`` for the fully qualified database and schema, other
+    ``{fragment}`` slots for variant specific SQL and ``:name`` placeholders for values. Compilation qualifies the schema and rewrites the
+    placeholders to Snowflake's numeric bind style (``:1``, ``:2`` ...), so every call sends
+    exactly the same statement text and only the bound values change. A placeholder may be
+    used more than once and is bound once.
+    """
+
+    def __init__(self, name, sql, **fragments):
+        self.name = name
+        self.param_names = []
+
+        def number(match):
+            param = match.group(1)
+            if param not in self.param_names:
+                self.param_names.append(param)
+            return f':{self.param_names.index(param) + 1}'
+
+        # fragments are expanded first so they can use {schema}, {uom} and each other
+        context = {'schema': SNOWFLAKE_DB_AND_SCHEMA, **fragments}
+        for _ in range(len(context)):
+            context = {key: value.format(**context) for key, value in context.items()}
+        self.sql = _PLACEHOLDER.sub(number, sql.format(**context))
+
+    def bind(self, **values):
+        missing = set(self.param_names) - set(values)
+        if missing:
+            raise ValueError(f'{self.name}: missing values for {", ".join(sorted(missing))}')
+        return BoundStatement(self.name, self.sql, tuple(bind_value(values[param]) for param in self.param_names))
+
+    def __repr__(self):
+        return f'<Statement {self.name}>'
+
+
+def bind_value(value):
+    # Timestamps are bound as text so Snowflake casts them exactly like the literals it
+    # used to receive, and lists/tuples/sets become one JSON array (see in_list).
+    if isinstance(value, (datetime, date)):
+        return str(value)
+    if isinstance(value, (list, tuple, set)):
+        return json.dumps([str(elem) for elem in value])
+    return value
+
+
+def in_list(placeholder):
+    """
+    SQL fragment for ``column IN (...)`` against a bound list.
+
+    Server side binding has no IN-list support for queries, so the list is bound once as a
+    JSON array and expanded with FLATTEN. The statement text stays the same for any list length.
+    """
+    return f'(SELECT value::VARCHAR FROM TABLE(FLATTEN(input => PARSE_JSON({placeholder}))))'
+
+
+def uom_statements(name, sql, **fragments):
+    """Compile one Statement per preferred unit of measure (``{uom}`` in the text)."""
+    return {uom: Statement(name, sql, uom=uom, **fragments) for uom in PREFERRED_UOMS}
+
+
+def resolve_uom(preferred_uom):
+    # Column names can't be bound, so unknown values fall back to metric instead of
+    # reaching the SQL text.
+    return preferred_uom if preferred_uom in PREFERRED_UOMS else 'metric'
@@ -0,0 +1,121 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import List, NamedTuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .grouping import group_by
+from .segments import naive
+from .statements import PREFERRED_UOMS, resolve_uom
+
+log = logging.getLogger(__name__)
+
+
+class SummarySnapshot(NamedTuple):
+    dim_rows: List[tuple]
+    summary_rows: List[tuple]
+    computed_at: datetime  # UTC
+
+    @property
+    def age(self):
+        return (datetime.utcnow() - self.computed_at).total_seconds()
+
+
+class SummarySnapshots:
+    """
+    Leading indicator summaries of every MTPM, precomputed by the
+    refresh_leading_indicator_summaries Celery task and kept in the Django cache (Redis).
+
+    A refresh reads the summary of the last LI_SUMMARY_SNAPSHOT_WINDOW seconds for all
+    MTPMs at once, one dim query per unit of measure and one summary query, and stores the
+    rows per MTPM and unit. A request is answered from them when its window is that live
+    window, i.e. both its ends are within LI_SUMMARY_SNAPSHOT_TOLERANCE seconds of the
+    snapshot's. Snapshots expire after the tolerance, so a stopped beat falls back to live
+    queries instead of serving old summaries.
+    """
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'outside_window': 0, 'refreshes': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    @staticmethod
+    def key(preferred_uom, mtpm_id):
+        return f'snowflake:li.summary.snapshot:{preferred_uom}:{mtpm_id}'
+
+    def refresh(self, leading_indicators, now=None):
+        """Compute and store the snapshots of all MTPMs, return the number of MTPMs."""
+        window_end = datetime.utcnow() if now is None else now
+        window_start = window_end - timedelta(seconds=settings.LI_SUMMARY_SNAPSHOT_WINDOW)
+        mtpm_ids = [row[0] for row in leading_indicators.fetch(leading_indicators.get_li_summary_mtpm_query())]
+        if not mtpm_ids:
+            return 0
+
+        # rows keep their position in the all-MTPM result, so the rows of any set of MTPMs
+        # can be put back in the order the query for just that set would return
+        summary_rows = list(enumerate(leading_indicators.fetch(
+            leading_indicators.get_li_summary_query(mtpm_ids, window_start, window_end))))
+        stored = {}
+        for preferred_uom in PREFERRED_UOMS:
+            dim_rows = list(enumerate(leading_indicators.fetch(
+                leading_indicators.get_li_summary_dim_query(mtpm_ids, preferred_uom, window_start, window_end))))
+            mtpm_of = {row[0]: row[6] for _, row in dim_rows}
+            dim_by_mtpm = group_by(dim_rows, lambda item: item[1][6])
+            summary_by_mtpm = group_by(summary_rows, lambda item: mtpm_of.get(item[1][0]))
+            for mtpm_id in mtpm_ids:
+                stored[self.key(preferred_uom, mtpm_id)] = {
+                    'window_start': window_start,
+                    'window_end': window_end,
+                    'computed_at': window_end,
+                    'dim_rows': dim_by_mtpm.get(mtpm_id, []),
+                    'summary_rows': summary_by_mtpm.get(mtpm_id, []),
+                }
+
+        caches[self.alias].set_many(stored, settings.LI_SUMMARY_SNAPSHOT_TOLERANCE)
+        self._count('refreshes')
+        return len(mtpm_ids)
+
+    def lookup(self, mtpm_list, datetimestart, datetimeend, preferred_uom):
+        """The SummarySnapshot that answers the request, or None when it has to be queried."""
+        keys = {self.key(resolve_uom(preferred_uom), mtpm_id) for mtpm_id in mtpm_list}
+        try:
+            snapshots = caches[self.alias].get_many(list(keys))
+        except Exception as err:
+            log.warning(f'leading indicator summary snapshots are unavailable: {err}')
+            self._count('errors')
+            return None
+
+        # all of them from one refresh, or their rows can't be merged in order
+        if not keys or len(snapshots) < len(keys) or \
+                len({snapshot['computed_at'] for snapshot in snapshots.values()}) > 1:
+            self._count('misses')
+            return None
+
+        snapshot = next(iter(snapshots.values()))
+        start, end = naive(datetimestart), naive(datetimeend)
+        tolerance = timedelta(seconds=settings.LI_SUMMARY_SNAPSHOT_TOLERANCE)
+        if abs(start - snapshot['window_start']) > tolerance or abs(end - snapshot['window_end']) > tolerance:
+            self._count('outside_window')
+            return None
+
+        self._count('hits')
+        return SummarySnapshot(self._merge(snapshots.values(), 'dim_rows'),
+                               self._merge(snapshots.values(), 'summary_rows'), snapshot['computed_at'])
+
+    @staticmethod
+    def _merge(snapshots, rows):
+        positioned = sorted((item for snapshot in snapshots for item in snapshot[rows]), key=lambda item: item[0])
+        return [row for _, row in positioned]
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+li_summary_snapshots = SummarySnapshots()
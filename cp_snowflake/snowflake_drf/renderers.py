@@ -0,0 +1,147 @@
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer, BrowsableAPIRenderer, JSONRenderer
+
+from .encoders import dumps
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    DRF's JSONRenderer written with encoders.dumps (orjson when it is installed). Indented
+    output, e.g. for the browsable API, is left to JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        # escaped as JSONRenderer does, so the JSON stays a JavaScript subset
+        return dumps(data, self.encoder_class).replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class ColumnarJSONRenderer(FastJSONRenderer):
+    """
+    ?format=columnar on the time series endpoints: time series written as parallel lists
+    ('epoch', 'value', ...) instead of a list of points. The views build those lists
+    themselves (see queries/pipeline.series_columns); the renderer lets DRF accept the format,
+    which it otherwise answers with a 404.
+    """
+    format = 'columnar'
+
+
+TIME_SERIES_RENDERERS = (FastJSONRenderer, BrowsableAPIRenderer, ColumnarJSONRenderer)
+
+
+def is_columnar(request):
+    return request.accepted_renderer.format == ColumnarJSONRenderer.format
+
+
+class FastJsonResponse(HttpResponse):
+    """django.http.JsonResponse written with encoders.dumps."""
+
+    def __init__(self, data, encoder=DjangoJSONEncoder, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError('In order to allow non-dict objects to be serialized set the safe parameter to False.')
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(content=dumps(data, encoder), **kwargs)
+
+
+class _Chunks(io.RawIOBase):
+    # file the export writers write to, emptied after every batch; tell() counts all bytes
+    # written, which Parquet needs for the offsets in its footer
+
+    def __init__(self):
+        super().__init__()
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ArrowExportRenderer(BaseRenderer):
+    """
+    Series exports (?format= or Accept): pyarrow.RecordBatches straight from Snowflake (see
+    SnowflakeWrapper.stream_execute_arrow) written to the response as they are read, so the
+    rows of the export are never held at once or turned into Python objects.
+    """
+    charset = None
+    render_style = 'binary'
+
+    def writer(self, sink, schema):
+        raise NotImplementedError
+
+    def stream(self, batches):
+        """The export of ``batches``, a piece after each batch."""
+        sink = _Chunks()
+        writer = schema = None
+        for batch in batches:
+            if writer is None:
+                # result chunks may store an integer column in fewer bytes than the chunks after
+                # them, so integers are written as int64 throughout
+                schema = pa.schema([field.with_type(pa.int64()) if pa.types.is_integer(field.type) else field
+                                    for field in batch.schema])
+                writer = self.writer(sink, schema)
+            if batch.schema != schema:
+                batch, = pa.Table.from_batches([batch]).cast(schema).to_batches()
+            writer.write_batch(batch)
+            yield sink.take()
+        if writer is None:
+            writer = self.writer(sink, pa.schema([]))
+        writer.close()
+        yield sink.take()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # DRF's own responses, e.g. authentication errors, as a table of one row
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return b''.join(self.stream(pa.Table.from_pylist(rows).to_batches()))
+
+
+class ArrowIPCRenderer(ArrowExportRenderer):
+    media_type = 'application/vnd.apache.arrow.stream'
+    format = 'arrow'
+    extension = 'arrows'
+
+    def writer(self, sink, schema):
+        return pa.ipc.new_stream(sink, schema)
+
+
+class ParquetRenderer(ArrowExportRenderer):
+    media_type = 'application/vnd.apache.parquet'
+    format = 'parquet'
+    extension = 'parquet'
+
+    def writer(self, sink, schema):
+        # a row group per batch, so each one can be sent once it is read
+        return pq.ParquetWriter(sink, schema)
+
+
+EXPORT_RENDERERS = (ArrowIPCRenderer, ParquetRenderer)
+
+
+def export_response(request, batches, name):
+    """A download of ``batches`` in the format the request negotiated (EXPORT_RENDERERS)."""
+    renderer = request.accepted_renderer
+    response = StreamingHttpResponse(renderer.stream(batches), content_type=renderer.media_type)
+    response['Content-Disposition'] = f'attachment; filename="{name}.{renderer.extension}"'
+    return response
@@ -1,7 +1,7 @@
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.settings import api_settings
-from django.http import JsonResponse
+from .renderers import FastJsonResponse
 
 
 class CreateModelMixin:
@@ -14,7 +14,7 @@ class CreateModelMixin:
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
-        return JsonResponse({'results': list(serializer.data)}, status=status.HTTP_201_CREATED)
+        return FastJsonResponse({'results': list(serializer.data)}, status=status.HTTP_201_CREATED)
 
     def perform_create(self, serializer):
         serializer.save()
@@ -40,7 +40,7 @@ class ListModelMixin:
             return self.get_paginated_response(serializer.data)
 
         serializer = self.get_serializer(queryset, many=True)
-        return JsonResponse({'results': list(serializer.data)}, status=status.HTTP_200_OK)
+        return FastJsonResponse({'results': list(serializer.data)}, status=status.HTTP_200_OK)
 
 
 class RetrieveModelMixin:
@@ -51,7 +51,7 @@ class RetrieveModelMixin:
     def retrieve(self, request, *args, **kwargs):
         instance = self.get_object()
         serializer = self.get_serializer(instance)
-        return JsonResponse({'results': list(serializer.data)}, status=status.HTTP_200_OK)
+        return FastJsonResponse({'results': list(serializer.data)}, status=status.HTTP_200_OK)
 
 class UpdateModelMixin:
     """
@@ -70,7 +70,7 @@ class UpdateModelMixin:
             # forcibly invalidate the prefetch cache on the instance.
             instance._prefetched_objects_cache = {}
 
-        return JsonResponse({'results': list(serializer.data)}, status=status.HTTP_200_OK)
+        return FastJsonResponse({'results': list(serializer.data)}, status=status.HTTP_200_OK)
 
     def perform_update(self, serializer):
         serializer.save()
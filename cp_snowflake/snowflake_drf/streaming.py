@@ -0,0 +1,76 @@
+from django.http import StreamingHttpResponse
+
+from .encoders import MdpJSONEncoder, dumps
+
+
+class StreamedSeries:
+    """
+    Time series points produced lazily, e.g. straight from SnowflakeWrapper.stream_execute.
+
+    The points can only be iterated once. ts_min and ts_max are tracked along the way, so
+    they are known once the series has been written (see stream_results).
+    """
+
+    def __init__(self, points):
+        self.points = points
+        self.ts_min = None
+        self.ts_max = None
+
+    def __iter__(self):
+        for point in self.points:
+            value = point['value']
+            if value is not None:
+                if self.ts_min is None or value < self.ts_min:
+                    self.ts_min = value
+                if self.ts_max is None or value > self.ts_max:
+                    self.ts_max = value
+            yield point
+
+    def summary(self):
+        return {'ts_min': self.ts_min, 'ts_max': self.ts_max}
+
+
+def stream_results(records, encoder=MdpJSONEncoder, chunk_size=1000):
+    """
+    Write ``{"results": [...records]}`` piece by piece. StreamedSeries values are written
+    ``chunk_size`` points at a time and followed by their summary fields, so only one chunk
+    of a series is held in memory.
+    """
+    def encode(value):
+        return dumps(value, encoder).decode()
+
+    yield '{"results": ['
+    for index, record in enumerate(records):
+        if index:
+            yield ', '
+        yield from _stream_record(record, encode, chunk_size)
+    yield ']}'
+
+
+def _stream_record(record, encode, chunk_size):
+    series = {key: value for key, value in record.items() if isinstance(value, StreamedSeries)}
+    fields = [f'{encode(key)}: {encode(value)}' for key, value in record.items() if key not in series]
+
+    yield '{' + ', '.join(fields)
+    separator = ', ' if fields else ''
+    for key, points in series.items():
+        yield f'{separator}{encode(key)}: ['
+        chunk_separator = ''
+        chunk = []
+        for point in points:
+            chunk.append(encode(point))
+            if len(chunk) == chunk_size:
+                yield chunk_separator + ', '.join(chunk)
+                chunk_separator = ', '
+                chunk = []
+        if chunk:
+            yield chunk_separator + ', '.join(chunk)
+        yield ']'
+        for summary_key, value in points.summary().items():
+            yield f', {encode(summary_key)}: {encode(value)}'
+        separator = ', '
+    yield '}'
+
+
+def streaming_json_response(records):
+    return StreamingHttpResponse(stream_results(records), content_type='application/json')
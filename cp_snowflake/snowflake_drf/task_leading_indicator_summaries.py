@@ -0,0 +1,13 @@
+import logging
+
+from .queries.leading_indicators import LeadingIndicators
+from .queries.summaries import li_summary_snapshots
+
+log = logging.getLogger(__name__)
+
+leading_indicators = LeadingIndicators()
+
+
+def do_update():
+    count = li_summary_snapshots.refresh(leading_indicators)
+    return f"Leading indicator summaries refreshed for {count} mtpms"
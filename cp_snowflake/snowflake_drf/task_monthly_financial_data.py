@@ -11,7 +11,6 @@ from .models import MonthlyFinancialFormMetricValue
 from dateutil.relativedelta import *
 from datetime import *
 from . import helpers
-from dateutil import tz
 
 log = logging.getLogger(__name__)
 
@@ -52,8 +51,5 @@ def get_date_vals():
     return [last_month, current_month]
 
 def get_utc_date(local_date, timezone):
-    timezone = tz.gettz(timezone)
-    current_local = datetime(local_date.year, local_date.month, local_date.day, local_date.hour).replace(tzinfo=timezone)
-    utc_zone = tz.gettz('UTC')
-    current_utc = current_local.astimezone(utc_zone)
-    return current_utc
+    current_local = datetime(local_date.year, local_date.month, local_date.day, local_date.hour)
+    return helpers.convert_local_to_utc(current_local, timezone)
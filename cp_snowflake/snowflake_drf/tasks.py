@@ -2,7 +2,7 @@ from __future__ import absolute_import, unicode_literals
 
 from celery import shared_task
 import logging
-from snowflake_drf import task_data_import, task_monthly_financial_data
+from snowflake_drf import task_data_import, task_monthly_financial_data, task_leading_indicator_summaries
 
 log = logging.getLogger(__name__)
 
@@ -19,3 +19,10 @@ def refresh_financial_data(self):
     log.info(msg)
     msg = task_monthly_financial_data.do_update()
     return msg
+
+@shared_task(bind=True)
+def refresh_leading_indicator_summaries(self):
+    msg = "Refreshing leading indicator summaries"
+    log.info(msg)
+    msg = task_leading_indicator_summaries.do_update()
+    return msg
@@ -5,6 +5,9 @@ import os
 import jwt
 from django.test import TestCase
 from rest_framework.exceptions import ValidationError, AuthenticationFailed
+from unittest.mock import patch
+
+from .AzureADToken import AzureADToken, ClientCredentialTokenProvider
 
 from .test_utils import set_sso_user_token, set_auth_header, set_sso_client_credential_token
 from .token_utils import generate_client_credentials_token, generate_non_sso_token, generate_key, \
@@ -176,4 +179,48 @@ class AuthLayerTestCase(TestCase):
         response = self.client.get("/forms/regions/", format='json', **authorization)
         result = json.loads(response.content.decode())["detail"]
         assert response.status_code == 403
-        assert "Invalid Token" in result
\ No newline at end of file
+        assert "Invalid Token" in result
+
+
+@patch('snowflake_drf.AzureADToken.msal.ConfidentialClientApplication')
+class ClientCredentialTokenProviderTestCase(TestCase):
+
+    def setUp(self):
+        ClientCredentialTokenProvider._forget_providers()
+
+    def tearDown(self):
+        ClientCredentialTokenProvider._forget_providers()
+
+    @staticmethod
+    def get_token(**kwargs):
+        return AzureADToken(tenant_id='tenant', client_id='client', client_secret='secret',
+                            resource_id='resource').client_credential_auth(**kwargs)
+
+    def test_token_is_reused_until_it_expires(self, application):
+        application.return_value.acquire_token_for_client.return_value = {'access_token': 'first', 'expires_in': 3599}
+        self.assertEqual('first', self.get_token())
+        self.assertEqual('first', self.get_token())
+        application.assert_called_once()
+        application.return_value.acquire_token_for_client.assert_called_once_with(['resource/.default'])
+
+    def test_token_is_refreshed_ahead_of_expiry(self, application):
+        acquire = application.return_value.acquire_token_for_client
+        acquire.side_effect = [{'access_token': 'first', 'expires_in': 60}, {'access_token': 'second', 'expires_in': 3599}]
+        application.return_value.token_cache.find.return_value = ['cached']
+        self.assertEqual('first', self.get_token())
+        self.assertEqual('second', self.get_token())
+        application.return_value.token_cache.remove_at.assert_called_once_with('cached')
+        application.assert_called_once()
+
+    def test_force_refresh_requests_a_new_token(self, application):
+        acquire = application.return_value.acquire_token_for_client
+        acquire.side_effect = [{'access_token': 'first', 'expires_in': 3599}, {'access_token': 'second', 'expires_in': 3599}]
+        self.assertEqual('first', self.get_token())
+        self.assertEqual('second', self.get_token(force_refresh=True))
+        self.assertEqual('second', self.get_token())
+        self.assertEqual(2, acquire.call_count)
+
+    def test_error_response_raises_authentication_failed(self, application):
+        application.return_value.acquire_token_for_client.return_value = {'error': 'invalid_client'}
+        with self.assertRaises(AuthenticationFailed):
+            self.get_token()
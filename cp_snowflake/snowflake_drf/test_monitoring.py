@@ -87,4 +87,32 @@ class MonitoringTests(TestCase):
         response = self.client.get("/monitoring/snowflake/connection/", payload, format='json', **authorization)
         results = response.data
         assert results["results"] == payload["results"]
-        assert response.status_code == 400
\ No newline at end of file
+        assert response.status_code == 400
+
+    def test_snowflake_connection_stats(self):
+
+        views.wrapper = self.wrapper
+
+        self.wrapper.pool_stats.return_value = {'max_size': 4, 'idle': 1, 'in_use': 0}
+        self.wrapper.retry_stats.return_value = {'calls': 10, 'retries': 1}
+
+        authorization = set_auth_header(self.client_credentials_access_token)
+
+        response = self.client.get("/monitoring/snowflake/stats/", format='json', **authorization)
+        results = response.data
+        assert results["results"]["pool"]["max_size"] == 4
+        assert results["results"]["retries"]["retries"] == 1
+        assert response.status_code == 200
+
+    def test_snowflake_query_stats(self):
+
+        views.wrapper = self.wrapper
+
+        self.wrapper.query_stats.return_value = {'mtpm.ts': {'count': 3, 'p50_ms': 120.0, 'p95_ms': 480.5, 'p99_ms': 480.5}}
+
+        authorization = set_auth_header(self.client_credentials_access_token)
+
+        response = self.client.get("/monitoring/snowflake/queries/", format='json', **authorization)
+        results = response.data
+        assert results["results"]["mtpm.ts"]["p95_ms"] == 480.5
+        assert response.status_code == 200
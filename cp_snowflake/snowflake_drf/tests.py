@@ -1,5 +1,5 @@
 import concurrent.futures
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from dateutil.relativedelta import relativedelta
 from decimal import Decimal
 
@@ -10,10 +10,28 @@ import os
 
 from . import helpers
 from .queries.methods import date_range, SnowflakeMethods
-from .queries.equipment_tags import EquipmentTags
-from .queries.leading_indicators import LeadingIndicators
+from .queries.equipment_tags import EquipmentTags, EQUIPMENT_TAG_TS
+from .queries.leading_indicators import LeadingIndicators, LEADING_INDICATOR_BETA_TS
 from .queries.mtpms import Mtpms
 from .queries.plant_data import PlantData
+from .queries.statements import Statement, in_list, resolve_uom
+from .queries.columns import SeriesColumns
+from .queries import cache as cache_module, coalesce as coalesce_module
+from .queries.cache import QueryCache, cache_key, query_cache
+from .queries.segments import SegmentCache
+from .queries.coalesce import SingleFlight, flight_key
+from .queries.downsampling import downsample, lttb_indices
+from .queries.asof import AsOfTargets
+from .queries.grouping import group_by, group_positions
+from .queries.pipeline import labels
+from .timestamps import epochs, wall_times
+import threading
+import time
+from .streaming import StreamedSeries, stream_results
+from .middleware import QueryDeadlineMiddleware
+from snowflake_wrapper.deadline import DeadlineExceeded, current_deadline, query_deadline
+import numpy as np
+import pyarrow as pa
 from .token_utils import generate_non_sso_token, generate_client_credentials_token
 from .test_utils import set_auth_header, set_sso_client_credential_token, set_sso_user_token
 
@@ -30,6 +48,9 @@ from .customPermissions import set_group_memberships
 
 log = logging.getLogger(__name__)
 
+# setUp replaces the executor with one that runs inline
+THREAD_POOL_EXECUTOR = concurrent.futures.ThreadPoolExecutor
+
 class SnowflakeTestCase(TestCase):
     token = None
     client = APIClient()
@@ -61,6 +82,14 @@ class SnowflakeTestCase(TestCase):
         self.get_snowflake_mtpm_time_series = MagicMock()
         self.handle_nulls = MagicMock()
         self.mock_ThreadPoolExecutor.return_value = self.executor
+        self.executor.__enter__.return_value = self.executor
+        self.executor.submit.side_effect = self.run_inline
+
+    @staticmethod
+    def run_inline(fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        future.set_result(fn(*args, **kwargs))
+        return future
 
     @classmethod
     def setUpTestData(cls):
@@ -1154,6 +1183,136 @@ class SnowflakeTestCase(TestCase):
             self.assertIn('mtpm_display_name', result)
             self.assertIn('target_type', result)
 
+    @patch.object(Mtpms, 'get_mtpm_target_results', return_value=[])
+    @patch.object(Mtpms, 'get_mtpm_ts_results', return_value=[])
+    @patch.object(Mtpms, 'get_mtpm_dim_results', return_value=[])
+    def test_get_snowflake_mtpm_target_data_runs_queries_concurrently(self, dim_results, ts_results, target_results):
+        methods = Mtpms()
+        methods.get_snowflake_mtpm_target_data_generic('321-abc-321-abc-4321', '2022-12-16 12:00:00', '2023-01-16',
+                                                       'metric', ['123-abc-123-abc-1234'])
+        self.mock_ThreadPoolExecutor.assert_called_once_with(max_workers=3)
+        self.assertEquals(self.executor.submit.call_count, 3)
+
+        self.executor.submit.reset_mock()
+        methods.get_snowflake_mtpm_target_data_generic('321-abc-321-abc-4321', '2022-12-16 12:00:00', '2023-01-16',
+                                                       'metric', ['123-abc-123-abc-1234'], None, True)
+        self.assertEquals(self.executor.submit.call_count, 2)
+        self.assertEquals(ts_results.call_count, 1)
+
+    def test_cache_key_is_canonical(self):
+        self.assertEqual(cache_key('plant.plant.dim', {'region_id': '1', 'plant_id': ''}),
+                         cache_key('plant.plant.dim', {'plant_id': None, 'region_id': '1'}))
+        self.assertNotEqual(cache_key('plant.plant.dim', {'region_id': '1', 'plant_id': None}),
+                            cache_key('plant.plant.dim', {'region_id': '2', 'plant_id': None}))
+        self.assertNotEqual(cache_key('li.dim', {'mtpm_id': '1'}), cache_key('eq.dim', {'mtpm_id': '1'}))
+
+    @patch.object(query_cache, '_counters', {})
+    def test_dim_query_is_served_from_cache(self):
+        methods = PlantData()
+        methods.wrapper = self.wrapper
+        self.wrapper.validate_and_execute.return_value = [('123-abc-123-abc-1234', 'NA')]
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=locmem):
+            first = methods.get_snowflake_region_dim_data('123-abc-123-abc-1234')
+            second = methods.get_snowflake_region_dim_data(region_id='123-abc-123-abc-1234')
+        self.assertEqual(first, second)
+        self.assertEqual(1, self.wrapper.validate_and_execute.call_count)
+        self.assertEqual({'hits': 1, 'misses': 1, 'errors': 0}, query_cache.stats()['plant.region.dim'])
+
+    def test_empty_dim_result_is_not_cached(self):
+        cache = QueryCache()
+        fetch = MagicMock(return_value=[])
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=locmem):
+            cache.get_or_fetch('mtpm.dim', {'plant_technology_id': '1'}, fetch)
+            cache.get_or_fetch('mtpm.dim', {'plant_technology_id': '1'}, fetch)
+        self.assertEqual(2, fetch.call_count)
+
+    def test_unavailable_cache_falls_back_to_snowflake(self):
+        cache = QueryCache()
+        with patch.object(cache_module, 'caches') as caches:
+            caches.__getitem__.return_value.get.side_effect = ConnectionError('redis is down')
+            self.assertEqual([1], cache.get_or_fetch('eq.dim', {}, lambda: [1]))
+        self.assertEqual(1, cache.stats()['eq.dim']['errors'])
+
+    def test_identical_queries_in_flight_run_once(self):
+        flights = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        fetch = MagicMock(side_effect=lambda: started.set() or release.wait(5) and [('abc', 1)])
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flights.do('li.summary', fetch)))
+        follower = threading.Thread(target=lambda: results.append(flights.do('li.summary', fetch)))
+        leader.start()
+        started.wait(5)
+        follower.start()
+        while flights.stats()['coalesced'] == 0:
+            time.sleep(0.01)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertEquals([[('abc', 1)], [('abc', 1)]], results)
+        self.assertIsNot(results[0], results[1])
+        fetch.assert_called_once()
+        self.assertEquals({'in_flight': 0, 'leaders': 1, 'coalesced': 1}, {key: flights.stats()[key] for key in ('in_flight', 'leaders', 'coalesced')})
+
+    def test_flight_key_depends_on_statement_and_params(self):
+        statement = LEADING_INDICATOR_BETA_TS['metric']
+        query = statement.bind(leading_indicator_id='abc', date_time_start='2023-05-08', date_time_end='2023-05-09')
+        same = statement.bind(leading_indicator_id='abc', date_time_start='2023-05-08', date_time_end='2023-05-09')
+        other = statement.bind(leading_indicator_id='def', date_time_start='2023-05-08', date_time_end='2023-05-09')
+        self.assertEquals(flight_key('series', query), flight_key('series', same))
+        self.assertNotEqual(flight_key('series', query), flight_key('series', other))
+        self.assertNotEqual(flight_key('series', query), flight_key('rows', query))
+
+    def test_query_runs_again_after_flight_landed(self):
+        flights = SingleFlight()
+        fetch = MagicMock(side_effect=[[1], [2]])
+        self.assertEquals([1], flights.do('mtpm.target', fetch))
+        self.assertEquals([2], flights.do('mtpm.target', fetch))
+
+    def test_result_of_another_worker_is_used(self):
+        flights = SingleFlight()
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=locmem, SNOWFLAKE_COALESCE_ACROSS_WORKERS=True):
+            from django.core.cache import cache
+            cache.add('mtpm.ts:lock', 1)
+            cache.set('mtpm.ts:result', [('abc', 1)])
+            fetch = MagicMock()
+            self.assertEquals([('abc', 1)], flights.do('mtpm.ts', fetch))
+            fetch.assert_not_called()
+
+            cache.clear()
+            fetch.return_value = [('def', 2)]
+            self.assertEquals([('def', 2)], flights.do('mtpm.ts', fetch))
+            self.assertEquals([('def', 2)], cache.get('mtpm.ts:result'))
+            self.assertIsNone(cache.get('mtpm.ts:lock'))
+        self.assertEquals(1, flights.stats()['remote_results'])
+
+    def test_coalescing_falls_back_to_query_without_redis(self):
+        flights = SingleFlight()
+        with self.settings(SNOWFLAKE_COALESCE_ACROSS_WORKERS=True), patch.object(coalesce_module, 'caches') as caches:
+            caches.__getitem__.return_value.add.side_effect = ConnectionError('redis is down')
+            self.assertEquals([1], flights.do('li.summary', lambda: [1]))
+        self.assertEquals(1, flights.stats()['errors'])
+
+    def test_fetch_concurrently_keeps_query_deadline(self):
+        methods = SnowflakeMethods()
+        with patch('concurrent.futures.ThreadPoolExecutor', THREAD_POOL_EXECUTOR):
+            with query_deadline(60) as deadline:
+                results = methods.fetch_concurrently({'dim': current_deadline, 'ts': current_deadline})
+        self.assertEqual({'dim': deadline, 'ts': deadline}, results)
+
+    def test_query_deadline_middleware_answers_gateway_timeout(self):
+        middleware = QueryDeadlineMiddleware(MagicMock())
+        response = middleware.process_exception(MagicMock(path='/li/metrics/'), DeadlineExceeded('cancelled'))
+        self.assertEqual(504, response.status_code)
+        self.assertIsNone(middleware.process_exception(MagicMock(), ValueError()))
+        with self.settings(SNOWFLAKE_REQUEST_TIMEOUT=30):
+            seen = QueryDeadlineMiddleware(lambda request: current_deadline())(MagicMock())
+        self.assertIsNotNone(seen)
+        self.assertIsNone(current_deadline())
+
     def test_get_snowflake_mtpm_target_data_no_preferred_uom(self):
         plant_technology_id = '321-abc-321-abc-4321'
         mtpm_list = 'test_mtpm_list'
@@ -1218,7 +1377,8 @@ class SnowflakeTestCase(TestCase):
         result = methods.build_mtpm_query_preferred_uom(plant_technology_id,
                                                                            datetimestart,
                                                                            datetimeend, preferred_uom, mtpm_list)
-        self.assertIsInstance(result, str)
+        self.assertIsInstance(result.sql, str)
+        self.assertIn('2023-01-16', result.params)
 
     def test_get_snowflake_ts_query(self):
         mtpm_list = 'test_mtpm_list'
@@ -1229,7 +1389,8 @@ class SnowflakeTestCase(TestCase):
 
         methods = Mtpms()
         result = methods.build_mtpm_time_series_query(datetimestart, datetimeend, preferred_uom, mtpm_list)
-        self.assertIsInstance(result, str)
+        self.assertIsInstance(result.sql, str)
+        self.assertIn('2023-01-16', result.params)
     
     def test_get_snowflake_target_query(self):
         mtpm_list = 'test_mtpm_list'
@@ -1240,7 +1401,8 @@ class SnowflakeTestCase(TestCase):
 
         methods = Mtpms()
         result = methods.build_mtpm_target_query(preferred_uom, mtpm_list, datetimestart, datetimeend)
-        self.assertIsInstance(result, str)
+        self.assertIsInstance(result.sql, str)
+        self.assertIn('2023-01-16', result.params)
     
     def test_build_mtpm_ts_data_with_target(self):
         ts_results = [(Decimal('12.99000'), datetime(2023, 3, 16, 12, 8))]
@@ -1286,6 +1448,174 @@ class SnowflakeTestCase(TestCase):
         self.assertEqual(Decimal('-65154.17'), result[0][3]['target_value_lfy'])
         self.assertEqual(Decimal('319383.6'), result[0][3]['target_value_pb'])
     
+    def test_as_of_targets_match_scanning_the_targets(self):
+        targets = [('2023-06-15 11:00:00.000', 1), ('2023-06-17 11:00:00.000', 2), ('2023-06-16 11:00:00.000', 3),
+                   ('2023-06-19 11:00:00.000', 4), ('2023-06-19 11:00:00.000', 5)]
+        times = [datetime(2023, 6, day, hour) for day in range(14, 21) for hour in (10, 11, 12)]
+
+        def scan(time):
+            found = None
+            for target_time, value in targets:
+                if helpers.get_datetime_obj(target_time) > time:
+                    break
+                found = value
+            return found
+
+        as_of = AsOfTargets(targets)
+        expected = [scan(time) for time in times]
+        self.assertEquals(expected, [as_of.at(time) for time in times])
+        self.assertEquals(expected, as_of.at_each(times))
+        # the 06-16 target is listed after the 06-17 one, so it only counts from 06-17 on
+        self.assertEquals([None, 1, 1, 3, 5], [expected[index] for index in (1, 4, 7, 10, 16)])
+        self.assertEquals([None, None], AsOfTargets([]).at_each(times[:2]))
+
+    def test_group_by_keeps_first_appearance_and_row_order(self):
+        rows = [('b', 1), ('a', 2), ('b', 3), ('c', 4), ('a', 5)]
+        groups = group_by(rows, 0)
+        self.assertEquals(['b', 'a', 'c'], list(groups))
+        self.assertEquals([('b', 1), ('b', 3)], groups['b'])
+        self.assertEquals({True: [('a', 2), ('c', 4)], False: [('b', 1), ('b', 3), ('a', 5)]},
+                          group_by(rows, lambda row: row[1] in (2, 4)))
+        self.assertEquals({'b': [0, 2], 'a': [1, 4], 'c': [3]}, group_positions([row[0] for row in rows]))
+
+        series = SeriesColumns([np.array(['b', 'a', 'b'], dtype=object), np.array([1.0, 2.0, 3.0])])
+        by_key = series.group_by(0)
+        self.assertEquals(['b', 'a'], list(by_key))
+        self.assertEquals([(1.0,), (3.0,)], list(by_key['b'].rows()))
+        self.assertEquals({}, SeriesColumns([]).group_by(0))
+
+    def test_series_points_match_building_each_point(self):
+        # 5-minute points across the end of daylight saving time in Chicago, a gap marker and NULLs
+        times = np.array(['2023-11-05'] + [datetime(2023, 11, 5, 5, 30) + timedelta(minutes=5 * index, microseconds=index)
+                                           for index in range(30)], dtype=object)
+        values = np.array([np.nan, 0.12345, -0.00001, 2.50005, np.nan] + [index * 1.1 for index in range(26)])
+
+        methods = SnowflakeMethods()
+        for timezone in ('America/Chicago', 'UTC', 'Asia/Kolkata'):
+            expected = [methods.build_series_point(time_value, None if np.isnan(value) else value, timezone)
+                        for time_value, value in zip(times, values)]
+            points = methods.build_series_points(times, values, timezone)
+            self.assertEquals(expected, points)
+            self.assertEquals([str(point['value']) for point in expected], [str(point['value']) for point in points])
+            self.assertEquals([point['time'].isoformat() for point in expected], [point['time'].isoformat() for point in points])
+
+        self.assertEquals(['05 Nov, 05:30', ''], labels(wall_times([datetime(2023, 11, 5, 5, 30), None]), missing=''))
+        self.assertEquals([helpers.get_epoch(datetime(2023, 11, 5, 5, 30)), None],
+                          epochs(wall_times([datetime(2023, 11, 5, 5, 30), None])))
+
+    def test_series_points_from_sql_times_match_building_each_point(self):
+        from .encoders import MdpJSONEncoder
+        times = np.array(['2023-11-05'] + [datetime(2023, 11, 5, 5, 30) + timedelta(minutes=5 * index, microseconds=1000 * index)
+                                           for index in range(30)], dtype=object)
+        values = np.array([np.nan, 0.12345, -0.00001, 2.50005, np.nan] + [index * 1.1 for index in range(26)])
+
+        methods = SnowflakeMethods()
+        for timezone in ('America/Chicago', 'UTC', 'Asia/Kolkata'):
+            # the DATE_PART(epoch_millisecond, ...) columns Snowflake adds, NaN for the gap marker
+            utc_ms = np.array([np.nan] + [(time_value - datetime(1970, 1, 1)) // timedelta(milliseconds=1)
+                                          for time_value in times[1:]], dtype=float)
+            local_ms = np.array([np.nan] + [(helpers.convert_utc_to_local(time_value, timezone).replace(tzinfo=None)
+                                             - datetime(1970, 1, 1)) // timedelta(milliseconds=1)
+                                            for time_value in times[1:]], dtype=float)
+            expected = [methods.build_series_point(time_value, None if np.isnan(value) else value, timezone)
+                        for time_value, value in zip(times, values)]
+            points = methods.build_series_points(times, values, timezone, (utc_ms, local_ms))
+            self.assertEquals(json.dumps(expected, cls=MdpJSONEncoder), json.dumps(points, cls=MdpJSONEncoder))
+
+    def test_series_columns_match_series_points(self):
+        times = np.array(['2023-11-05'] + [datetime(2023, 11, 5, 5, 30) + timedelta(minutes=5 * index, microseconds=1000 * index)
+                                           for index in range(30)], dtype=object)
+        values = np.array([np.nan, 0.12345, -0.00001, 2.50005, np.nan] + [index * 1.1 for index in range(26)])
+        utc_ms = np.array([np.nan] + [(time_value - datetime(1970, 1, 1)) // timedelta(milliseconds=1)
+                                      for time_value in times[1:]], dtype=float)
+        local_ms = np.array([np.nan] + [(helpers.convert_utc_to_local(time_value, 'America/Chicago').replace(tzinfo=None)
+                                         - datetime(1970, 1, 1)) // timedelta(milliseconds=1)
+                                        for time_value in times[1:]], dtype=float)
+
+        methods = SnowflakeMethods()
+        points = methods.build_series_points(times, values, 'America/Chicago')
+        expected = {'epoch': [point['time_epoch'] for point in points],
+                    'value': [None if point['value'] is None else float(point['value']) for point in points]}
+        self.assertEquals(expected, methods.build_series_columns(times, values, 'America/Chicago'))
+        self.assertEquals(expected, methods.build_series_columns(times, values, 'America/Chicago', (utc_ms, local_ms)))
+
+        ts_results = [(Decimal('12.99'), datetime(2023, 6, 16, 12, 8), None, None, None),
+                      (None, datetime(2023, 6, 17, 12, 8), None, None, None)]
+        target_results = [(datetime(2023, 6, 17), Decimal('10.5'), 'LFY')]
+        points, ts_min, ts_max = Mtpms().get_mtpm_time_series_preferred_uom(ts_results, target_results, Decimal('9.1'),
+                                                                            None, Decimal('3.2'), True)
+        columns = Mtpms().get_mtpm_time_series_preferred_uom(ts_results, target_results, Decimal('9.1'), None,
+                                                             Decimal('3.2'), True, columnar=True)
+        self.assertEquals([{'epoch': [point['epoch_local'] for point in points],
+                            'value': [None if point['value'] is None else float(point['value']) for point in points],
+                            'target_lfy': [point['target_value_lfy'] for point in points],
+                            'target_pb': [point['target_value_pb'] for point in points],
+                            'target_budget': [point['target_value_budget'] for point in points]}, ts_min, ts_max], columns)
+        self.assertEquals([{'epoch': [], 'value': [], 'target_lfy': [], 'target_pb': [], 'target_budget': []}, None, None],
+                          Mtpms().get_mtpm_time_series_preferred_uom([], columnar=True))
+
+    def test_columnar_format_is_accepted(self):
+        from rest_framework.decorators import api_view, renderer_classes
+        from rest_framework.response import Response
+        from rest_framework.test import APIRequestFactory
+        from .renderers import TIME_SERIES_RENDERERS, is_columnar
+
+        @api_view(['GET'])
+        @renderer_classes(TIME_SERIES_RENDERERS)
+        def view(request):
+            return Response({'columnar': is_columnar(request)})
+
+        factory = APIRequestFactory()
+        self.assertEquals({'columnar': True}, view(factory.get('/', {'format': 'columnar'})).data)
+        self.assertEquals({'columnar': False}, view(factory.get('/')).data)
+        self.assertEquals(404, view(factory.get('/', {'format': 'rows'})).status_code)
+
+    def test_fast_json_matches_the_json_module(self):
+        from dateutil import tz
+        from django.core.serializers.json import DjangoJSONEncoder
+        from .encoders import MdpJSONEncoder, dumps
+        from rest_framework.renderers import JSONRenderer
+        from .renderers import FastJSONRenderer
+
+        data = {'results': [{'value': Decimal('12.9900'), 'time': datetime(2023, 5, 8, 1, 2, 3),
+                             'utc': datetime(2023, 5, 8, tzinfo=tz.UTC), 'local': helpers.convert_utc_to_local(datetime(2023, 11, 5, 6, 30), 'America/Chicago'),
+                             'day': date(2023, 5, 8), 'name': 'Caf\u00e9 \u2028', 'missing': None, 1: True}]}
+        with_numpy = {**data, 'count': np.int64(3), 'ratio': np.float64(0.25), 'values': np.array([1.5, 2.5])}
+        for backend in ('orjson', 'json'):
+            with self.settings(SNOWFLAKE_JSON_BACKEND=backend):
+                self.assertEquals(json.loads(json.dumps(with_numpy, cls=MdpJSONEncoder)), json.loads(dumps(with_numpy)))
+                self.assertEquals(json.loads(json.dumps(data, cls=DjangoJSONEncoder)),
+                                  json.loads(dumps(data, DjangoJSONEncoder)))
+
+        self.assertIn(b'\\u2028', FastJSONRenderer().render(data))
+        self.assertEquals(json.loads(JSONRenderer().render(data)), json.loads(FastJSONRenderer().render(data)))
+        # sub-second times keep their microseconds
+        self.assertEquals(b'["2023-05-08T01:02:03.456789"]', dumps([datetime(2023, 5, 8, 1, 2, 3, 456789)]))
+
+    def test_sql_times_statements_bind_the_request_zone(self):
+        from .queries.leading_indicators import LEADING_INDICATOR_BETA_TS_SQL_TIMES
+        methods = LeadingIndicators()
+        self.assertIsNone(methods.sql_times_zone('America/Chicago'))
+        with self.settings(SNOWFLAKE_SERIES_SQL_TIMES=True):
+            self.assertEquals('America/Chicago', methods.sql_times_zone('America/Chicago'))
+            self.assertEquals('UTC', methods.sql_times_zone(None))
+            mtpm_query = Mtpms().build_mtpm_time_series_query('2023-01-01', '2023-01-02', 'metric', ['abc'])
+
+        query = LEADING_INDICATOR_BETA_TS_SQL_TIMES['metric'].bind(leading_indicator_id='abc', date_time_start='2023-01-01',
+                                                                   date_time_end='2023-01-02', timezone='America/Chicago')
+        self.assertIn("CONVERT_TIMEZONE('UTC', :1, fl.leading_indicator_value_timestamp_utc)", query.sql)
+        self.assertIn('America/Chicago', query.params)
+        self.assertNotIn('DATE_PART', LEADING_INDICATOR_BETA_TS['metric'].sql)
+        self.assertIn('DATE_PART(epoch_millisecond, fm.mtpm_value_timestamp_utc)', mtpm_query.sql)
+        self.assertNotIn('CONVERT_TIMEZONE', mtpm_query.sql)
+
+        # MTPM points built from the epoch column are the ones built from the times
+        ts_results = [(Decimal('12.99'), datetime(2023, 6, 16, 12, 8, 30, 250000), None, None, None),
+                      (None, datetime(1969, 12, 31, 23, 59, 59, 500000), None, None, None)]
+        with_epochs = [row + ((row[1] - datetime(1970, 1, 1)) // timedelta(milliseconds=1),) for row in ts_results]
+        self.assertEquals(Mtpms().get_mtpm_time_series_preferred_uom(ts_results),
+                          Mtpms().get_mtpm_time_series_preferred_uom(with_epochs))
+
     def test_build_mtpm_ts_data_with_no_target_data(self):
         ts_results = [(Decimal('12.99000'), datetime(2023, 6, 16, 12, 8)),(Decimal('12.99000'), datetime(2023, 6, 17, 12, 8)),(Decimal('12.99000'), datetime(2023, 6, 18, 12, 8)),
             (Decimal('12.99000'), datetime(2023, 6, 19, 12, 8)),(Decimal('12.99000'), datetime(2023, 6, 20, 12, 8)),(Decimal('12.99000'), datetime(2023, 6, 21, 12, 8)),
@@ -1556,6 +1886,43 @@ class SnowflakeTestCase(TestCase):
             self.assertIn('leading_indicator_id', result)
             self.assertIn('equipment_tag_name', result)
 
+    def test_get_snowflake_equipment_tag_metric_data_splits_series_per_tag(self):
+        methods = EquipmentTags()
+        methods.fetch = MagicMock(side_effect=[
+            [('tag-1', 'li', 'one', 'One', 1, 0, 1, 0, 1, 0, 1, 0, 'm', 'ft'),
+             ('tag-2', 'li', 'two', 'Two', 1, 0, 1, 0, 1, 0, 1, 0, 'm', 'ft'),
+             ('tag-3', 'li', 'three', 'Three', 1, 0, 1, 0, 1, 0, 1, 0, 'm', 'ft')],
+            [(1, 2, '2022-12-01 01:00:00', '2022-12-01 01:00:00', 0, 'tag-1'),
+             (3, 4, '2022-12-01 02:00:00', '2022-12-01 02:00:00', 0, 'tag-2'),
+             (5, 6, '2022-12-02 03:00:00', '2022-12-02 03:00:00', 1, 'tag-1')]])
+
+        records = methods.get_snowflake_equipment_tag_metric_data(None, 'li', '2022-12-01T00:00:00', '2022-12-03T00:00:00')
+
+        self.assertIn('ft.equipment_tag_id', methods.fetch.call_args_list[1][0][0].sql)
+        self.assertEquals([1, 5], [point['equipment_tag_value_metric'] for point in records[0]['time_series']])
+        self.assertEquals([3], [point['equipment_tag_value_metric'] for point in records[1]['time_series']])
+        self.assertEquals([], records[2]['time_series'])
+
+    def test_get_snowflake_equipment_tag_metric_data_beta_splits_series_per_tag(self):
+        self.wrapper.validate_and_execute.return_value = [('tag-1', 'li', 'one', 'One', 1, 0, 'm', 1, 0),
+                                                          ('tag-2', 'li', 'two', 'Two', 1, 0, 'm', 1, 0)]
+        self.wrapper.validate_and_execute_arrow.return_value = pa.table({
+            'TIME': pa.array([datetime(2023, 5, 7, 1), datetime(2023, 5, 8, 2), datetime(2023, 5, 8, 3)], pa.timestamp('ms')),
+            'VALUE': pa.array([1.0, 20.0, 3.0], pa.float64()),
+            'EQUIPMENT_TAG_ID': pa.array(['tag-1', 'tag-2', 'tag-1']),
+        })
+
+        methods = EquipmentTags()
+        methods.wrapper = self.wrapper
+        records = methods.get_snowflake_equipment_tag_metric_data_beta(None, 'li', '2023-05-07T00:00:00',
+                                                                        '2023-05-09T00:00:00', 'metric', 'UTC')
+
+        self.assertEquals([Decimal('1.0000'), Decimal('3.0000')], [point['value'] for point in records[0]['time_series']])
+        self.assertEquals((Decimal('1.0000'), Decimal('3.0000')), (records[0]['ts_min'], records[0]['ts_max']))
+        # tag-2 starts a day late and gets its own gap marker
+        self.assertEquals([None, Decimal('20.0000')], [point['value'] for point in records[1]['time_series']])
+        self.assertEquals((Decimal('20.0000'), Decimal('20.0000')), (records[1]['ts_min'], records[1]['ts_max']))
+
     def test_get_leading_indicator_time_series_empty_start_date(self):
         leading_indicator_id = '321-abc-321-abc-4321'
         date_time_start = '2022-12-01T00:00:00'
@@ -1567,7 +1934,7 @@ class SnowflakeTestCase(TestCase):
         methods.wrapper = self.wrapper
         self.wrapper.validate_and_execute.return_value = [(0, 0,'2022-12-03T00:00:00', '2022-12-04T00:00:00', None),
                                                           (0, 0,'2023-01-16T00:00:00', '2023-01-16T00:00:00', None)]
-        results = methods.get_leading_indicator_metric_time_series_data(date_time_start, date_time_end, '', '')
+        results = methods.get_leading_indicator_metric_time_series_data(date_time_start, date_time_end, '')
         self.assertIsInstance(results, list)
         self.assertEquals(len(results), 3)
         self.assertEquals(results[0][2], date_time_start)
@@ -1583,7 +1950,7 @@ class SnowflakeTestCase(TestCase):
         methods.wrapper = self.wrapper
         self.wrapper.validate_and_execute.return_value = [(0, 0,date_time_start, date_time_start, None),
                                                           (0, 0,date_time_end, date_time_end, None)]
-        results = methods.get_leading_indicator_metric_time_series_data(date_time_start, date_time_end, '', '')
+        results = methods.get_leading_indicator_metric_time_series_data(date_time_start, date_time_end, '')
         self.assertIsInstance(results, list)
         self.assertEquals(len(results), 2)
         self.assertEquals(results[1][2], date_time_end)
@@ -1600,7 +1967,7 @@ class SnowflakeTestCase(TestCase):
         methods.wrapper = self.wrapper
         self.wrapper.validate_and_execute.return_value = [(0, 0,'2022-12-02T00:00:00', '2022-12-02T00:00:00', None), (0, 0,date_time_end, date_time_end, None)]
 
-        results = methods.get_leading_indicator_metric_time_series_data(date_time_start, date_time_end, '', '')
+        results = methods.get_leading_indicator_metric_time_series_data(date_time_start, date_time_end, '')
         self.assertIsInstance(results, list)
         self.assertEquals(len(results), 3)
         self.assertEquals(results[2][2], date_time_end)
@@ -1616,7 +1983,7 @@ class SnowflakeTestCase(TestCase):
         methods = LeadingIndicators()
         methods.wrapper = self.wrapper
         self.wrapper.validate_and_execute.return_value = [(0, 0, datetime(2022, 12, 1, 10, 00, 00), '2022-12-01T00:05:00', None), (0, 0,'2023-01-16T00:03:00', '2023-01-16T00:03:00', None)]
-        results = methods.get_leading_indicator_metric_time_series_data(date_time_start, date_time_end, '', '')
+        results = methods.get_leading_indicator_metric_time_series_data(date_time_start, date_time_end, '')
         self.assertIsInstance(results, list)
         self.assertEquals(len(results), 2)
         self.assertEquals(results[1][2], '2023-01-16T00:03:00')
@@ -1649,7 +2016,9 @@ class SnowflakeTestCase(TestCase):
         methods.wrapper = self.wrapper
         self.wrapper.validate_and_execute.return_value = [(0, 0,'2022-12-03T00:00:00', '2022-12-04T00:00:00', None),
                                                           (0, 0,'2023-01-16T00:00:00', '2023-01-16T00:00:00', None)]
-        results = methods.get_snowflake_equipment_tag_metric_time_series_data('', date_time_start, date_time_end)
+        results = methods.get_snowflake_equipment_tag_metric_time_series_data(
+            EQUIPMENT_TAG_TS.bind(equipment_tag_id='', date_time_start=date_time_start, date_time_end=date_time_end),
+            date_time_start, date_time_end)
         self.assertIsInstance(results, list)
         self.assertEquals(len(results), 3)
         self.assertEquals(results[0][2], date_time_start)
@@ -1696,6 +2065,241 @@ class SnowflakeTestCase(TestCase):
         self.assertEquals(str(time_series[0]['time']), expected_datetime)
         self.assertEquals(time_series[0]['formatted_date'], '08 May, 08:15')
 
+    def test_series_columns_from_arrow(self):
+        table = pa.table({
+            'TIME': pa.array([datetime(2023, 5, 8, 14, 15), datetime(2023, 5, 8, 15, 0)], pa.timestamp('ns')),
+            'VALUE': pa.array([Decimal('2809.600035249'), None], pa.decimal128(38, 9)),
+        })
+        series = SeriesColumns.from_arrow(table)
+        self.assertEquals(len(series), 2)
+        self.assertEquals(series[0][1], datetime(2023, 5, 8, 15, 0))
+        self.assertEquals(series[1].dtype, 'float64')
+        self.assertTrue(pd.isna(series[1][1]))
+        self.assertEquals(len(SeriesColumns.from_arrow(None)), 0)
+
+    def test_get_leading_indicator_time_series_beta_from_arrow(self):
+        date_time_start = '2023-05-07T00:00:00'
+        date_time_end = '2023-05-09T00:00:00'
+        self.wrapper.validate_and_execute_arrow.return_value = pa.table({
+            'TIME': pa.array([datetime(2023, 5, 8, 14, 15), datetime(2023, 5, 8, 15, 0)], pa.timestamp('ms')),
+            'VALUE': pa.array([2809.600035249, None], pa.float64()),
+        })
+
+        methods = LeadingIndicators()
+        methods.wrapper = self.wrapper
+        results = methods.get_leading_indicator_metric_time_series_data_beta(date_time_start, date_time_end, '', 'metric')
+        records = methods.get_snowflake_leading_indicator_time_series_and_sum(results, 'America/Costa Rica')
+        time_series = records[0]
+        self.assertEquals(len(time_series), 3)
+        self.assertEquals(time_series[0]['formatted_date'], '06 May, 18:00')
+        self.assertIsNone(time_series[0]['value'])
+        self.assertEquals(time_series[1]['value'], Decimal('2809.6000'))
+        self.assertIsNone(time_series[2]['value'])
+        self.assertEquals(records[1], Decimal('2809.6000'))
+        self.assertEquals(records[2], Decimal('2809.6000'))
+
+    def test_lttb_keeps_the_ends_and_the_peaks(self):
+        times = np.arange(1000, dtype=np.float64)
+        values = np.sin(times / 50)
+        values[500] = 10
+        indices = lttb_indices(times, values, 100)
+        self.assertEquals(100, len(indices))
+        self.assertEquals([0, 999], [indices[0], indices[-1]])
+        self.assertIn(500, indices)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+        self.assertEquals([0, 1, 2], list(lttb_indices(times[:3], values[:3], 10)))
+
+    def test_min_max_downsampling_keeps_each_bucket_extremes(self):
+        rows = [(datetime(2023, 5, 8) + timedelta(minutes=minute), float(minute % 7)) for minute in range(600)]
+        rows[300] = (rows[300][0], -5.0)
+        series = SeriesColumns.from_rows([('2023-05-07', None)] + rows)
+        sampled = downsample(series, 40, 'minmax')
+        self.assertLessEqual(len(sampled), 40)
+        self.assertEquals('2023-05-07', sampled[0][0])
+        self.assertIn(-5.0, list(sampled[1]))
+        self.assertIn(6.0, list(sampled[1]))
+        self.assertIs(series, downsample(series, 1000, 'lttb'))
+
+    def test_get_leading_indicator_time_series_beta_downsampled(self):
+        times = [datetime(2023, 5, 8) + timedelta(minutes=minute) for minute in range(2000)]
+        values = [float(minute % 100) + 0.123456 for minute in range(2000)]
+        values[1234] = 987.654321
+        self.wrapper.validate_and_execute_arrow.return_value = pa.table({
+            'TIME': pa.array(times, pa.timestamp('ms')), 'VALUE': pa.array(values, pa.float64())})
+
+        methods = LeadingIndicators()
+        methods.wrapper = self.wrapper
+        results = methods.get_leading_indicator_metric_time_series_data_beta('2023-05-08T00:00:00', '2023-05-09T00:00:00',
+                                                                            'abc', 'metric', 100, 'lttb')
+        records = methods.get_snowflake_leading_indicator_time_series_and_sum(results, 'UTC', 100, 'lttb')
+
+        query, params = self.wrapper.validate_and_execute_arrow.call_args[0]
+        self.assertIn("TIME_SLICE(fl.leading_indicator_value_timestamp_utc, :4, 'SECOND')", query)
+        # 24 hours in 400 buckets for LTTB to pick 100 points from
+        self.assertEquals(('abc', '2023-05-08T00:00:00', '2023-05-09T00:00:00', 216), params)
+        self.assertEquals(100, len(records[0]))
+        self.assertEquals(Decimal('0.1235'), records[1])
+        self.assertEquals(Decimal('987.6543'), records[2])
+        self.assertIn(Decimal('987.6543'), [point['value'] for point in records[0]])
+
+    def test_get_downsampling_parameters(self):
+        self.assertEquals((None, 'lttb'), views.get_downsampling({}))
+        self.assertEquals((1500, 'minmax'), views.get_downsampling(dict(max_points='1500', downsampling='MinMax')))
+        self.assertEquals((False, 'Parameter max_points must be an integer of at least 2'),
+                          views.get_downsampling(dict(max_points='many')))
+        self.assertEquals((False, 'Parameter downsampling must be one of lttb, minmax'),
+                          views.get_downsampling(dict(max_points='500', downsampling='average')))
+
+    def segment_cache_settings(self, open_from):
+        # buckets that end after open_from are still open
+        return self.settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+                             SNOWFLAKE_SERIES_BUCKET=60 * 60,
+                             SNOWFLAKE_SERIES_SEAL_AFTER=(datetime.utcnow() - open_from).total_seconds())
+
+    def fake_series_fetch(self, rows, queries):
+        def fetch_series(query):
+            start, end = (helpers.get_datetime_obj(value) for value in query.params[1:])
+            queries.append((start, end))
+            return SeriesColumns.from_rows([row for row in rows if start <= row[0] <= end])
+        return fetch_series
+
+    def test_segment_cache_reads_only_the_open_bucket_again(self):
+        rows = [(datetime(2023, 5, 8, hour, minute), float(hour)) for hour in range(24) for minute in (0, 30)]
+        queries = []
+        fetch_series = self.fake_series_fetch(rows, queries)
+        statement = LEADING_INDICATOR_BETA_TS['metric']
+        with self.segment_cache_settings(open_from=datetime(2023, 5, 8, 20)):
+            segments = SegmentCache()
+            first = segments.fetch(statement, '2023-05-08 02:15:00', '2023-05-08 21:00:00', {'leading_indicator_id': 'abc'}, fetch_series)
+            second = segments.fetch(statement, '2023-05-08 02:15:00', '2023-05-08 21:00:00', {'leading_indicator_id': 'abc'}, fetch_series)
+            other = segments.fetch(statement, '2023-05-08 02:15:00', '2023-05-08 21:00:00', {'leading_indicator_id': 'def'}, fetch_series)
+
+        expected = [row for row in rows if datetime(2023, 5, 8, 2, 15) <= row[0] <= datetime(2023, 5, 8, 21)]
+        self.assertEquals(expected, list(first.rows()))
+        self.assertEquals(expected, list(second.rows()))
+        # the first edge bucket is read from its start so it can be cached
+        self.assertEquals((datetime(2023, 5, 8, 2), datetime(2023, 5, 8, 21)), queries[0])
+        self.assertEquals((datetime(2023, 5, 8, 20), datetime(2023, 5, 8, 21)), queries[1])
+        self.assertEquals(3, len(queries))
+        self.assertEquals(len(expected), len(other))
+        self.assertEquals({'hits': 18, 'misses': 36, 'open': 6, 'queries': 3, 'bypassed': 0, 'errors': 0}, segments.stats())
+
+    def test_segment_cache_fills_gaps_between_cached_buckets(self):
+        rows = [(datetime(2023, 5, 8, hour), float(hour)) for hour in range(24)]
+        queries = []
+        fetch_series = self.fake_series_fetch(rows, queries)
+        statement = LEADING_INDICATOR_BETA_TS['imperial']
+        with self.segment_cache_settings(open_from=datetime(2023, 5, 9)):
+            segments = SegmentCache()
+            segments.fetch(statement, '2023-05-08 10:00:00', '2023-05-08 11:59:00', {'leading_indicator_id': 'abc'}, fetch_series)
+            series = segments.fetch(statement, '2023-05-08 08:00:00', '2023-05-08 13:00:00', {'leading_indicator_id': 'abc'}, fetch_series)
+
+        self.assertEquals([8.0, 9.0, 10.0, 11.0, 12.0, 13.0], list(series[1]))
+        self.assertEquals([(datetime(2023, 5, 8, 8), datetime(2023, 5, 8, 10)),
+                           (datetime(2023, 5, 8, 12), datetime(2023, 5, 8, 14))], queries[1:])
+
+    def test_segment_cache_does_not_keep_empty_results(self):
+        queries = []
+        fetch_series = self.fake_series_fetch([], queries)
+        with self.segment_cache_settings(open_from=datetime(2023, 5, 9)):
+            segments = SegmentCache()
+            for _ in range(2):
+                series = segments.fetch(LEADING_INDICATOR_BETA_TS['metric'], '2023-05-08 00:00:00',
+                                        '2023-05-08 06:00:00', {'leading_indicator_id': 'abc'}, fetch_series)
+        self.assertEquals(0, len(series))
+        self.assertEquals(2, len(queries))
+
+    def test_stream_results_matches_json_response(self):
+        from django.http import JsonResponse
+        from .encoders import MdpJSONEncoder
+        points = [{'time': datetime(2023, 5, 8, 14, 15), 'value': Decimal('2.5')},
+                  {'time': datetime(2023, 5, 8, 14, 20), 'value': None},
+                  {'time': datetime(2023, 5, 8, 14, 25), 'value': Decimal('1.25')}]
+        records = [{'leading_indicator_id': 'abc', 'time_series': StreamedSeries(iter(points))},
+                   {'leading_indicator_id': 'def', 'time_series': StreamedSeries(iter([]))}]
+        expected = [{'leading_indicator_id': 'abc', 'time_series': points, 'ts_min': Decimal('1.25'), 'ts_max': Decimal('2.5')},
+                    {'leading_indicator_id': 'def', 'time_series': [], 'ts_min': None, 'ts_max': None}]
+
+        streamed = ''.join(stream_results(records, chunk_size=2))
+        json_response = JsonResponse(encoder=MdpJSONEncoder, data={'results': expected})
+        self.assertEquals(json.loads(streamed), json.loads(json_response.content))
+
+    def test_stream_leading_indicator_time_series_beta(self):
+        self.wrapper.validate_and_execute.return_value = [('abc', 'li', 'LI', 0, 0, None, None, None, 10, 0, '%', '%',
+                                                           None, None, None, None, False, None, None, None)]
+        self.wrapper.stream_execute.return_value = iter([(datetime(2023, 5, 8, 14, 15), 2809.600035249),
+                                                         (datetime(2023, 5, 8, 15, 0), None)])
+
+        methods = LeadingIndicators()
+        methods.wrapper = self.wrapper
+        records = methods.stream_snowflake_leading_indicator_metric_data_beta('abc', None, '2023-05-07T00:00:00',
+                                                                              '2023-05-09T00:00:00', 'metric', None)
+        time_series = records[0]['time_series']
+        points = list(time_series)
+        self.assertEquals(len(points), 3)
+        self.assertIsNone(points[0]['value'])
+        self.assertEquals(points[1]['value'], Decimal('2809.6000'))
+        self.assertEquals(time_series.summary(), {'ts_min': Decimal('2809.6000'), 'ts_max': Decimal('2809.6000')})
+        self.assertNotIn('ts_min', records[0])
+
+    def test_export_leading_indicator_time_series_streams_arrow_batches(self):
+        import io
+        import pyarrow.parquet as pq
+        from .renderers import ArrowIPCRenderer, ParquetRenderer
+
+        batches = [pa.RecordBatch.from_pydict({'TIME': [datetime(2023, 5, 8, 14, 15)], 'VALUE': pa.array([1], pa.int8())}),
+                   pa.RecordBatch.from_pydict({'TIME': [datetime(2023, 5, 8, 15, 0), datetime(2023, 5, 8, 16, 0)],
+                                               'VALUE': pa.array([300, None], pa.int16())})]
+        self.wrapper.stream_execute_arrow.return_value = iter(batches)
+        methods = LeadingIndicators()
+        methods.wrapper = self.wrapper
+        exported = methods.export_leading_indicator_time_series('abc', None, '2023-05-07T00:00:00', '2023-05-09T00:00:00',
+                                                                'metric')
+        query = LEADING_INDICATOR_BETA_TS['metric'].bind(leading_indicator_id='abc', date_time_start=datetime(2023, 5, 7),
+                                                         date_time_end=datetime(2023, 5, 9))
+        self.wrapper.stream_execute_arrow.assert_called_once_with(query.sql, query.params, tag='li.beta.ts')
+
+        # a piece per batch, with the integers of every batch as int64
+        chunks = list(ArrowIPCRenderer().stream(exported))
+        self.assertEquals(3, len(chunks))
+        table = pa.ipc.open_stream(b''.join(chunks)).read_all()
+        self.assertEquals([1, 300, None], table.column('VALUE').to_pylist())
+        self.assertEquals(pa.int64(), table.schema.field('VALUE').type)
+
+        metadata = pq.read_metadata(io.BytesIO(b''.join(ParquetRenderer().stream(iter(batches)))))
+        self.assertEquals((3, 2), (metadata.num_rows, metadata.num_row_groups))
+        self.assertEquals(0, pa.ipc.open_stream(b''.join(ArrowIPCRenderer().stream(iter([])))).read_all().num_rows)
+
+    def test_leading_indicator_metric_data_batch(self):
+        def dim_row(leading_indicator_id):
+            return (leading_indicator_id, 'li', 'LI', 0, 0, None, None, None, 10, 0, '%', '%',
+                    None, None, None, 0.5, 'true', None, None, None)
+        self.wrapper.validate_and_execute.return_value = [dim_row('def'), dim_row('abc')]
+        self.wrapper.validate_and_execute_arrow.return_value = pa.table({
+            'LEADING_INDICATOR_ID': pa.array(['abc', 'abc', 'def', 'abc', 'def']),
+            'TIME': pa.array([datetime(2023, 5, 7, 1), datetime(2023, 5, 7, 3), datetime(2023, 5, 8, 2),
+                              datetime(2023, 5, 8, 3), datetime(2023, 5, 8, 4)], pa.timestamp('ms')),
+            'VALUE': pa.array([1.0, 3.0, 20.0, 5.0, 40.0], pa.float64()),
+        })
+
+        methods = LeadingIndicators()
+        methods.wrapper = self.wrapper
+        records = methods.get_snowflake_leading_indicator_metric_data_batch(['abc', 'missing', 'def', 'abc'],
+                                                                          '2023-05-07T00:00:00', '2023-05-09T00:00:00',
+                                                                          'metric', 'UTC')
+
+        self.assertEquals(1, self.wrapper.validate_and_execute.call_count)
+        self.assertEquals(1, self.wrapper.validate_and_execute_arrow.call_count)
+        query, params = self.wrapper.validate_and_execute_arrow.call_args[0]
+        self.assertIn('PARSE_JSON(:1)', query)
+        self.assertEquals('["abc", "missing", "def", "abc"]', params[0])
+        self.assertEquals(['abc', 'def'], [record['leading_indicator_id'] for record in records])
+        self.assertEquals([Decimal('1.0000'), Decimal('3.0000'), Decimal('5.0000')], [point['value'] for point in records[0]['time_series']])
+        # the series of def starts a day late, so it gets the gap marker
+        self.assertEquals([None, Decimal('20.0000'), Decimal('40.0000')], [point['value'] for point in records[1]['time_series']])
+        self.assertEquals((Decimal('20.0000'), Decimal('40.0000')), (records[1]['ts_min'], records[1]['ts_max']))
+        self.assertEquals(0.5, records[1]['l24h'])
+
     def test_trim_date_string(self):
         long_date = '2023-02-10T00:00:00'
 
@@ -1760,6 +2364,31 @@ class SnowflakeTestCase(TestCase):
         date_obj = helpers.convert_local_to_utc(helpers.get_datetime_obj(long_date), timezone_string)
         self.assertEqual(date_obj, desired_result)
 
+    def test_timestamps_match_dateutil(self):
+        from dateutil import tz
+        from dateutil.parser import parse
+        from . import timestamps
+        for value in ('2023-06-22 10:25:00.000', '2023-06-22', '2023-06-22T10:25:00+02:00', '2023-06-22T10:25:00Z',
+                      'Jun 22 2023 10:25'):
+            self.assertEqual(parse(value), timestamps.parse(value))
+        moment = datetime(2023, 6, 22, 10, 25, 1, 500)
+        self.assertIs(moment, timestamps.parse(moment))
+        self.assertEqual(datetime(2023, 6, 22), timestamps.parse(date(2023, 6, 22)))
+        self.assertIs(timestamps.zone('America/Costa Rica'), timestamps.zone('America/Costa_Rica'))
+        self.assertIsNone(timestamps.zone('Not/A_Zone'))
+
+        # epochs as the old strftime('%s') (on a UTC host) and dateutil arithmetic counted them
+        for timezone in ('America/Chicago', 'Asia/Kolkata', 'UTC'):
+            local = helpers.convert_utc_to_local(moment, timezone)
+            old_local = moment.replace(tzinfo=tz.gettz('UTC')).astimezone(tz.gettz(timezone))
+            old_epoch = int((old_local - datetime(1970, 1, 1, tzinfo=tz.gettz(timezone))).total_seconds())
+            self.assertEqual(old_local, local)
+            self.assertEqual(old_epoch, helpers.get_epoch(local, timezone))
+            # a time in another zone is counted from midnight 1970-01-01 in the zone asked for
+            self.assertEqual(1687429501, helpers.get_epoch(local, 'UTC'))
+        self.assertEqual(1687429501, helpers.get_epoch(moment))
+        self.assertEqual([1687429501, None], timestamps.epochs(timestamps.wall_times([moment, None])))
+
     def test_format_datetime(self):
         import pytz
         from dateutil import tz
@@ -1857,7 +2486,7 @@ class SnowflakeTestCase(TestCase):
 
         methods = LeadingIndicators()
         methods.wrapper = self.wrapper
-        records = methods.execute_summary_query('', dim_data, 5)
+        records = methods.execute_summary_query(methods.get_li_summary_query([], '', ''), dim_data, 5)
         self.assertEquals(len(records), 5)
         self.assertEquals(records[1]['leading_indicator_id'], '3e2c7a75-4fd6-11ed-b702-f4ee08e53170')
         self.assertEquals(records[4]['leading_indicator_id'], '5279b7d1-4fd6-11ed-b702-f4ee08e53170')
@@ -1895,105 +2524,52 @@ class SnowflakeTestCase(TestCase):
 
         methods = LeadingIndicators()
         methods.wrapper = self.wrapper
-        records = methods.execute_summary_query('', dim_data, None)
+        records = methods.execute_summary_query(methods.get_li_summary_query([], '', ''), dim_data, None)
         self.assertEquals(len(records), 13)
         self.assertEquals(records[3]['leading_indicator_id'], '5279b7d1-4fd6-11ed-b702-f4ee08e53170')
         self.assertEquals(records[3]['uom_inside_envelope'], '%')
         self.assertEquals(records[8]['last_refresh_timestamp'], datetime(2023, 7, 17, 20, 3, 18, 671000, tzinfo=tz.tzutc()))
     
     def test_get_snowflake_leading_indicator_summary_dim_query(self):
-        db_schema = f'{os.getenv("SNOWFLAKE_DATABASE")}.{os.getenv("SNOWFLAKE_SCHEMA")}'
-        expected_query = f"""WITH cte_recent_vals AS (
-                        SELECT fl.leading_indicator_id, fl.leading_indicator_value_metric
-                        FROM {db_schema}."FACT_LEADING_INDICATOR" fl
-                        INNER JOIN (SELECT leading_indicator_id, max(leading_indicator_value_timestamp_utc) AS dtc 
-                            FROM {db_schema}."FACT_LEADING_INDICATOR" 
-                            WHERE leading_indicator_value_timestamp_utc <= '2023-07-31 23:00:00'
-                            GROUP BY leading_indicator_id) fli 
-                        ON fli.leading_indicator_id = fl.leading_indicator_id and fl.leading_indicator_value_timestamp_utc = dtc
-                        WHERE fl.leading_indicator_id in 
-                            (SELECT l.leading_indicator_id from DIM_LEADING_INDICATOR l 
-                                INNER JOIN DIM_MTPM m ON m.mtpm_id = l.mtpm_id 
-                                WHERE l.mtpm_id IN (['57ad768c-4e81-11ed-b701-1cc10cb4aa68', '57ad768c-4e81-11ed-b701-1cc10cb4aa68'])
-                            )
-                        ),
-                        cte_timestamp_vals AS (
-                        SELECT fl.leading_indicator_id, fl.cdp_datetime_updated
-                        FROM {db_schema}."FACT_LEADING_INDICATOR" fl
-                        INNER JOIN (SELECT leading_indicator_id, max(leading_indicator_value_timestamp_utc) AS dtc 
-                            FROM {db_schema}."FACT_LEADING_INDICATOR" 
-                            GROUP BY leading_indicator_id) fli 
-                        ON fli.leading_indicator_id = fl.leading_indicator_id and fl.leading_indicator_value_timestamp_utc = dtc
-                        WHERE fl.leading_indicator_id in 
-                            (SELECT l.leading_indicator_id from DIM_LEADING_INDICATOR l 
-                                INNER JOIN DIM_MTPM m ON m.mtpm_id = l.mtpm_id 
-                                WHERE l.mtpm_id IN (['57ad768c-4e81-11ed-b701-1cc10cb4aa68', '57ad768c-4e81-11ed-b701-1cc10cb4aa68']))
-                            ) 
-                        SELECT l.leading_indicator_id,
-                        l.leading_indicator_display_name,
-                        l.max_metric,
-                        l.min_metric,
-                        l.uom_metric,
-                        l.uom_inside_envelope,
-                        m.mtpm_id,
-                        m.mtpm_display_name,
-                        ts.cdp_datetime_updated,
-                        rv.leading_indicator_value_metric
-                    FROM
-                        {db_schema}."DIM_LEADING_INDICATOR" l
-                    INNER JOIN {db_schema}."DIM_MTPM" m 
-                    ON m.mtpm_id = l.mtpm_id
-                    LEFT JOIN cte_recent_vals rv on rv.leading_indicator_id = l.leading_indicator_id
-                    LEFT JOIN cte_timestamp_vals ts on ts.leading_indicator_id = l.leading_indicator_id
-                    WHERE l.mtpm_id in (['57ad768c-4e81-11ed-b701-1cc10cb4aa68', '57ad768c-4e81-11ed-b701-1cc10cb4aa68'])
-                    ORDER BY mtpm_display_name, leading_indicator_display_name"""
-
         methods = LeadingIndicators()
         query = methods.get_li_summary_dim_query(['57ad768c-4e81-11ed-b701-1cc10cb4aa68', '57ad768c-4e81-11ed-b701-1cc10cb4aa68'], 'metric',
-            db_schema, datetime(2023, 7, 17), datetime(2023, 7, 31, 23, 0, 0))
-        self.assertEquals(query, expected_query)
+            datetime(2023, 7, 17), datetime(2023, 7, 31, 23, 0, 0))
+        self.assertEquals(query.name, 'li.summary.dim')
+        self.assertIn('WHERE leading_indicator_value_timestamp_utc <= :1', query.sql)
+        self.assertIn('l.uom_metric', query.sql)
+        self.assertNotIn('57ad768c', query.sql)
+        self.assertEquals(query.params, ('2023-07-31 23:00:00',
+            '["57ad768c-4e81-11ed-b701-1cc10cb4aa68", "57ad768c-4e81-11ed-b701-1cc10cb4aa68"]'))
 
     def test_get_snowflake_leading_indicator_summary_target_query(self):
-        db_schema = f'{os.getenv("SNOWFLAKE_DATABASE")}.{os.getenv("SNOWFLAKE_SCHEMA")}'
-        expected_query = f"""
-                        SELECT
-                            di.leading_indicator_id,
-                            lih24h.leading_indicator_inside_envelope_last24h_value p_24h,
-                            lih12h.leading_indicator_inside_envelope_last12h_value p_12h,
-                            lih8h.leading_indicator_inside_envelope_last8h_value p_8h,
-                            lih1h.leading_indicator_inside_envelope_last1h_value p_1h,
-                            di.leading_indicator_display_name
-                                FROM {db_schema}."DIM_LEADING_INDICATOR" di
-                                LEFT JOIN (SELECT leading_indicator_id, leading_indicator_inside_envelope_last1h_value, leading_indicator_value_timestamp_utc, ROW_NUMBER() OVER (PARTITION BY leading_indicator_id ORDER BY leading_indicator_value_timestamp_utc DESC) row_id
-                                FROM {db_schema}."FACT_LEADING_INDICATOR_TARGET_HEALTH"
-                                WHERE leading_indicator_value_timestamp_utc BETWEEN '2023-06-01 00:00:00' AND '2023-06-30 00:00:00'
-                                AND leading_indicator_inside_envelope_last1h_value IS NOT NULL) lih1h
-                                ON lih1h.leading_indicator_id = di.leading_indicator_id AND lih1h.row_id = 1
-                                LEFT JOIN (SELECT leading_indicator_id, leading_indicator_inside_envelope_last8h_value, leading_indicator_value_timestamp_utc, ROW_NUMBER() OVER (PARTITION BY leading_indicator_id ORDER BY leading_indicator_value_timestamp_utc DESC) row_id
-                                FROM {db_schema}."FACT_LEADING_INDICATOR_TARGET_HEALTH"
-                                WHERE leading_indicator_value_timestamp_utc BETWEEN '2023-06-01 00:00:00' AND '2023-06-30 00:00:00' 
-                                AND leading_indicator_inside_envelope_last8h_value IS NOT NULL) lih8h
-                                ON lih8h.leading_indicator_id = di.leading_indicator_id AND lih8h.row_id = 1
-                                LEFT JOIN (SELECT leading_indicator_id, leading_indicator_inside_envelope_last12h_value, leading_indicator_value_timestamp_utc, ROW_NUMBER() OVER (PARTITION BY leading_indicator_id ORDER BY leading_indicator_value_timestamp_utc DESC) row_id
-                                FROM {db_schema}."FACT_LEADING_INDICATOR_TARGET_HEALTH"
-                                WHERE leading_indicator_value_timestamp_utc BETWEEN '2023-06-01 00:00:00' AND '2023-06-30 00:00:00'
-                                AND leading_indicator_inside_envelope_last12h_value IS NOT NULL) lih12h
-                                ON lih12h.leading_indicator_id = di.leading_indicator_id AND lih12h.row_id = 1
-                                LEFT JOIN (SELECT leading_indicator_id, leading_indicator_inside_envelope_last24h_value, leading_indicator_value_timestamp_utc, ROW_NUMBER() OVER (PARTITION BY leading_indicator_id ORDER BY leading_indicator_value_timestamp_utc DESC) row_id
-                                FROM {db_schema}."FACT_LEADING_INDICATOR_TARGET_HEALTH"
-                                WHERE leading_indicator_value_timestamp_utc BETWEEN '2023-06-01 00:00:00' AND '2023-06-30 00:00:00'
-                                AND leading_indicator_inside_envelope_last24h_value IS NOT NULL) lih24h
-                                ON lih24h.leading_indicator_id = di.leading_indicator_id AND lih24h.row_id = 1
-                                WHERE di.leading_indicator_id in (
-                                    SELECT l.leading_indicator_id 
-                                    FROM {db_schema}."DIM_LEADING_INDICATOR" l 
-                                    INNER JOIN {db_schema}."DIM_MTPM" m ON m.mtpm_id = l.mtpm_id 
-                                    WHERE l.mtpm_id IN (['57ad768c-4e81-11ed-b701-1cc10cb4aa68', '57ad768c-4e81-11ed-b701-1cc10cb4aa68']))
-                                ORDER BY p_24h, p_12h, p_8h, p_1h ASC
-                        """
         methods = LeadingIndicators()
-        query = methods.get_li_summary_query(['57ad768c-4e81-11ed-b701-1cc10cb4aa68', '57ad768c-4e81-11ed-b701-1cc10cb4aa68'], datetime(2023,6,1), datetime(2023,6,30), db_schema)
-        self.assertEquals(query, expected_query)
+        query = methods.get_li_summary_query(['57ad768c-4e81-11ed-b701-1cc10cb4aa68', '57ad768c-4e81-11ed-b701-1cc10cb4aa68'], datetime(2023,6,1), datetime(2023,6,30))
+        self.assertEquals(query.name, 'li.summary')
+        self.assertEquals(query.sql.count('BETWEEN :1 AND :2'), 4)
+        self.assertNotIn('2023-06-01', query.sql)
+        self.assertEquals(query.params, ('2023-06-01 00:00:00', '2023-06-30 00:00:00',
+            '["57ad768c-4e81-11ed-b701-1cc10cb4aa68", "57ad768c-4e81-11ed-b701-1cc10cb4aa68"]'))
+
+    def test_statement_numbers_each_placeholder_once(self):
+        statement = Statement('test', "SELECT * FROM {schema}.T WHERE a = :a AND b = :b AND c = :a AND d::VARCHAR = 'HH24:MI'")
+        self.assertEquals(statement.param_names, ['a', 'b'])
+        self.assertTrue(statement.sql.endswith("WHERE a = :1 AND b = :2 AND c = :1 AND d::VARCHAR = 'HH24:MI'"))
+        self.assertEquals(statement.bind(b=2, a=1).params, (1, 2))
+
+    def test_statement_binds_lists_and_datetimes(self):
+        statement = Statement('test', 'SELECT * FROM T WHERE id IN {ids} AND ts <= :end', ids=in_list(':ids'))
+        bound = statement.bind(ids=['a', 'b'], end=datetime(2023, 1, 2, 3, 4, 5))
+        self.assertIn('PARSE_JSON(:1)', bound.sql)
+        self.assertEquals(bound.params, ('["a", "b"]', '2023-01-02 03:04:05'))
+
+    def test_statement_missing_value(self):
+        statement = Statement('test', 'SELECT * FROM T WHERE a = :a')
+        with self.assertRaises(ValueError):
+            statement.bind()
+
+    def test_statement_preferred_uom_falls_back_to_metric(self):
+        self.assertEquals(resolve_uom('imperial'), 'imperial')
+        self.assertEquals(resolve_uom("metric; DROP TABLE T"), 'metric')
 
     @patch.object(LeadingIndicators, 'execute_dim_query')
     @patch.object(LeadingIndicators, 'execute_summary_query')
@@ -2016,6 +2592,74 @@ class SnowflakeTestCase(TestCase):
         self.assertEquals('4c0afefc-4fd6-11ed-b702-f4ee08e53170', results[0]['leading_indicator_id'])
         self.assertEquals(1, len(results))
 
+    def summary_snapshot_rows(self, statement_name, uom):
+        if statement_name == 'li.summary.mtpm':
+            return [('mtpm-a',), ('mtpm-b',)]
+        if statement_name == 'li.summary':
+            return [('li-2', 0, 0, 0, 0, 'Flow'), ('li-3', 0.5, 0.5, 0.5, 0.5, 'Baume'), ('li-1', 1, 1, 1, 1, 'Density')]
+        return [('li-1', 'Density', 14, 8, uom, '%', 'mtpm-a', 'A', '2023-07-17 08:03:08.676', 11.2),
+                ('li-3', 'Baume', 21, 18, uom, '%', 'mtpm-b', 'B', '2023-07-17 08:03:08.676', 20.3),
+                ('li-2', 'Flow', 3217, 1703, uom, '%', 'mtpm-a', 'A', '2023-07-17 08:03:08.676', 199.6)]
+
+    def test_summary_snapshots_refresh_and_lookup(self):
+        from .queries.summaries import SummarySnapshots
+        methods = LeadingIndicators()
+        methods.fetch = MagicMock(side_effect=lambda query: self.summary_snapshot_rows(query.name, 'm3/h' if 'uom_metric' in query.sql else 'gal/min'))
+        snapshots = SummarySnapshots()
+        now = datetime(2023, 7, 18, 12)
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=locmem):
+            self.assertEquals(2, snapshots.refresh(methods, now=now))
+            self.assertEquals(4, methods.fetch.call_count)
+            snapshot = snapshots.lookup(['mtpm-a'], '2023-07-17T12:05:00', '2023-07-18T12:05:00', 'imperial')
+            self.assertEquals(['li-1', 'li-2'], [row[0] for row in snapshot.dim_rows])
+            self.assertEquals('gal/min', snapshot.dim_rows[0][4])
+            self.assertEquals(['li-2', 'li-1'], [row[0] for row in snapshot.summary_rows])
+            self.assertEquals(now, snapshot.computed_at)
+
+            # rows of several MTPMs come back in the order of one query for all of them
+            snapshot = snapshots.lookup(['mtpm-b', 'mtpm-a'], '2023-07-17T12:00:00', '2023-07-18T12:00:00', 'metric')
+            self.assertEquals(['li-1', 'li-3', 'li-2'], [row[0] for row in snapshot.dim_rows])
+            self.assertEquals(['li-2', 'li-3', 'li-1'], [row[0] for row in snapshot.summary_rows])
+            records = methods.get_snowflake_leading_indicator_summary_from_snapshot(snapshot, 2)
+            self.assertEquals(['li-2', 'li-3'], [record['leading_indicator_id'] for record in records])
+        self.assertEquals({'hits': 2, 'misses': 0, 'outside_window': 0, 'refreshes': 1, 'errors': 0}, snapshots.stats())
+
+    def test_summary_snapshots_only_answer_the_live_window(self):
+        from .queries.summaries import SummarySnapshots
+        methods = LeadingIndicators()
+        methods.fetch = MagicMock(side_effect=lambda query: self.summary_snapshot_rows(query.name, 'm3/h'))
+        snapshots = SummarySnapshots()
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with self.settings(CACHES=locmem):
+            snapshots.refresh(methods, now=datetime(2023, 7, 18, 12))
+            self.assertIsNone(snapshots.lookup(['mtpm-a'], '2023-07-18T11:00:00', '2023-07-18T12:00:00', 'metric'))
+            self.assertIsNone(snapshots.lookup(['mtpm-a'], '2023-07-16T12:00:00', '2023-07-17T12:00:00', 'metric'))
+            self.assertIsNone(snapshots.lookup(['mtpm-a', 'mtpm-c'], '2023-07-17T12:00:00', '2023-07-18T12:00:00', 'metric'))
+        self.assertEquals({'hits': 0, 'misses': 1, 'outside_window': 2, 'refreshes': 1, 'errors': 0}, snapshots.stats())
+
+    def test_snowflake_mtpm_leadingindicators_summary_from_snapshot(self):
+        from .queries.summaries import SummarySnapshot
+        authorization = set_auth_header(self.write_access_token)
+        views.leading_indicators = MagicMock()
+        views.leading_indicators.get_snowflake_leading_indicator_summary_from_snapshot.return_value = [{'leading_indicator_id': 'li-1'}]
+        views.leading_indicators.get_snowflake_leading_indicator_summary.return_value = [{'leading_indicator_id': 'li-2'}]
+        snapshot = SummarySnapshot([], [], datetime.utcnow())
+        data = {'mtpm': ['mtpm-a'], 'datetimestart': '2023-07-17T12:00:00', 'datetimeend': '2023-07-18T12:00:00', 'top': 5}
+
+        with patch.object(views.li_summary_snapshots, 'lookup', return_value=snapshot) as lookup:
+            response = self.client.post("/snowflake/mtpm/leadingindicators/summary/", data, format='json', **authorization)
+            content = json.loads(response.content)
+            self.assertEquals([{'leading_indicator_id': 'li-1'}], content['results'])
+            self.assertLess(content['snapshot_age'], 60)
+
+            response = self.client.post("/snowflake/mtpm/leadingindicators/summary/", {**data, 'fresh': 'true'},
+                                        format='json', **authorization)
+            content = json.loads(response.content)
+            self.assertEquals([{'leading_indicator_id': 'li-2'}], content['results'])
+            self.assertIsNone(content['snapshot_age'])
+            lookup.assert_called_once_with(['mtpm-a'], '2023-07-17T12:00:00', '2023-07-18T12:00:00', None)
+
     def get_dim_top_data(self):
         return {'4c0afefc-4fd6-11ed-b702-f4ee08e53170': {
                                     "leading_indicator_id": '4c0afefc-4fd6-11ed-b702-f4ee08e53170',
@@ -0,0 +1,141 @@
+"""
+Timestamp parsing, time zone conversion and epochs, for single values and for whole columns.
+
+helpers.get_datetime_obj, convert_utc_to_local, convert_local_to_utc and get_epoch are thin
+wrappers around the single value functions here; the column functions are what the series
+pipeline (queries/pipeline.py) is built on.
+"""
+import calendar
+from datetime import date, datetime, time
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from dateutil import tz
+from dateutil.parser import parse as dateutil_parse
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # Python 3.8, Django 4 installs the backport there
+    from backports.zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+EPOCH = datetime(1970, 1, 1)
+
+
+@lru_cache(maxsize=None)
+def zone(name):
+    """
+    The tzinfo of a time zone name, created once per name. IANA names are ZoneInfo objects
+    ('America/Costa Rica' is read as 'America/Costa_Rica', as dateutil does); anything else
+    is left to dateutil, which also returns None for names it does not know.
+    """
+    try:
+        return ZoneInfo(name.replace(' ', '_'))
+    except (ZoneInfoNotFoundError, ValueError, TypeError, AttributeError):
+        return tz.gettz(name)
+
+
+def parse(value, timezone=None):
+    """
+    A datetime from a datetime, date or timestamp string, with ``timezone`` set as its tzinfo
+    when given (the wall clock time is kept). Datetimes are used as they are, ISO strings are
+    read with datetime.fromisoformat, and dateutil parses whatever else comes in.
+    """
+    if value is None:
+        return value
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime.combine(value, time())
+    else:
+        value = str(value)
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            parsed = dateutil_parse(value)
+    return parsed if timezone is None else parsed.replace(tzinfo=timezone)
+
+
+def utc_to_local(value, timezone):
+    """The wall clock time of ``value`` read as UTC, converted to ``timezone``."""
+    if value is None:
+        return value
+    return value.replace(tzinfo=zone('UTC')).astimezone(zone(timezone))
+
+
+def local_to_utc(value, timezone):
+    """The wall clock time of ``value`` read in ``timezone``, converted to UTC."""
+    if value is None:
+        return value
+    return value.replace(tzinfo=zone(timezone)).astimezone(zone('UTC'))
+
+
+def epoch(value, local_timezone=None):
+    """
+    Whole seconds since 1970-01-01, counted the way helpers.get_epoch always has. Without
+    ``local_timezone`` the wall clock time of ``value`` counts (strftime('%s') read it in the
+    host's zone, which is UTC on our hosts). With it, the local time of a value in that zone
+    (e.g. from utc_to_local) counts as well; a value in another zone is measured from
+    midnight of 1970-01-01 in ``local_timezone``.
+    """
+    if local_timezone is None:
+        return calendar.timegm(value.timetuple())
+    local = zone(local_timezone)
+    if value.tzinfo is local:
+        return int((value.replace(tzinfo=None) - EPOCH).total_seconds())
+    return int((value - datetime(1970, 1, 1, tzinfo=local)).total_seconds())
+
+
+def wall_times(column):
+    """
+    Timestamps (datetimes or strings) as datetime64[us] wall clock times, NaT for None. Aware
+    values keep their wall clock time, as utc_to_local and epoch treat them.
+    """
+    times = [value if isinstance(value, datetime) and value.tzinfo is None else _wall_time(value) for value in column]
+    # Arrow converts a list of datetimes in C, a lot faster than np.array(..., dtype='datetime64[us]')
+    return pa.array(times, type=pa.timestamp('us')).to_numpy(zero_copy_only=False)
+
+
+def _wall_time(value):
+    if value is None:
+        return None
+    return parse(value).replace(tzinfo=None)
+
+
+def utc_to_local_many(times, timezone):
+    """utc_to_local of wall clock times (see wall_times), as a tz-aware DatetimeIndex."""
+    # pandas converts with its own zone of that name, a lot faster than with a ZoneInfo
+    local = zone(timezone)
+    return pd.DatetimeIndex(times).tz_localize('UTC').tz_convert(getattr(local, 'key', local))
+
+
+def datetimes(local, timezone):
+    """
+    The datetimes of utc_to_local_many(..., timezone), with the tzinfo utc_to_local gives.
+    Wall clock times that occur twice when the clocks go back get fold=1 the second time, as
+    datetime.astimezone sets it.
+    """
+    wall = local.tz_localize(None)
+    tzinfo = zone(timezone)
+    values = [value.replace(tzinfo=tzinfo) for value in wall.to_pydatetime()]
+    first = wall.tz_localize(local.tz, ambiguous=np.ones(len(wall), dtype=bool), nonexistent='NaT')
+    for position in np.flatnonzero(first.asi8 != local.asi8).tolist():
+        values[position] = values[position].replace(fold=1)
+    return values
+
+
+def epochs(times):
+    """
+    epoch of each time, None for NaT: of local times (a tz-aware DatetimeIndex from
+    utc_to_local_many) in their own zone, and of wall clock times as they are.
+    """
+    times = pd.DatetimeIndex(times)
+    # epoch truncates the seconds of local times like int() and floors wall clock ones like strftime('%s')
+    whole = np.floor if times.tz is None else np.trunc
+    seconds = whole((times.tz_localize(None).to_numpy() - np.datetime64(0, 'us')) / np.timedelta64(1, 's'))
+    missing = np.isnan(seconds)
+    results = np.where(missing, 0, seconds).astype(np.int64).tolist()
+    for position in np.flatnonzero(missing).tolist():
+        results[position] = None
+    return results
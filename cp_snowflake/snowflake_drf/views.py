@@ -16,7 +16,8 @@ from rest_framework import viewsets
 from rest_framework.decorators import (
     api_view,
     permission_classes,
-    authentication_classes
+    authentication_classes,
+    renderer_classes
 )
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
@@ -28,14 +29,21 @@ from . import models, serializers, helpers
 
 log = logging.getLogger(__name__)
 
-from django.http import JsonResponse
 from .encoders import MdpJSONEncoder
+from .renderers import EXPORT_RENDERERS, TIME_SERIES_RENDERERS, FastJsonResponse, export_response, is_columnar
+from .streaming import streaming_json_response
 from .queries.methods import SnowflakeWrapper
 from .queries.mtpms import Mtpms
 from .queries.leading_indicators import LeadingIndicators
 from .queries.equipment_tags import EquipmentTags
 from .queries.plant_data import PlantData
-from .queries.serializers import SnowFlakeMTPMRequestSerializer, SnowFlakeBaseResponseSerializer
+from .queries.cache import query_cache
+from .queries.segments import series_segments
+from .queries.coalesce import single_flight
+from .queries.summaries import li_summary_snapshots
+from .queries.downsampling import DOWNSAMPLING_MODES, LTTB
+from .queries.serializers import SnowFlakeMTPMRequestSerializer, SnowFlakeBaseResponseSerializer, \
+    SnowFlakeLeadingIndicatorBatchRequestSerializer
 
 from .AzureADToken import AzureADToken
 from .models import (
@@ -129,11 +137,11 @@ def generate_token_with_sso(request):
             username=username,
             password=password).msgraph_auth()
         if token:
-            return JsonResponse(data={"token": f'{token}'}, status=HTTP_200_OK)
+            return FastJsonResponse(data={"token": f'{token}'}, status=HTTP_200_OK)
         else:
-            return JsonResponse(data={"message": "Failed token Retrieval"}, status=HTTP_400_BAD_REQUEST)
+            return FastJsonResponse(data={"message": "Failed token Retrieval"}, status=HTTP_400_BAD_REQUEST)
 
-    return JsonResponse(data={"message": "Failed token Retrieval"}, status=HTTP_400_BAD_REQUEST)
+    return FastJsonResponse(data={"message": "Failed token Retrieval"}, status=HTTP_400_BAD_REQUEST)
 
 
 @extend_schema(responses={(HTTP_200_OK, 'application/json'): DefaultResponseSerializer})
@@ -157,9 +165,9 @@ def generate_azure_oauth_token(request):
                          resource_id=resource_id).client_credential_auth()
 
     if token:
-        return JsonResponse(data={"token": f'{token}'}, status=HTTP_200_OK)
+        return FastJsonResponse(data={"token": f'{token}'}, status=HTTP_200_OK)
     else:
-        return JsonResponse(data={"message": "Failed token Retrieval"}, status=HTTP_400_BAD_REQUEST)
+        return FastJsonResponse(data={"message": "Failed token Retrieval"}, status=HTTP_400_BAD_REQUEST)
 
 
 @extend_schema(responses={(HTTP_200_OK, 'application/json'): DefaultResponseSerializer})
@@ -183,9 +191,9 @@ def generate_token_with_client_credential(request):
                          resource_id=resource_id).client_credential_auth()
 
     if token:
-        return JsonResponse(data={"token": f'{token}'}, status=HTTP_200_OK)
+        return FastJsonResponse(data={"token": f'{token}'}, status=HTTP_200_OK)
     else:
-        return JsonResponse(data={"message": "Failed token Retrieval"}, status=HTTP_400_BAD_REQUEST)
+        return FastJsonResponse(data={"message": "Failed token Retrieval"}, status=HTTP_400_BAD_REQUEST)
 
 
 @extend_schema(responses={(HTTP_200_OK, 'application/json'): DefaultResponseSerializer})
@@ -476,7 +484,7 @@ class MonthlyFinancialFormMetricValueViewSet(CreateRetrieveUpdateListViewSet):
                                 "metric_value_string": metric_value_string}
                     )
 
-        return JsonResponse({'results': list(self.request.data)}, status=status.HTTP_201_CREATED)      
+        return FastJsonResponse({'results': list(self.request.data)}, status=status.HTTP_201_CREATED)      
 
     def put(self, request, *args, **kwargs):
         return super().update(request, *args, **kwargs)
@@ -522,7 +530,7 @@ class MonthlyFinancialFormMetricValueViewSet(CreateRetrieveUpdateListViewSet):
                                 "metric_value_string": results[0].metric_value_string}
             )
 
-        return JsonResponse({'results': list(self.request.data)}, status=status.HTTP_200_OK)
+        return FastJsonResponse({'results': list(self.request.data)}, status=status.HTTP_200_OK)
 
     @extend_schema(parameters=[
         OpenApiParameter('monthly_financial_form_metric_value_id'),
@@ -918,7 +926,7 @@ def get_snowflake_regions(request):
     region_id = request.query_params.get('region_id') if 'region_id' in request.query_params else ''
 
     response = plant_data.get_snowflake_region_dim_data(region_id)
-    return JsonResponse({'results': list(response)})
+    return FastJsonResponse({'results': list(response)})
 
 
 @extend_schema(parameters=[
@@ -932,7 +940,7 @@ def get_snowflake_plants(request):
     plant_id = request.query_params.get('plant_id') if 'plant_id' in request.query_params else ''
 
     response = plant_data.get_snowflake_plant_dim_data(region_id, plant_id)
-    return JsonResponse({'results': list(response)})
+    return FastJsonResponse({'results': list(response)})
 
 
 @extend_schema(parameters=[
@@ -946,7 +954,7 @@ def get_snowflake_technologies(request):
     plant_technology_id = request.query_params.get('plant_technology_id')
 
     response = plant_data.get_snowflake_plant_technology_dim_data(plant_id, plant_technology_id)
-    return JsonResponse({'results': list(response)})
+    return FastJsonResponse({'results': list(response)})
 
 
 @extend_schema(parameters=[
@@ -958,28 +966,32 @@ def get_snowflake_mptm_list(request):
     plant_technology_id = request.query_params.get('plant_technology_id')
 
     response = mtpms.get_snowflake_mtpm_dim_data(plant_technology_id)
-    return JsonResponse({'results': list(response)})
+    return FastJsonResponse({'results': list(response)})
 
 
 @extend_schema(
     request=SnowFlakeMTPMRequestSerializer,
+    parameters=[
+        OpenApiParameter(name='format', description='columnar to return the time series as parallel lists (epoch, value, ...)')],
     responses={(HTTP_200_OK, 'application/json'): SnowFlakeBaseResponseSerializer})
 @api_view(["POST"])
 @authentication_classes((Client_Credential_Authentication,))
+@renderer_classes(TIME_SERIES_RENDERERS)
 def get_snowflake_mptm_targets(request):
     response = []
+    columnar = is_columnar(request)
 
     mtpm_list = None
     ui_level = None
 
     if 'mtpm' not in request.data and 'ui_level' not in request.data:
-        return JsonResponse({'results': 'Missing the list of mtpm ids or a ui_level filter'})
+        return FastJsonResponse({'results': 'Missing the list of mtpm ids or a ui_level filter'})
 
     if 'plant_technology_id' not in request.data:
-        return JsonResponse({'results': 'Missing the plant_technology_id filter'})
+        return FastJsonResponse({'results': 'Missing the plant_technology_id filter'})
 
     if 'datetimestart' not in request.data or 'datetimeend' not in request.data:
-        return JsonResponse({'results': 'Datetime fields are required'})
+        return FastJsonResponse({'results': 'Datetime fields are required'})
 
     plant_technology_id = request.data['plant_technology_id']
     datetimestart = request.data['datetimestart']
@@ -996,13 +1008,16 @@ def get_snowflake_mptm_targets(request):
         else:
             mtpm_list = request.data['mtpm']
         response = mtpms.get_snowflake_mtpm_target_data_generic(plant_technology_id, datetimestart, datetimeend,
-                                                                  preferred_uom, mtpm_list)
+                                                                  preferred_uom, mtpm_list, columnar=columnar)
     else:
         ui_level = request.data['ui_level']
         response = mtpms.get_snowflake_mtpm_target_data_generic(plant_technology_id, datetimestart,
-                                                                  datetimeend, preferred_uom, None, ui_level)
+                                                                  datetimeend, preferred_uom, None, ui_level,
+                                                                  columnar=columnar)
 
-    return JsonResponse({'results': list(response)})
+    if columnar:
+        return FastJsonResponse(encoder=MdpJSONEncoder, data={'results': list(response)})
+    return FastJsonResponse({'results': list(response)})
 
 
 @extend_schema(
@@ -1013,13 +1028,13 @@ def get_snowflake_mptm_targets(request):
 def get_snowflake_mptm_opportunities(request):
 
     if 'mtpm' not in request.data:
-        return JsonResponse({'results': 'Missing the list of mtpm ids or a ui_level filter'})
+        return FastJsonResponse({'results': 'Missing the list of mtpm ids or a ui_level filter'})
 
     if 'plant_technology_id' not in request.data:
-        return JsonResponse({'results': 'Missing the plant_technology_id filter'})
+        return FastJsonResponse({'results': 'Missing the plant_technology_id filter'})
 
     if 'datetimestart' not in request.data or 'datetimeend' not in request.data:
-        return JsonResponse({'results': 'Datetime fields are required'})
+        return FastJsonResponse({'results': 'Datetime fields are required'})
 
     plant_technology_id = request.data['plant_technology_id']
     datetimestart = request.data['datetimestart']
@@ -1038,7 +1053,7 @@ def get_snowflake_mptm_opportunities(request):
         response = mtpms.get_snowflake_mtpm_target_data_generic(plant_technology_id, datetimestart, datetimeend,
                                                                   preferred_uom, mtpm_list, None, True)
 
-    return JsonResponse({'results': list(response)})
+    return FastJsonResponse({'results': list(response)})
 
 
 @extend_schema(parameters=[
@@ -1052,11 +1067,11 @@ def get_snowflake_mtpm_dim_leading_indicators(request):
     leading_indicator_id = request.query_params.get('leading_indicator_id')
 
     if mtpm_id is None:
-        return JsonResponse({'results': 'Parameter mtpm_id is required'})
+        return FastJsonResponse({'results': 'Parameter mtpm_id is required'})
 
     response = leading_indicators.get_snowflake_leading_indicator_dim_data(mtpm_id, leading_indicator_id)
 
-    return JsonResponse({'results': list(response)})
+    return FastJsonResponse({'results': list(response)})
 
 
 @extend_schema(parameters=[
@@ -1075,15 +1090,15 @@ def get_snowflake_mtpm_metric_leading_indicators(request):
     datetimeend = request.query_params.get('datetimeend')
 
     if mtpm_id is None:
-        return JsonResponse({'results': 'Parameter mtpm_id is required'})
+        return FastJsonResponse({'results': 'Parameter mtpm_id is required'})
 
     if datetimestart is None or datetimeend is None:
-        return JsonResponse({'results': 'Datetime fields are required'})
+        return FastJsonResponse({'results': 'Datetime fields are required'})
 
     response = leading_indicators.get_snowflake_leading_indicator_metric_data(leading_indicator_id, mtpm_id, datetimestart,
                                                                    datetimeend)
 
-    return JsonResponse({'results': list(response)})
+    return FastJsonResponse({'results': list(response)})
 
 
 @extend_schema(parameters=[
@@ -1093,10 +1108,17 @@ def get_snowflake_mtpm_metric_leading_indicators(request):
     OpenApiParameter(name='datetimeend', description='Filter by datetimeend', required=True,
                      type=OpenApiTypes.DATETIME),
     OpenApiParameter(name='preferred_uom', description='Metric or Imperial, used to narrow resultset', required=True),
-    OpenApiParameter(name='timezone', description='Timezone for the time series local conversion', required=True)],
+    OpenApiParameter(name='timezone', description='Timezone for the time series local conversion', required=True),
+    OpenApiParameter(name='stream', description='true to stream the time series as it is read from Snowflake',
+                     type=OpenApiTypes.BOOL),
+    OpenApiParameter(name='max_points', description='Downsample the time series to at most this many points',
+                     type=OpenApiTypes.INT),
+    OpenApiParameter(name='downsampling', description='lttb (default) or minmax, how max_points are picked'),
+    OpenApiParameter(name='format', description='columnar to return the time series as parallel lists (epoch, value, ...)')],
     responses={(HTTP_200_OK, 'application/json'): SnowFlakeBaseResponseSerializer})
 @api_view(["GET"])
 @authentication_classes((Client_Credential_Authentication,))
+@renderer_classes(TIME_SERIES_RENDERERS)
 def get_snowflake_mtpm_metric_leading_indicators_beta(request):
     leading_indicator_id = request.query_params.get('leading_indicator_id')
     mtpm_id = request.query_params.get('mtpm_id')
@@ -1106,21 +1128,74 @@ def get_snowflake_mtpm_metric_leading_indicators_beta(request):
     timezone = request.query_params.get('timezone')
 
     if mtpm_id is None:
-        return JsonResponse({'results': 'Parameter mtpm_id is required'})
+        return FastJsonResponse({'results': 'Parameter mtpm_id is required'})
 
     if datetimestart is None or datetimeend is None:
-        return JsonResponse({'results': 'Datetime fields are required'})
+        return FastJsonResponse({'results': 'Datetime fields are required'})
 
     if preferred_uom is None:
-        return JsonResponse({'results': 'Preferred UOM is required'})
+        return FastJsonResponse({'results': 'Preferred UOM is required'})
 
     if timezone is None:
-        return JsonResponse({'results': 'Timezone is required'})
+        return FastJsonResponse({'results': 'Timezone is required'})
+
+    max_points, downsampling = get_downsampling(request.query_params)
+    if max_points is False:
+        return FastJsonResponse({'results': downsampling})
+
+    columnar = is_columnar(request)
+    if is_streaming(request) and not max_points and not columnar:
+        response = leading_indicators.stream_snowflake_leading_indicator_metric_data_beta(
+            leading_indicator_id, mtpm_id, datetimestart, datetimeend, preferred_uom.lower(), timezone)
+        return streaming_json_response(response)
 
     response = leading_indicators.get_snowflake_leading_indicator_metric_data_beta(leading_indicator_id, mtpm_id, datetimestart,
-                                                                        datetimeend, preferred_uom.lower(), timezone)
+                                                                        datetimeend, preferred_uom.lower(), timezone,
+                                                                        max_points, downsampling, columnar)
+
+    return FastJsonResponse(encoder=MdpJSONEncoder, data={'results': list(response)})
+
+@extend_schema(request=SnowFlakeLeadingIndicatorBatchRequestSerializer,
+               responses={(HTTP_200_OK, 'application/json'): SnowFlakeBaseResponseSerializer})
+@api_view(["POST"])
+@authentication_classes((Client_Credential_Authentication,))
+def get_snowflake_mtpm_metric_leading_indicators_batch(request):
+    '''
+    The beta metrics of several leading indicators at once, read with one dim and one time series query.
+    '''
+    if 'leading_indicator_ids' not in request.data:
+        return FastJsonResponse({'results': 'Missing the list of leading indicator ids'})
+
+    if isinstance(request.data, QueryDict):
+        leading_indicator_ids = request.data.getlist('leading_indicator_ids')
+    else:
+        leading_indicator_ids = request.data['leading_indicator_ids']
+
+    if not leading_indicator_ids or len(leading_indicator_ids) > settings.LI_BATCH_MAX_IDS:
+        return FastJsonResponse({'results': f'Between 1 and {settings.LI_BATCH_MAX_IDS} leading indicator ids are required'})
+
+    datetimestart = request.data.get('datetimestart')
+    datetimeend = request.data.get('datetimeend')
+    preferred_uom = request.data.get('preferred_uom')
+    timezone = request.data.get('timezone')
+
+    if datetimestart is None or datetimeend is None:
+        return FastJsonResponse({'results': 'Datetime fields are required'})
+
+    if preferred_uom is None:
+        return FastJsonResponse({'results': 'Preferred UOM is required'})
+
+    if timezone is None:
+        return FastJsonResponse({'results': 'Timezone is required'})
+
+    max_points, downsampling = get_downsampling(request.data)
+    if max_points is False:
+        return FastJsonResponse({'results': downsampling})
 
-    return JsonResponse(encoder=MdpJSONEncoder, data={'results': list(response)})
+    response = leading_indicators.get_snowflake_leading_indicator_metric_data_batch(
+        leading_indicator_ids, datetimestart, datetimeend, preferred_uom.lower(), timezone, max_points, downsampling)
+
+    return FastJsonResponse(encoder=MdpJSONEncoder, data={'results': list(response)})
 
 @extend_schema(request=SnowFlakeMTPMRequestSerializer,
                responses={(HTTP_200_OK, 'application/json'): SnowFlakeBaseResponseSerializer})
@@ -1129,10 +1204,10 @@ def get_snowflake_mtpm_metric_leading_indicators_beta(request):
 def get_snowflake_mtpm_leading_indicators_summary(request):
     
     if 'mtpm' not in request.data:
-        return JsonResponse({'results': 'Missing the list of mtpm ids filter'})
+        return FastJsonResponse({'results': 'Missing the list of mtpm ids filter'})
 
     if 'datetimestart' not in request.data or 'datetimeend' not in request.data:
-        return JsonResponse({'results': 'Datetime fields are required'})
+        return FastJsonResponse({'results': 'Datetime fields are required'})
 
     datetimestart = request.data['datetimestart']
     datetimeend = request.data['datetimeend']
@@ -1153,9 +1228,18 @@ def get_snowflake_mtpm_leading_indicators_summary(request):
         else:
             mtpm_list = request.data['mtpm']
 
-    response = leading_indicators.get_snowflake_leading_indicator_summary(mtpm_list, datetimestart, datetimeend, preferred_uom, top)
+    # The live 24 hour window is precomputed by Celery beat (see queries/summaries.py), fresh=true
+    # asks Snowflake anyway. snapshot_age is the age of the answer in seconds, None when it is live.
+    fresh = str(request.data.get('fresh', '')).lower() == 'true'
+    snapshot = None if fresh else li_summary_snapshots.lookup(mtpm_list, datetimestart, datetimeend, preferred_uom)
+    if snapshot is None:
+        response = leading_indicators.get_snowflake_leading_indicator_summary(mtpm_list, datetimestart, datetimeend, preferred_uom, top)
+        snapshot_age = None
+    else:
+        response = leading_indicators.get_snowflake_leading_indicator_summary_from_snapshot(snapshot, top)
+        snapshot_age = round(snapshot.age, 1)
 
-    return JsonResponse(encoder=MdpJSONEncoder, data={'results': list(response)})
+    return FastJsonResponse(encoder=MdpJSONEncoder, data={'results': list(response), 'snapshot_age': snapshot_age})
 
 @extend_schema(parameters=[
     OpenApiParameter(name='leading_indicator_id', description='Filter by leading indicator id', required=True),
@@ -1168,11 +1252,11 @@ def get_snowflake_mtpm_dim_equipment_tags(request):
     equipment_tag_id = request.query_params.get('equipment_tag_id')
 
     if leading_indicator_id is None:
-        return JsonResponse({'results': 'Parameter leading_indicator_id is required'})
+        return FastJsonResponse({'results': 'Parameter leading_indicator_id is required'})
 
     response = equipment_tags.get_snowflake_equipment_tag_dim_data(leading_indicator_id, equipment_tag_id)
 
-    return JsonResponse({'results': list(response)})
+    return FastJsonResponse({'results': list(response)})
 
 
 @extend_schema(parameters=[
@@ -1192,15 +1276,15 @@ def get_snowflake_mtpm_metric_equipment_tags(request):
     datetimeend = request.query_params.get('datetimeend')
 
     if leading_indicator_id is None:
-        return JsonResponse({'results': 'Parameter leading_indicator_id is required'})
+        return FastJsonResponse({'results': 'Parameter leading_indicator_id is required'})
 
     if datetimestart is None or datetimeend is None:
-        return JsonResponse({'results': 'Datetime fields are required'})
+        return FastJsonResponse({'results': 'Datetime fields are required'})
 
     response = equipment_tags.get_snowflake_equipment_tag_metric_data(equipment_tag_id, leading_indicator_id, datetimestart,
                                                                datetimeend)
 
-    return JsonResponse({'results': list(response)})
+    return FastJsonResponse({'results': list(response)})
 
 
 @extend_schema(parameters=[
@@ -1211,10 +1295,17 @@ def get_snowflake_mtpm_metric_equipment_tags(request):
                      type=OpenApiTypes.DATETIME),
     OpenApiParameter(name='equipment_tag_id', description='Filter by equipment_tag_id'),
     OpenApiParameter(name='preferred_uom', description='Metric or Imperial, used to narrow resultset', required=True),
-    OpenApiParameter(name='timezone', description='Timezone for the time series local conversion', required=True)],
+    OpenApiParameter(name='timezone', description='Timezone for the time series local conversion', required=True),
+    OpenApiParameter(name='stream', description='true to stream the time series as it is read from Snowflake',
+                     type=OpenApiTypes.BOOL),
+    OpenApiParameter(name='max_points', description='Downsample the time series to at most this many points',
+                     type=OpenApiTypes.INT),
+    OpenApiParameter(name='downsampling', description='lttb (default) or minmax, how max_points are picked'),
+    OpenApiParameter(name='format', description='columnar to return the time series as parallel lists (epoch, value, ...)')],
     responses={(HTTP_200_OK, 'application/json'): SnowFlakeBaseResponseSerializer})
 @api_view(["GET"])
 @authentication_classes((Client_Credential_Authentication,))
+@renderer_classes(TIME_SERIES_RENDERERS)
 def get_snowflake_mtpm_metric_equipment_tags_beta(request):
     leading_indicator_id = request.query_params.get('leading_indicator_id')
     equipment_tag_id = request.query_params.get('equipment_tag_id')
@@ -1224,21 +1315,99 @@ def get_snowflake_mtpm_metric_equipment_tags_beta(request):
     timezone = request.query_params.get('timezone')
 
     if leading_indicator_id is None:
-        return JsonResponse({'results': 'Parameter leading_indicator_id is required'})
+        return FastJsonResponse({'results': 'Parameter leading_indicator_id is required'})
 
     if datetimestart is None or datetimeend is None:
-        return JsonResponse({'results': 'Datetime fields are required'})
+        return FastJsonResponse({'results': 'Datetime fields are required'})
 
     if preferred_uom is None:
-        return JsonResponse({'results': 'Preferred UOM is required'})
+        return FastJsonResponse({'results': 'Preferred UOM is required'})
 
     if timezone is None:
-        return JsonResponse({'results': 'Timezone is required'})
+        return FastJsonResponse({'results': 'Timezone is required'})
+
+    max_points, downsampling = get_downsampling(request.query_params)
+    if max_points is False:
+        return FastJsonResponse({'results': downsampling})
+
+    columnar = is_columnar(request)
+    if is_streaming(request) and not max_points and not columnar:
+        response = equipment_tags.stream_snowflake_equipment_tag_metric_data_beta(
+            equipment_tag_id, leading_indicator_id, datetimestart, datetimeend, preferred_uom.lower(), timezone)
+        return streaming_json_response(response)
 
     response = equipment_tags.get_snowflake_equipment_tag_metric_data_beta(equipment_tag_id, leading_indicator_id,
-                                                                    datetimestart, datetimeend, preferred_uom.lower(), timezone)
+                                                                    datetimestart, datetimeend, preferred_uom.lower(), timezone,
+                                                                    max_points, downsampling, columnar)
+
+    return FastJsonResponse(encoder=MdpJSONEncoder, data={'results': list(response)})
+
+
+@extend_schema(parameters=[
+    OpenApiParameter(name='mtpm', description='Mtpm ids to export, repeated for each mtpm', required=True),
+    OpenApiParameter(name='datetimestart', description='Filter by datetimestart', required=True,
+                     type=OpenApiTypes.DATETIME),
+    OpenApiParameter(name='datetimeend', description='Filter by datetimeend', required=True,
+                     type=OpenApiTypes.DATETIME),
+    OpenApiParameter(name='preferred_uom', description='Metric or Imperial, used to narrow resultset', required=True),
+    OpenApiParameter(name='format', description='arrow (Arrow IPC stream) or parquet, or pick one with the Accept header')],
+    responses={(HTTP_200_OK, 'application/vnd.apache.arrow.stream'): OpenApiTypes.BINARY,
+               (HTTP_200_OK, 'application/vnd.apache.parquet'): OpenApiTypes.BINARY})
+@api_view(["GET"])
+@authentication_classes((Client_Credential_Authentication,))
+@renderer_classes(EXPORT_RENDERERS)
+def export_snowflake_mtpm_metrics(request):
+    mtpm_list = request.query_params.getlist('mtpm')
+    datetimestart = request.query_params.get('datetimestart')
+    datetimeend = request.query_params.get('datetimeend')
+    preferred_uom = request.query_params.get('preferred_uom')
+
+    if not mtpm_list:
+        return FastJsonResponse({'results': 'Missing the list of mtpm ids'})
+
+    if datetimestart is None or datetimeend is None:
+        return FastJsonResponse({'results': 'Datetime fields are required'})
+
+    if preferred_uom is None:
+        return FastJsonResponse({'results': 'Preferred UOM is required'})
+
+    batches = mtpms.export_mtpm_time_series(datetimestart, datetimeend, preferred_uom.lower(), mtpm_list)
+    return export_response(request, batches, 'mtpm_metrics')
+
+
+@extend_schema(parameters=[
+    OpenApiParameter(name='mtpm_id', description='Filter by mtpm id', required=True),
+    OpenApiParameter(name='leading_indicator_id', description='Filter by leading indicator id'),
+    OpenApiParameter(name='datetimestart', description='Filter by datetimestart', required=True,
+                     type=OpenApiTypes.DATETIME),
+    OpenApiParameter(name='datetimeend', description='Filter by datetimeend', required=True,
+                     type=OpenApiTypes.DATETIME),
+    OpenApiParameter(name='preferred_uom', description='Metric or Imperial, used to narrow resultset', required=True),
+    OpenApiParameter(name='format', description='arrow (Arrow IPC stream) or parquet, or pick one with the Accept header')],
+    responses={(HTTP_200_OK, 'application/vnd.apache.arrow.stream'): OpenApiTypes.BINARY,
+               (HTTP_200_OK, 'application/vnd.apache.parquet'): OpenApiTypes.BINARY})
+@api_view(["GET"])
+@authentication_classes((Client_Credential_Authentication,))
+@renderer_classes(EXPORT_RENDERERS)
+def export_snowflake_mtpm_metric_leading_indicators(request):
+    leading_indicator_id = request.query_params.get('leading_indicator_id')
+    mtpm_id = request.query_params.get('mtpm_id')
+    datetimestart = request.query_params.get('datetimestart')
+    datetimeend = request.query_params.get('datetimeend')
+    preferred_uom = request.query_params.get('preferred_uom')
 
-    return JsonResponse(encoder=MdpJSONEncoder, data={'results': list(response)})
+    if mtpm_id is None and leading_indicator_id is None:
+        return FastJsonResponse({'results': 'Parameter mtpm_id is required'})
+
+    if datetimestart is None or datetimeend is None:
+        return FastJsonResponse({'results': 'Datetime fields are required'})
+
+    if preferred_uom is None:
+        return FastJsonResponse({'results': 'Preferred UOM is required'})
+
+    batches = leading_indicators.export_leading_indicator_time_series(leading_indicator_id, mtpm_id, datetimestart,
+                                                                      datetimeend, preferred_uom.lower())
+    return export_response(request, batches, 'leading_indicator_metrics')
 
 '''
 Monitoring methods
@@ -1293,6 +1462,51 @@ def snowflake_is_usable(request):
     status_code = status.HTTP_200_OK if is_usable else status.HTTP_400_BAD_REQUEST
     return Response(data={'results': status_desc}, status=status_code)
 
+@extend_schema(parameters=[],
+    responses={(HTTP_200_OK, 'application/json'): DefaultResponseSerializer})
+@api_view(["GET"])
+@authentication_classes((Client_Credential_Authentication,))
+def snowflake_connection_stats(request):
+    '''
+    Report the Snowflake connection pool, query retry, query cache, series segment cache,
+    query coalescing and summary snapshot statistics of the worker serving the request.
+    '''
+    return Response(data={'results': {'pool': wrapper.pool_stats(), 'retries': wrapper.retry_stats(),
+                                      'cache': query_cache.stats(), 'segments': series_segments.stats(),
+                                      'coalescing': single_flight.stats(),
+                                      'summary_snapshots': li_summary_snapshots.stats()}},
+                    status=status.HTTP_200_OK)
+
+@extend_schema(parameters=[],
+    responses={(HTTP_200_OK, 'application/json'): DefaultResponseSerializer})
+@api_view(["GET"])
+@authentication_classes((Client_Credential_Authentication,))
+def snowflake_query_stats(request):
+    '''
+    Report p50/p95/p99 latency, rows and bytes per query tag for the recent Snowflake queries
+    of the worker serving the request.
+    '''
+    return Response(data={'results': wrapper.query_stats()}, status=status.HTTP_200_OK)
+
+def is_streaming(request):
+    return request.query_params.get('stream', '').lower() == 'true'
+
+
+def get_downsampling(params):
+    # (max_points, downsampling) of a time series request's query params or body, max_points is
+    # None without downsampling and False when the parameters are invalid (downsampling is the
+    # message then)
+    max_points = params.get('max_points')
+    downsampling = str(params.get('downsampling', LTTB)).lower()
+    if max_points is None:
+        return None, downsampling
+    if not str(max_points).isdigit() or int(max_points) < 2:
+        return False, 'Parameter max_points must be an integer of at least 2'
+    if downsampling not in DOWNSAMPLING_MODES:
+        return False, f'Parameter downsampling must be one of {", ".join(DOWNSAMPLING_MODES)}'
+    return int(max_points), downsampling
+
+
 # helper function to decode nested filter calls
 def decode_response(response):
     decoded = response.decode("UTF-8")
@@ -1,5 +1,7 @@
 import json
 import os
+import time
+from contextlib import contextmanager
 
 import django.http
 import requests
@@ -17,8 +19,13 @@ from .features import DatabaseFeatures  # NOQA isort:skip
 from .introspection import DatabaseIntrospection  # NOQA isort:skip
 from .operations import DatabaseOperations  # NOQA isort:skip
 from .schema import DatabaseSchemaEditor  # NOQA isort:skip
+from .pool import SnowflakeConnectionPool  # NOQA isort:skip
+from .retry import RetryPolicy  # NOQA isort:skip
+from .telemetry import QueryTelemetry, result_bytes  # NOQA isort:skip
+from .deadline import DeadlineExceeded, current_deadline, remaining, statement_timeout  # NOQA isort:skip
 from snowflake_drf.AzureADToken import AzureADToken
 import logging
+import threading
 
 
 log = logging.getLogger(__name__)
@@ -100,11 +107,79 @@ class SnowflakeWrapper(BaseDatabaseWrapper):
 
     auth_token = ""
 
+    # one pool is shared by every wrapper instance in the process. It is created on
+    # first use and keyed on the PID, so a forked worker never reuses sockets or
+    # sessions inherited from its parent.
+    _pool = None
+    _pool_pid = None
+    _pool_lock = threading.Lock()
+    _retry_policy = None
+    _telemetry = None
+
     def __init__(self):
-        self.connection = self.get_new_connection({})
+        # connections are established lazily by the pool on the first query
+        pass
+
+    @property
+    def pool(self):
+        return self.get_pool()
+
+    def get_pool(self):
+        pid = os.getpid()
+        with SnowflakeWrapper._pool_lock:
+            if SnowflakeWrapper._pool is None or SnowflakeWrapper._pool_pid != pid:
+                SnowflakeWrapper._pool = SnowflakeConnectionPool(
+                    connect=lambda: self.get_new_connection({}),
+                    max_size=settings.SNOWFLAKE_POOL_SIZE,
+                    max_age=settings.SNOWFLAKE_POOL_MAX_AGE,
+                    validate_after=settings.SNOWFLAKE_POOL_VALIDATE_AFTER,
+                    timeout=settings.SNOWFLAKE_POOL_TIMEOUT)
+                SnowflakeWrapper._pool_pid = pid
+            return SnowflakeWrapper._pool
+
+    @property
+    def retry_policy(self):
+        with SnowflakeWrapper._pool_lock:
+            if SnowflakeWrapper._retry_policy is None:
+                SnowflakeWrapper._retry_policy = RetryPolicy(
+                    attempts=settings.SNOWFLAKE_RETRY_ATTEMPTS,
+                    base_delay=settings.SNOWFLAKE_RETRY_BASE_DELAY,
+                    max_delay=settings.SNOWFLAKE_RETRY_MAX_DELAY,
+                    budget=settings.SNOWFLAKE_RETRY_BUDGET)
+            return SnowflakeWrapper._retry_policy
+
+    @property
+    def telemetry(self):
+        with SnowflakeWrapper._pool_lock:
+            if SnowflakeWrapper._telemetry is None:
+                SnowflakeWrapper._telemetry = QueryTelemetry(settings.SNOWFLAKE_TELEMETRY_SIZE)
+            return SnowflakeWrapper._telemetry
+
+    @classmethod
+    def _forget_pool(cls):
+        # Runs in the child after a fork. The inherited connections still belong to the
+        # parent, so they are dropped without being closed (closing would log the parent's
+        # sessions out of Snowflake).
+        cls._pool = None
+        cls._pool_pid = None
+        cls._retry_policy = None
+        cls._telemetry = None
+        cls._pool_lock = threading.Lock()
 
     def is_connection_available(self):
-        return self.connection is not None
+        if self.pool.has_connections():
+            return True
+        with self.pool.connection() as connection:
+            return connection is not None
+
+    def pool_stats(self):
+        return self.pool.stats()
+
+    def retry_stats(self):
+        return self.retry_policy.stats()
+
+    def query_stats(self):
+        return self.telemetry.summary()
 
     def get_connection_params(self):
         conn_params = {
@@ -113,8 +188,13 @@ class SnowflakeWrapper(BaseDatabaseWrapper):
             'account': settings.SNOWFLAKE_ACCOUNT,
             'warehouse': settings.SNOWFLAKE_WAREHOUSE,
             'database': settings.SNOWFLAKE_DATABASE,
-            'schema': settings.SNOWFLAKE_SCHEMA
+            'schema': settings.SNOWFLAKE_SCHEMA,
+            # values are bound server side as :1, :2 ... (see snowflake_drf/queries/statements.py)
+            'paramstyle': 'numeric'
         }
+        if settings.SNOWFLAKE_STATEMENT_TIMEOUT:
+            # server side ceiling for statements run without a request deadline (e.g. tasks)
+            conn_params['session_parameters']['STATEMENT_TIMEOUT_IN_SECONDS'] = settings.SNOWFLAKE_STATEMENT_TIMEOUT
 
         if settings.SNOWFLAKE_CONNECTION_MODE == 'oauth':
             self.get_auth_token()
@@ -139,7 +219,7 @@ class SnowflakeWrapper(BaseDatabaseWrapper):
 
         return conn_params
 
-    def get_auth_token(self):
+    def get_auth_token(self, force_refresh=False):
         # Azure Auth Configurations
         client_id = settings.SNOWFLAKE_OAUTH_CLIENT_ID  # Client credential app registration id
         client_secret = settings.SNOWFLAKE_OAUTH_CLIENT_SECRET  # Client credential app registration secret
@@ -149,7 +229,7 @@ class SnowflakeWrapper(BaseDatabaseWrapper):
         self.auth_token = AzureADToken(tenant_id=tenant_id,
                                        client_id=client_id,
                                        client_secret=client_secret,
-                                       resource_id=resource_id).client_credential_auth()
+                                       resource_id=resource_id).client_credential_auth(force_refresh)
         return
 
     def get_new_connection(self, conn_params):
@@ -161,7 +241,8 @@ class SnowflakeWrapper(BaseDatabaseWrapper):
         except ForbiddenError as auth_err:
             # todo check for specific error number e.g. auth_err errno
             # todo this is dependent on reproduction of the error (having a test environment)
-            self.get_auth_token()
+            # the cached token was rejected, so ask Azure for a new one
+            self.get_auth_token(force_refresh=True)
             conn_params['token'] = self.auth_token
             conn_params['authenticator'] = settings.SNOWFLAKE_CONNECTION_MODE
             connection = Database.connect(**conn_params)
@@ -184,38 +265,137 @@ class SnowflakeWrapper(BaseDatabaseWrapper):
         with self.wrap_database_errors:
             self.connection.autocommit(autocommit)
 
-    def validate_and_execute(self, query):
-        result = []
-        if self.connection is None:
-            log.debug('snowflake connection is closed')
-            self.connection = self.get_new_connection({})
+    def _run(self, cursor, query, params=None, deadline=None, tag=None):
+        """
+        Execute on ``cursor`` within the request's deadline (see deadline.py). When the
+        deadline passes, the connector aborts the running statement and the query is also
+        cancelled by its id, in case it is still running. ``tag`` is sent as the
+        statement's QUERY_TAG.
+        """
+        options = {'_statement_params': {'QUERY_TAG': tag}} if tag else {}
+        deadline = current_deadline() if deadline is None else deadline
+        timeout = statement_timeout(deadline)
+        if timeout is None:
+            return cursor.execute(query, params, **options)
+        try:
+            return cursor.execute(query, params, timeout=timeout, **options)
+        except Database.Error as err:
+            if remaining(deadline) > 0:
+                raise
+            self.cancel_query(cursor)
+            raise DeadlineExceeded(f'snowflake query {cursor.sfqid} was cancelled at the request deadline') from err
+
+    @contextmanager
+    def _measure(self, cursor, tag):
+        # records the execution on cursor in the query telemetry, failed ones included
+        started = time.monotonic()
+        error = None
+        try:
+            yield
+        except BaseException as err:
+            error = type(err).__name__
+            raise
+        finally:
+            self.telemetry.record(tag, cursor.sfqid, time.monotonic() - started,
+                                  cursor.rowcount, result_bytes(cursor), error)
+
+    def cancel_query(self, cursor):
+        if not cursor.sfqid:
+            return
         try:
-            with self.connection.cursor() as cursor:
-                result = cursor.execute(query).fetchall()
-                cursor.close()
-        except Database.Error as e:
-            log.error(e)
-            log.debug('closing and refreshing unhealthy snowflake connection')
-            self.connection.close()
-            self.connection = self.get_new_connection({})
-            for i in range(0, 2):
-                if len(result) == 0:
-                    log.debug(f'snowflake query retry #{i+1}')
-                    with self.connection.cursor() as cursor:
-                        result = cursor.execute(query).fetchall()
-                        cursor.close()
-                else:
-                    break
-
-        return result
+            cursor.abort_query(cursor.sfqid)
+        except Database.Error as err:
+            log.debug(f'could not cancel snowflake query {cursor.sfqid}: {err}')
+
+    def _fetchall(self, connection, query, params=None, tag=None):
+        with connection.cursor() as cursor, self._measure(cursor, tag):
+            return self._run(cursor, query, params, tag=tag).fetchall()
+
+    def _fetch_arrow(self, connection, query, params=None, tag=None):
+        # fetch_arrow_all() returns None when the query produced no rows
+        with connection.cursor() as cursor, self._measure(cursor, tag):
+            return self._run(cursor, query, params, tag=tag).fetch_arrow_all()
+
+    def _execute(self, fetch, query, params=None, result=None, tag=None):
+        def attempt():
+            # the pool discards a connection that raised, so a retry gets a fresh one
+            with self.pool.connection() as connection:
+                if connection is None:
+                    log.debug('snowflake connection is unavailable')
+                    return result
+                return fetch(connection, query, params, tag)
+
+        return self.retry_policy.run(attempt, on_auth_error=self.refresh_credentials)
+
+    def refresh_credentials(self):
+        # Idle connections were opened with the rejected token, so they are closed and
+        # the retry connects with a new one.
+        if settings.SNOWFLAKE_CONNECTION_MODE == 'oauth':
+            self.get_auth_token(force_refresh=True)
+        self.pool.close_all()
+
+    def validate_and_execute(self, query, params=None, tag=None):
+        return self._execute(self._fetchall, query, params, [], tag)
+
+    def validate_and_execute_arrow(self, query, params=None, tag=None):
+        """
+        Same as validate_and_execute but returns the result as a pyarrow.Table, straight from
+        the connector's Arrow result batches. Returns None when there are no rows.
+        """
+        return self._execute(self._fetch_arrow, query, params, tag=tag)
+
+    def stream_execute(self, query, params=None, batch_size=None, tag=None):
+        """
+        Generator over the rows of a query, read from the cursor ``batch_size`` rows at a time.
+        The pooled connection is held until the generator is exhausted or closed. Unlike
+        validate_and_execute there is no retry, since rows may already have been passed on.
+        """
+        # The rows are usually read after the view has returned, so the request's deadline
+        # is taken now rather than when the generator starts.
+        return self._stream(query, params, batch_size or settings.SNOWFLAKE_STREAM_BATCH_SIZE, current_deadline(), tag)
+
+    def _stream(self, query, params, batch_size, deadline, tag=None):
+        with self.pool.connection() as connection:
+            if connection is None:
+                log.debug('snowflake connection is unavailable')
+                return
+            with connection.cursor() as cursor, self._measure(cursor, tag):
+                self._run(cursor, query, params, deadline, tag)
+                while True:
+                    if deadline is not None and remaining(deadline) <= 0:
+                        raise DeadlineExceeded('the request deadline passed while streaming query results')
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    yield from rows
+
+    def stream_execute_arrow(self, query, params=None, tag=None):
+        """
+        Generator over the result of a query as pyarrow.RecordBatches, one result chunk of the
+        connector (fetch_arrow_batches) at a time. Like stream_execute, the pooled connection
+        is held until the generator is exhausted or closed and there is no retry.
+        """
+        return self._stream_arrow(query, params, current_deadline(), tag)
+
+    def _stream_arrow(self, query, params, deadline, tag=None):
+        with self.pool.connection() as connection:
+            if connection is None:
+                log.debug('snowflake connection is unavailable')
+                return
+            with connection.cursor() as cursor, self._measure(cursor, tag):
+                self._run(cursor, query, params, deadline, tag)
+                for table in cursor.fetch_arrow_batches():
+                    if deadline is not None and remaining(deadline) <= 0:
+                        raise DeadlineExceeded('the request deadline passed while streaming query results')
+                    yield from table.to_batches()
 
     def is_usable(self):
-        if self.connection is None:
-            return False
         try:
-            with self.connection.cursor() as cursor:
-                cursor.execute('SELECT current_version()')
-                cursor.close()
+            with self.pool.connection() as connection:
+                if connection is None:
+                    return False
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT current_version()')
         except Database.Error:
             return False
         else:
@@ -226,3 +406,7 @@ class SnowflakeWrapper(BaseDatabaseWrapper):
             BaseDatabaseWrapper._rollback(self)
         except Database.NotSupportedError:
             pass
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=SnowflakeWrapper._forget_pool)
@@ -0,0 +1,55 @@
+import contextvars
+import math
+import time
+from contextlib import contextmanager
+
+
+# time.monotonic() by which the queries of the current request must have finished
+_deadline = contextvars.ContextVar('snowflake_query_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a query would start, or keep running, past the request's deadline."""
+
+
+@contextmanager
+def query_deadline(seconds):
+    """
+    Give the queries run inside the block ``seconds`` to finish. Nested deadlines never
+    extend an outer one. ``seconds`` of None or 0 leaves the current deadline as it is.
+    Also usable as a view decorator.
+    """
+    deadline = _deadline.get()
+    if seconds:
+        ends_at = time.monotonic() + seconds
+        deadline = ends_at if deadline is None else min(deadline, ends_at)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+
+def current_deadline():
+    return _deadline.get()
+
+
+def remaining(deadline=None):
+    """Seconds left until ``deadline`` (default: the current one), or None without a deadline."""
+    deadline = current_deadline() if deadline is None else deadline
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def statement_timeout(deadline=None):
+    """
+    Whole seconds for ``cursor.execute(timeout=...)``. Returns None without a deadline and
+    raises DeadlineExceeded once it has passed.
+    """
+    seconds = remaining(deadline)
+    if seconds is None:
+        return None
+    if seconds <= 0:
+        raise DeadlineExceeded('the request deadline passed before the query could run')
+    return max(1, math.ceil(seconds))
@@ -0,0 +1,199 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import snowflake.connector as Database
+
+
+log = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection could be checked out in time."""
+
+
+class PooledConnection:
+    """A raw connector connection plus the bookkeeping the pool needs."""
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def age(self):
+        return time.monotonic() - self.created_at
+
+    def idle_for(self):
+        return time.monotonic() - self.last_used
+
+    def close(self):
+        try:
+            self.raw.close()
+        except Exception as err:
+            log.debug(f'error while closing pooled snowflake connection: {err}')
+
+
+class SnowflakeConnectionPool:
+    """
+    Bounded, thread-safe pool of Snowflake connections.
+
+    At most ``max_size`` connections exist at any time (idle plus checked out).
+    Connections older than ``max_age`` seconds are recycled on checkout, and a
+    connection that sat idle for longer than ``validate_after`` seconds is pinged
+    before being handed out.
+    """
+
+    def __init__(self, connect, max_size=4, max_age=3600, validate_after=60, timeout=30):
+        self._connect = connect
+        self.max_size = max_size
+        self.max_age = max_age
+        self.validate_after = validate_after
+        self.timeout = timeout
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._in_use = 0
+        self._counters = {
+            'checkouts': 0,
+            'created': 0,
+            'reused': 0,
+            'recycled': 0,
+            'discarded': 0,
+            'failed_validations': 0,
+            'timeouts': 0,
+            'connect_failures': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _is_healthy(self, pooled):
+        try:
+            if pooled.raw.is_closed():
+                return False
+            if pooled.idle_for() < self.validate_after:
+                return True
+            with pooled.raw.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Database.Error as err:
+            log.debug(f'pooled snowflake connection failed validation: {err}')
+            return False
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                pooled = self._idle.pop()
+
+            if self.max_age and pooled.age() >= self.max_age:
+                log.debug('recycling snowflake connection that reached its max age')
+                pooled.close()
+                self._count('recycled')
+                continue
+            if not self._is_healthy(pooled):
+                pooled.close()
+                self._count('failed_validations')
+                continue
+            return pooled
+
+    def checkout(self):
+        """
+        Return a healthy PooledConnection, or None when no connection could be made.
+        Blocks up to ``timeout`` seconds while the pool is exhausted.
+        """
+        if not self._slots.acquire(timeout=self.timeout):
+            self._count('timeouts')
+            raise PoolTimeout(f'no snowflake connection available after {self.timeout}s')
+
+        try:
+            pooled = self._take_idle()
+            if pooled is not None:
+                self._count('reused')
+            else:
+                raw = self._connect()
+                if raw is None:
+                    self._count('connect_failures')
+                    self._slots.release()
+                    return None
+                pooled = PooledConnection(raw)
+                self._count('created')
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._in_use += 1
+            self._counters['checkouts'] += 1
+        return pooled
+
+    def checkin(self, pooled):
+        pooled.last_used = time.monotonic()
+        with self._lock:
+            self._in_use -= 1
+            self._idle.append(pooled)
+        self._slots.release()
+
+    def discard(self, pooled):
+        """Close a checked out connection instead of returning it to the pool."""
+        pooled.close()
+        with self._lock:
+            self._in_use -= 1
+            self._counters['discarded'] += 1
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """
+        Check out a raw connector connection for the duration of the block.
+        Connections that raise a connector error are discarded rather than reused.
+        Yields None when Snowflake could not be reached.
+        """
+        pooled = self.checkout()
+        if pooled is None:
+            yield None
+            return
+        try:
+            yield pooled.raw
+        except Database.Error:
+            self.discard(pooled)
+            raise
+        except BaseException:
+            self.checkin(pooled)
+            raise
+        else:
+            self.checkin(pooled)
+
+    def fill(self, count=1):
+        """Open up to ``count`` idle connections ahead of the first request."""
+        opened = []
+        for _ in range(count):
+            pooled = self.checkout()
+            if pooled is None:
+                break
+            opened.append(pooled)
+        for pooled in opened:
+            self.checkin(pooled)
+
+    def has_connections(self):
+        with self._lock:
+            return bool(self._idle) or self._in_use > 0
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for pooled in idle:
+            pooled.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_size': self.max_size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                **self._counters,
+            }
@@ -0,0 +1,120 @@
+import logging
+import random
+import threading
+import time
+
+import snowflake.connector as Database
+from snowflake.connector.errors import ForbiddenError
+
+from .deadline import remaining
+
+
+log = logging.getLogger(__name__)
+
+RETRYABLE = 'retryable'
+AUTH_REFRESH = 'auth_refresh'
+FATAL = 'fatal'
+
+# Authentication token expired, invalid OAuth access token, OAuth access token expired
+AUTH_REFRESH_ERRNOS = {390114, 390303, 390318}
+
+# The statement itself is wrong (compilation errors, bad data, unsupported features, ...),
+# so running it again gives the same error.
+FATAL_ERRORS = (Database.ProgrammingError, Database.DataError, Database.IntegrityError,
+                Database.NotSupportedError)
+
+
+def classify(error):
+    """
+    Sort a connector error into RETRYABLE, AUTH_REFRESH or FATAL.
+
+    Network, HTTP 5xx/429 and other operational errors are retryable, rejected or expired
+    tokens need new credentials before a retry, and errors raised by the statement itself are fatal.
+    """
+    if isinstance(error, ForbiddenError) or getattr(error, 'errno', None) in AUTH_REFRESH_ERRNOS:
+        return AUTH_REFRESH
+    if isinstance(error, FATAL_ERRORS):
+        return FATAL
+    return RETRYABLE
+
+
+class RetryPolicy:
+    """
+    Runs a query call and retries it when it raises a retryable connector error.
+
+    At most ``attempts`` calls are made, waiting a random time between zero and
+    ``base_delay * 2 ** retry`` seconds (capped at ``max_delay``) before each retry. A call
+    and its retries may take at most ``budget`` seconds. A retry is not started when its
+    backoff would end after the budget. A call that returns is never repeated, even when
+    its result is empty.
+    """
+
+    def __init__(self, attempts=3, base_delay=0.5, max_delay=8, budget=30, sleep=time.sleep):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._counters = {
+            'calls': 0,
+            'retries': 0,
+            'recovered': 0,
+            RETRYABLE: 0,
+            AUTH_REFRESH: 0,
+            FATAL: 0,
+            'attempts_exhausted': 0,
+            'budget_exhausted': 0,
+        }
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def backoff(self, retry):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+    def run(self, call, on_auth_error=None):
+        """
+        Return ``call()``, retrying it as described above. ``on_auth_error`` is called
+        before retrying an AUTH_REFRESH error. The last error is raised when the call is
+        fatal or runs out of attempts or budget.
+        """
+        self._count('calls')
+        started = time.monotonic()
+        retry = 0
+        while True:
+            try:
+                result = call()
+            except Database.Error as err:
+                kind = classify(err)
+                self._count(kind)
+                log.warning(f'snowflake query failed ({kind}): {err}')
+                if kind == FATAL:
+                    raise
+                if retry + 1 >= self.attempts:
+                    self._count('attempts_exhausted')
+                    raise
+                delay = self.backoff(retry)
+                left = remaining()
+                if time.monotonic() - started + delay > self.budget or (left is not None and delay >= left):
+                    self._count('budget_exhausted')
+                    raise
+                if kind == AUTH_REFRESH and on_auth_error is not None:
+                    on_auth_error()
+                retry += 1
+                self._count('retries')
+                log.debug(f'snowflake query retry #{retry} in {delay:.2f}s')
+                self._sleep(delay)
+            else:
+                if retry:
+                    self._count('recovered')
+                return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'attempts': self.attempts,
+                'budget': self.budget,
+                **self._counters,
+            }
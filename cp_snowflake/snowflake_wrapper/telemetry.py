@@ -0,0 +1,78 @@
+import math
+import threading
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+UNTAGGED = 'untagged'
+
+
+class QueryRecord(NamedTuple):
+    tag: str
+    query_id: Optional[str]
+    duration: float  # seconds, from execute until the last row was read
+    rows: int
+    bytes: int
+    error: Optional[str]
+    finished_at: float  # time.time()
+
+
+def result_bytes(cursor):
+    # Uncompressed size of the result chunks downloaded for the query. The first chunk that
+    # comes inline with the query response reports no size, so small results count as 0.
+    batches = cursor.get_result_batches() or []
+    return sum(batch.uncompressed_size or 0 for batch in batches)
+
+
+def percentile(ordered, fraction):
+    # nearest-rank percentile of an already sorted list
+    if not ordered:
+        return None
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class QueryTelemetry:
+    """
+    In-process ring buffer of the last ``size`` query executions.
+
+    Each record holds the call site's tag (the Statement name, also sent to Snowflake as
+    QUERY_TAG), the Snowflake query id, the wall time, the row count and the fetched bytes,
+    so slow or expensive builders can be found per tag and looked up in QUERY_HISTORY.
+    """
+
+    def __init__(self, size=5000):
+        self._records = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, tag, query_id, duration, rows=0, bytes=0, error=None):
+        record = QueryRecord(tag or UNTAGGED, query_id, duration, rows or 0, bytes or 0, error, time.time())
+        with self._lock:
+            self._records.append(record)
+        return record
+
+    def records(self, tag=None):
+        with self._lock:
+            records = list(self._records)
+        return [record for record in records if tag is None or record.tag == tag]
+
+    def summary(self):
+        """Per tag: number of queries, errors, p50/p95/p99/max latency in ms, rows and bytes."""
+        by_tag = {}
+        for record in self.records():
+            by_tag.setdefault(record.tag, []).append(record)
+
+        summary = {}
+        for tag, records in sorted(by_tag.items()):
+            durations = sorted(record.duration * 1000 for record in records)
+            summary[tag] = {
+                'count': len(records),
+                'errors': sum(1 for record in records if record.error),
+                'p50_ms': round(percentile(durations, 0.50), 1),
+                'p95_ms': round(percentile(durations, 0.95), 1),
+                'p99_ms': round(percentile(durations, 0.99), 1),
+                'max_ms': round(durations[-1], 1),
+                'rows': sum(record.rows for record in records),
+                'bytes': sum(record.bytes for record in records),
+                'last_query_id': records[-1].query_id,
+            }
+        return summary
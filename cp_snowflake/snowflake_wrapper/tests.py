@@ -1,7 +1,16 @@
+import os
+import threading
+
+import pyarrow as pa
+import snowflake.connector as Database
 from django.test import TestCase
 from unittest.mock import MagicMock, patch
 
 from snowflake_wrapper.base import SnowflakeWrapper
+from snowflake_wrapper.pool import PooledConnection, PoolTimeout, SnowflakeConnectionPool
+from snowflake_wrapper.deadline import DeadlineExceeded, query_deadline, remaining, statement_timeout
+from snowflake_wrapper.telemetry import QueryTelemetry, percentile
+from snowflake_wrapper.retry import AUTH_REFRESH, FATAL, RETRYABLE, RetryPolicy, classify
 
 
 class SnowflakeWrapperTests(TestCase):
@@ -12,3 +21,390 @@ class SnowflakeWrapperTests(TestCase):
         conn = snowflake_wrapper_mock.get_new_connection({})
         self.assertIsNotNone(conn)
 
+
+
+class SnowflakeWrapperLazyConnectionTests(TestCase):
+
+    def setUp(self):
+        SnowflakeWrapper._forget_pool()
+
+    def tearDown(self):
+        SnowflakeWrapper._forget_pool()
+
+    @patch('snowflake_wrapper.base.Database.connect')
+    def test_wrapper_does_not_connect_on_init(self, connect_mock):
+        SnowflakeWrapper()
+        SnowflakeWrapper()
+        connect_mock.assert_not_called()
+
+    @patch.object(SnowflakeWrapper, 'get_connection_params', return_value={'account': 'test'})
+    @patch('snowflake_wrapper.base.Database.connect')
+    def test_first_query_connects(self, connect_mock, _):
+        connect_mock.return_value.is_closed.return_value = False
+        connect_mock.return_value.cursor.return_value.__enter__.return_value.execute.return_value.fetchall.return_value = [(1,)]
+        wrapper = SnowflakeWrapper()
+        self.assertEqual([(1,)], wrapper.validate_and_execute('SELECT 1'))
+        self.assertEqual([(1,)], wrapper.validate_and_execute('SELECT 1'))
+        connect_mock.assert_called_once()
+
+    @patch.object(SnowflakeWrapper, 'get_connection_params', return_value={'account': 'test'})
+    @patch('snowflake_wrapper.base.Database.connect')
+    def test_arrow_query_returns_table(self, connect_mock, _):
+        table = MagicMock()
+        connect_mock.return_value.is_closed.return_value = False
+        cursor = connect_mock.return_value.cursor.return_value.__enter__.return_value
+        cursor.execute.return_value.fetch_arrow_all.return_value = table
+        wrapper = SnowflakeWrapper()
+        self.assertIs(table, wrapper.validate_and_execute_arrow('SELECT 1', (1,)))
+        cursor.execute.assert_called_once_with('SELECT 1', (1,))
+
+    @patch.object(SnowflakeWrapper, 'get_connection_params', return_value={'account': 'test'})
+    @patch('snowflake_wrapper.base.Database.connect')
+    def test_stream_execute_reads_in_batches(self, connect_mock, _):
+        connect_mock.return_value.is_closed.return_value = False
+        cursor = connect_mock.return_value.cursor.return_value.__enter__.return_value
+        cursor.fetchmany.side_effect = [[(1,), (2,)], [(3,)], []]
+        wrapper = SnowflakeWrapper()
+        rows = wrapper.stream_execute('SELECT 1', batch_size=2)
+        self.assertEqual(0, wrapper.pool_stats()['checkouts'])
+        self.assertEqual([(1,), (2,), (3,)], list(rows))
+        cursor.fetchmany.assert_called_with(2)
+        self.assertEqual(1, wrapper.pool_stats()['idle'])
+
+    @patch.object(SnowflakeWrapper, 'get_connection_params', return_value={'account': 'test'})
+    @patch('snowflake_wrapper.base.Database.connect')
+    def test_stream_execute_arrow_yields_record_batches(self, connect_mock, _):
+        connect_mock.return_value.is_closed.return_value = False
+        cursor = connect_mock.return_value.cursor.return_value.__enter__.return_value
+        cursor.fetch_arrow_batches.return_value = iter([pa.table({'VALUE': [1.5, 2.5]}), pa.table({'VALUE': [3.5]})])
+        wrapper = SnowflakeWrapper()
+        batches = wrapper.stream_execute_arrow('SELECT 1', (1,), tag='li.beta.ts')
+        self.assertEqual(0, wrapper.pool_stats()['checkouts'])
+        self.assertEqual([[1.5, 2.5], [3.5]], [batch.column(0).to_pylist() for batch in batches])
+        cursor.execute.assert_called_once_with('SELECT 1', (1,), _statement_params={'QUERY_TAG': 'li.beta.ts'})
+        self.assertEqual(1, wrapper.pool_stats()['idle'])
+
+    @patch.object(SnowflakeWrapper, 'get_connection_params', return_value={'account': 'test'})
+    @patch('snowflake_wrapper.base.Database.connect')
+    def test_closed_stream_returns_connection(self, connect_mock, _):
+        connect_mock.return_value.is_closed.return_value = False
+        cursor = connect_mock.return_value.cursor.return_value.__enter__.return_value
+        cursor.fetchmany.return_value = [(1,), (2,)]
+        wrapper = SnowflakeWrapper()
+        rows = wrapper.stream_execute('SELECT 1')
+        next(rows)
+        self.assertEqual(1, wrapper.pool_stats()['in_use'])
+        rows.close()
+        self.assertEqual(0, wrapper.pool_stats()['in_use'])
+        self.assertEqual(1, wrapper.pool_stats()['idle'])
+
+    @patch.object(SnowflakeWrapper, 'get_connection_params', return_value={'account': 'test'})
+    @patch('snowflake_wrapper.base.Database.connect')
+    def test_empty_result_is_not_rerun(self, connect_mock, _):
+        connect_mock.return_value.is_closed.return_value = False
+        cursor = connect_mock.return_value.cursor.return_value.__enter__.return_value
+        cursor.execute.return_value.fetchall.return_value = []
+        wrapper = SnowflakeWrapper()
+        self.assertEqual([], wrapper.validate_and_execute('SELECT 1'))
+        cursor.execute.assert_called_once()
+        self.assertEqual(0, wrapper.retry_stats()['retries'])
+
+    @patch.object(SnowflakeWrapper, 'get_connection_params', return_value={'account': 'test'})
+    @patch('snowflake_wrapper.base.Database.connect')
+    @patch('snowflake_wrapper.retry.time.sleep')
+    def test_failed_query_is_retried_on_a_new_connection(self, _, connect_mock, __):
+        connect_mock.return_value.is_closed.return_value = False
+        cursor = connect_mock.return_value.cursor.return_value.__enter__.return_value
+        cursor.execute.side_effect = [Database.OperationalError('connection reset'), MagicMock()]
+        wrapper = SnowflakeWrapper()
+        wrapper.validate_and_execute('SELECT 1')
+        self.assertEqual(2, connect_mock.call_count)
+        self.assertEqual(1, wrapper.pool_stats()['discarded'])
+        self.assertEqual(1, wrapper.retry_stats()['recovered'])
+
+    @patch.object(SnowflakeWrapper, 'get_connection_params', return_value={'account': 'test'})
+    @patch('snowflake_wrapper.base.Database.connect')
+    def test_query_runs_with_request_deadline(self, connect_mock, _):
+        connect_mock.return_value.is_closed.return_value = False
+        cursor = connect_mock.return_value.cursor.return_value.__enter__.return_value
+        with query_deadline(30):
+            SnowflakeWrapper().validate_and_execute('SELECT 1', (1,))
+        cursor.execute.assert_called_once_with('SELECT 1', (1,), timeout=30)
+
+    @patch.object(SnowflakeWrapper, 'get_connection_params', return_value={'account': 'test'})
+    @patch('snowflake_wrapper.base.Database.connect')
+    def test_query_is_cancelled_at_deadline(self, connect_mock, _):
+        connect_mock.return_value.is_closed.return_value = False
+        cursor = connect_mock.return_value.cursor.return_value.__enter__.return_value
+        cursor.sfqid = '01b2-query-id'
+        wrapper = SnowflakeWrapper()
+
+        with patch('snowflake_wrapper.base.remaining', return_value=-1):
+            cursor.execute.side_effect = Database.ProgrammingError('SQL execution canceled', errno=604)
+            with query_deadline(30):
+                with self.assertRaises(DeadlineExceeded):
+                    wrapper.validate_and_execute('SELECT 1')
+        cursor.abort_query.assert_called_once_with('01b2-query-id')
+        cursor.execute.assert_called_once()
+        self.assertEqual(1, wrapper.pool_stats()['idle'])
+
+    @patch.object(SnowflakeWrapper, 'get_connection_params', return_value={'account': 'test'})
+    @patch('snowflake_wrapper.base.Database.connect')
+    def test_stream_keeps_deadline_of_the_request(self, connect_mock, _):
+        connect_mock.return_value.is_closed.return_value = False
+        cursor = connect_mock.return_value.cursor.return_value.__enter__.return_value
+        cursor.fetchmany.side_effect = [[(1,)], []]
+        with query_deadline(30):
+            rows = SnowflakeWrapper().stream_execute('SELECT 1')
+        self.assertEqual([(1,)], list(rows))
+        cursor.execute.assert_called_once_with('SELECT 1', None, timeout=30)
+
+    @patch.object(SnowflakeWrapper, 'get_connection_params', return_value={'account': 'test'})
+    @patch('snowflake_wrapper.base.Database.connect')
+    def test_query_is_tagged_and_recorded(self, connect_mock, _):
+        connect_mock.return_value.is_closed.return_value = False
+        cursor = connect_mock.return_value.cursor.return_value.__enter__.return_value
+        cursor.sfqid = '01b2-query-id'
+        cursor.rowcount = 2
+        cursor.get_result_batches.return_value = [MagicMock(uncompressed_size=None),
+                                                  MagicMock(uncompressed_size=2048)]
+        wrapper = SnowflakeWrapper()
+        wrapper.validate_and_execute('SELECT 1', (1,), tag='mtpm.ts')
+        cursor.execute.assert_called_once_with('SELECT 1', (1,), _statement_params={'QUERY_TAG': 'mtpm.ts'})
+        record, = wrapper.telemetry.records('mtpm.ts')
+        self.assertEqual(('01b2-query-id', 2, 2048, None), (record.query_id, record.rows, record.bytes, record.error))
+        self.assertEqual(1, wrapper.query_stats()['mtpm.ts']['count'])
+
+    @patch.object(SnowflakeWrapper, 'get_connection_params', return_value={'account': 'test'})
+    @patch('snowflake_wrapper.base.Database.connect')
+    def test_failed_query_is_recorded(self, connect_mock, _):
+        connect_mock.return_value.is_closed.return_value = False
+        cursor = connect_mock.return_value.cursor.return_value.__enter__.return_value
+        cursor.execute.side_effect = Database.ProgrammingError('SQL compilation error')
+        cursor.rowcount = None
+        cursor.get_result_batches.return_value = None
+        wrapper = SnowflakeWrapper()
+        with self.assertRaises(Database.ProgrammingError):
+            wrapper.validate_and_execute('SELECT 1', tag='li.summary.dim')
+        self.assertEqual(1, wrapper.query_stats()['li.summary.dim']['errors'])
+
+    def test_wrappers_share_one_pool(self):
+        self.assertIs(SnowflakeWrapper().pool, SnowflakeWrapper().pool)
+
+    def test_pool_is_recreated_in_a_new_process(self):
+        wrapper = SnowflakeWrapper()
+        parent_pool = wrapper.pool
+        with patch('snowflake_wrapper.base.os.getpid', return_value=os.getpid() + 1):
+            child_pool = wrapper.pool
+        self.assertIsNot(parent_pool, child_pool)
+
+    def test_inherited_connections_are_not_closed_after_fork(self):
+        inherited = MagicMock()
+        inherited.is_closed.return_value = False
+        pool = SnowflakeWrapper().pool
+        pool._idle.append(PooledConnection(inherited))
+        SnowflakeWrapper._forget_pool()
+        self.assertIsNot(pool, SnowflakeWrapper().pool)
+        inherited.close.assert_not_called()
+
+
+class SnowflakeConnectionPoolTests(TestCase):
+
+    def setUp(self):
+        self.connect = MagicMock(side_effect=lambda: self.new_connection())
+
+    @staticmethod
+    def new_connection():
+        connection = MagicMock()
+        connection.is_closed.return_value = False
+        return connection
+
+    def test_connection_is_reused(self):
+        pool = SnowflakeConnectionPool(self.connect, max_size=2)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+        self.assertIs(first, second)
+        self.assertEqual(1, self.connect.call_count)
+        stats = pool.stats()
+        self.assertEqual(1, stats['created'])
+        self.assertEqual(1, stats['reused'])
+        self.assertEqual(1, stats['idle'])
+        self.assertEqual(0, stats['in_use'])
+
+    def test_pool_is_bounded(self):
+        pool = SnowflakeConnectionPool(self.connect, max_size=1, timeout=0.01)
+        with pool.connection():
+            with self.assertRaises(PoolTimeout):
+                pool.checkout()
+        self.assertEqual(1, pool.stats()['timeouts'])
+
+    def test_expired_connection_is_recycled(self):
+        pool = SnowflakeConnectionPool(self.connect, max_size=2, max_age=0.000001)
+        with pool.connection() as first:
+            pass
+        with pool.connection() as second:
+            pass
+        self.assertIsNot(first, second)
+        first.close.assert_called_once()
+        self.assertEqual(1, pool.stats()['recycled'])
+
+    def test_closed_connection_fails_validation(self):
+        pool = SnowflakeConnectionPool(self.connect, max_size=2)
+        with pool.connection() as first:
+            first.is_closed.return_value = True
+        with pool.connection() as second:
+            pass
+        self.assertIsNot(first, second)
+        self.assertEqual(1, pool.stats()['failed_validations'])
+
+    def test_connection_is_discarded_on_error(self):
+        pool = SnowflakeConnectionPool(self.connect, max_size=2)
+        with self.assertRaises(Database.Error):
+            with pool.connection() as connection:
+                raise Database.Error('boom')
+        connection.close.assert_called_once()
+        stats = pool.stats()
+        self.assertEqual(1, stats['discarded'])
+        self.assertEqual(0, stats['idle'])
+
+    def test_unreachable_snowflake_yields_none(self):
+        pool = SnowflakeConnectionPool(MagicMock(return_value=None), max_size=1, timeout=0.01)
+        with pool.connection() as connection:
+            self.assertIsNone(connection)
+        # the slot was handed back, so the next checkout does not time out
+        with pool.connection() as connection:
+            self.assertIsNone(connection)
+
+    def test_parallel_checkouts_use_separate_connections(self):
+        pool = SnowflakeConnectionPool(self.connect, max_size=3)
+        barrier = threading.Barrier(3)
+        seen = []
+
+        def work():
+            with pool.connection() as connection:
+                seen.append(connection)
+                barrier.wait(timeout=5)
+
+        threads = [threading.Thread(target=work) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(3, len({id(connection) for connection in seen}))
+        self.assertEqual(3, pool.stats()['idle'])
+
+
+class QueryDeadlineTests(TestCase):
+
+    def test_no_deadline_by_default(self):
+        self.assertIsNone(remaining())
+        self.assertIsNone(statement_timeout())
+
+    def test_nested_deadline_does_not_extend_outer(self):
+        with query_deadline(10) as outer:
+            with query_deadline(60) as inner:
+                self.assertEqual(outer, inner)
+            with query_deadline(5) as inner:
+                self.assertLess(inner, outer)
+        self.assertIsNone(remaining())
+
+    def test_passed_deadline_stops_query(self):
+        with query_deadline(10):
+            with patch('snowflake_wrapper.deadline.time.monotonic', return_value=float('inf')):
+                with self.assertRaises(DeadlineExceeded):
+                    statement_timeout()
+
+
+class QueryTelemetryTests(TestCase):
+
+    def test_ring_buffer_keeps_latest_records(self):
+        telemetry = QueryTelemetry(size=3)
+        for query_id in range(5):
+            telemetry.record('eq.beta.ts', str(query_id), 0.1)
+        self.assertEqual(['2', '3', '4'], [record.query_id for record in telemetry.records()])
+
+    def test_summary_reports_percentiles_per_tag(self):
+        telemetry = QueryTelemetry()
+        for duration in range(1, 101):
+            telemetry.record('mtpm.ts', None, duration / 1000, rows=10, bytes=100)
+        telemetry.record(None, None, 0.5, error='OperationalError')
+        summary = telemetry.summary()
+        self.assertEqual((50, 95, 99, 100), tuple(summary['mtpm.ts'][key] for key in ('p50_ms', 'p95_ms', 'p99_ms', 'max_ms')))
+        self.assertEqual((100, 1000, 10000), (summary['mtpm.ts']['count'], summary['mtpm.ts']['rows'], summary['mtpm.ts']['bytes']))
+        self.assertEqual(1, summary['untagged']['errors'])
+
+    def test_percentile_of_no_values(self):
+        self.assertIsNone(percentile([], 0.5))
+        self.assertEqual(7, percentile([7], 0.99))
+
+
+class RetryPolicyTests(TestCase):
+
+    def setUp(self):
+        self.sleep = MagicMock()
+        self.policy = RetryPolicy(attempts=3, base_delay=1, max_delay=4, budget=30, sleep=self.sleep)
+
+    def test_errors_are_classified(self):
+        self.assertEqual(RETRYABLE, classify(Database.OperationalError('network')))
+        self.assertEqual(RETRYABLE, classify(Database.InterfaceError('closed')))
+        self.assertEqual(FATAL, classify(Database.ProgrammingError('SQL compilation error', errno=1003)))
+        self.assertEqual(AUTH_REFRESH, classify(Database.ProgrammingError('token expired', errno=390114)))
+        self.assertEqual(AUTH_REFRESH, classify(Database.errors.ForbiddenError()))
+
+    def test_result_is_returned_without_retry(self):
+        call = MagicMock(return_value=[])
+        self.assertEqual([], self.policy.run(call))
+        call.assert_called_once()
+        self.sleep.assert_not_called()
+
+    def test_retryable_error_is_retried_with_backoff(self):
+        call = MagicMock(side_effect=[Database.OperationalError('network'),
+                                      Database.OperationalError('network'), [(1,)]])
+        self.assertEqual([(1,)], self.policy.run(call))
+        self.assertEqual(3, call.call_count)
+        delays = [args[0] for args, _ in self.sleep.call_args_list]
+        self.assertTrue(0 <= delays[0] <= 1)
+        self.assertTrue(0 <= delays[1] <= 2)
+        stats = self.policy.stats()
+        self.assertEqual(2, stats['retries'])
+        self.assertEqual(2, stats[RETRYABLE])
+        self.assertEqual(1, stats['recovered'])
+
+    def test_fatal_error_is_not_retried(self):
+        call = MagicMock(side_effect=Database.ProgrammingError('SQL compilation error'))
+        with self.assertRaises(Database.ProgrammingError):
+            self.policy.run(call)
+        call.assert_called_once()
+        self.assertEqual(1, self.policy.stats()[FATAL])
+
+    def test_auth_error_refreshes_credentials_before_retry(self):
+        refresh = MagicMock()
+        call = MagicMock(side_effect=[Database.errors.ForbiddenError(), [(1,)]])
+        self.assertEqual([(1,)], self.policy.run(call, on_auth_error=refresh))
+        refresh.assert_called_once()
+
+    def test_attempts_are_limited(self):
+        call = MagicMock(side_effect=Database.OperationalError('network'))
+        with self.assertRaises(Database.OperationalError):
+            self.policy.run(call)
+        self.assertEqual(3, call.call_count)
+        self.assertEqual(1, self.policy.stats()['attempts_exhausted'])
+
+    def test_retry_is_not_started_past_the_budget(self):
+        policy = RetryPolicy(attempts=5, base_delay=1, max_delay=4, budget=0, sleep=self.sleep)
+        call = MagicMock(side_effect=Database.OperationalError('network'))
+        with patch('snowflake_wrapper.retry.random.uniform', return_value=0.5):
+            with self.assertRaises(Database.OperationalError):
+                policy.run(call)
+        call.assert_called_once()
+        self.assertEqual(1, policy.stats()['budget_exhausted'])
+
+    def test_retry_is_not_started_past_the_deadline(self):
+        call = MagicMock(side_effect=Database.OperationalError('network'))
+        with patch('snowflake_wrapper.retry.remaining', return_value=0.1), \
+                patch('snowflake_wrapper.retry.random.uniform', return_value=0.5):
+            with self.assertRaises(Database.OperationalError):
+                self.policy.run(call)
+        call.assert_called_once()